@@ -0,0 +1,432 @@
+"""追記・マージ可能なグループ別集計状態
+
+行データそのものは持たず、グループごとの件数・販売数・売上・価格の和と二乗和・最小・最大と、
+中央値などの分位点用に「グループ×価格ごとの件数」だけを保持する。新しい行から作った状態を
+merge_states で足し込めば、全行を集計し直したのと同じ統計が得られる。
+
+状態は dict:
+    groups: {名前: {'keys': キー列, 'summary': DataFrame, 'prices': Series または None}}
+    top:    {名前: {'keys': キー列, 'k': 件数, 'rows': DataFrame}}（販売数の上位行）
+    seen:   取り込み済み行のフィンガープリント（ソート済み uint64）
+    rows:   取り込み済み行数
+    period: (最小販売日, 最大販売日)
+
+価格別件数は、price_alpha を指定すると価格を対数バケットの代表値に丸めてから数える
+（sketch_prices）。グループあたりの件数がバケット数で頭打ちになるので、行数が増えても
+状態の大きさは変わらない。そのときの誤差は:
+    件数・販売数・売上・平均・標準偏差・最小・最大: 誤差なし（和と最小・最大は丸めない）
+    中央値などの分位点: 真の値に対して相対誤差 price_alpha 以内
+    price_edges の区間別件数（価格帯分布）: 誤差なし
+"""
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_AGG = {
+    'count': 'sum',
+    'sales': 'sum',
+    'revenue': 'sum',
+    'price_n': 'sum',
+    'price_sum': 'sum',
+    'price_sumsq': 'sum',
+    'price_min': 'min',
+    'price_max': 'max',
+}
+
+# 上位行の既定の順位（販売数の多い順）
+TOP_BY = ['販売数']
+
+# 統計に含める価格の分位点（列名: 分位）
+PRICE_QUANTILES = {'p25_price': 0.25, 'median_price': 0.5, 'p75_price': 0.75, 'p90_price': 0.9}
+
+FINGERPRINT_COLUMNS = ['タイトル', 'ブランド', '価格', '販売数', '販売日']
+
+
+def sketch_prices(price, alpha, edges=None):
+    """価格を相対誤差 alpha の対数バケットの代表値に丸める（DDSketch と同じバケット分割）
+
+    γ = (1 + α) / (1 - α) として、バケット i は (γ^(i-1), γ^i]、代表値は 2γ^i / (γ + 1)。
+    代表値はバケット内のどの値とも相対誤差 α 以内になる。edges（pd.cut と同じ右閉区間の境界）を
+    渡すと、代表値を元の価格と同じ区間に収める（元の価格に近づくだけなので誤差は増えない）。
+    0以下と欠損はそのまま。
+    """
+    values = price.to_numpy(dtype=float)
+    gamma = (1 + alpha) / (1 - alpha)
+    positive = values > 0
+    bucket = np.ceil(np.log(values[positive]) / np.log(gamma))
+    rounded = values.copy()
+    rounded[positive] = 2 * gamma ** bucket / (gamma + 1)
+    if edges is not None:
+        edges = np.asarray(edges, dtype=float)
+        pos = np.clip(np.searchsorted(edges, values[positive], side='left'), 1, len(edges) - 1)
+        lower = np.nextafter(edges[pos - 1], np.inf)
+        rounded[positive] = np.clip(rounded[positive], lower, np.maximum(edges[pos], lower))
+    return pd.Series(rounded, index=price.index, name=price.name)
+
+
+def group_keys(frame, keys):
+    """キーが空なら全体を1グループ（キー0）として扱う"""
+    if keys:
+        return frame, list(keys)
+    return frame.assign(_all=0), ['_all']
+
+
+def summarize(frame, keys, keep_prices=True, price_alpha=None, price_edges=None):
+    """1グループ分の集計状態（summary と価格別件数）を作る"""
+    frame, keys = group_keys(frame, keys)
+    price = frame['価格']
+    frame = frame.assign(_price_sq=price * price)
+    summary = frame.groupby(keys, sort=False).agg(
+        count=('価格', 'size'),
+        sales=('販売数', 'sum'),
+        revenue=('売上', 'sum'),
+        price_n=('価格', 'count'),
+        price_sum=('価格', 'sum'),
+        price_sumsq=('_price_sq', 'sum'),
+        price_min=('価格', 'min'),
+        price_max=('価格', 'max'),
+    )
+    prices = None
+    if keep_prices:
+        if price_alpha:
+            frame = frame.assign(価格=sketch_prices(price, price_alpha, price_edges))
+        prices = frame.groupby(keys + ['価格'], sort=False).size()
+    return {'keys': keys, 'summary': summary, 'prices': prices}
+
+
+def top_rows(frame, keys, k, columns, by=TOP_BY):
+    """グループごとの by の上位 k 行（同じ値なら先に取り込んだ行を優先。グループ順・順位順に並ぶ）"""
+    frame, keys = group_keys(frame, keys)
+    rows = frame.iloc[grouped_top(frame, keys, k, by, tiebreak='_seq')]
+    return rows[[c for c in dict.fromkeys(keys + columns + by + ['_seq'])]]
+
+
+def row_fingerprints(raw):
+    """生データ1行ごとのフィンガープリント（同一内容の行は出現順の番号で区別する）"""
+    base = pd.util.hash_pandas_object(raw[FINGERPRINT_COLUMNS], index=False).to_numpy()
+    occurrence = pd.Series(base).groupby(base, sort=False).cumcount().to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame({'row': base, 'n': occurrence}), index=False).to_numpy()
+
+
+def new_row_mask(raw, fingerprints, state):
+    """まだ取り込んでいない行のマスク
+
+    前回の最大販売日より新しい行はそのまま新規とし、それ以前の日付の行だけを
+    取り込み済みフィンガープリントと照合する。
+    """
+    is_new = np.ones(len(raw), dtype=bool)
+    if state is None or len(state['seen']) == 0:
+        return is_new
+    watermark = state['period'][1]
+    check = np.ones(len(raw), dtype=bool) if watermark is None else ~(raw['販売日'] > watermark).to_numpy(bool)
+    seen = state['seen']
+    pos = np.minimum(np.searchsorted(seen, fingerprints[check]), len(seen) - 1)
+    is_new[check] = seen[pos] != fingerprints[check]
+    return is_new
+
+
+def build_state(frame, groupings, top_lists, top_columns, seq_start=0, fingerprints=None,
+                price_alpha=None, price_edges=None):
+    """分類済みの行から集計状態を作る
+
+    groupings: {名前: (キー列, 価格別件数を持つか)}
+    top_lists: {名前: (キー列, 件数, 順位を決める列)}
+    price_alpha, price_edges: 価格別件数を近似する場合の相対誤差と正確に保つ区間境界（sketch_prices）
+    """
+    frame = frame.assign(_seq=np.arange(seq_start, seq_start + len(frame)))
+    dates = frame['販売日'].dropna()
+    return {
+        'groups': {name: summarize(frame, keys, keep_prices, price_alpha, price_edges)
+                   for name, (keys, keep_prices) in groupings.items()},
+        'top': {name: {'keys': keys, 'k': k, 'by': by, 'rows': top_rows(frame, keys, k, top_columns, by)}
+                for name, (keys, k, by) in top_lists.items()},
+        'seen': np.sort(fingerprints) if fingerprints is not None else np.empty(0, dtype=np.uint64),
+        'rows': seq_start + len(frame),
+        'period': (dates.min(), dates.max()) if len(dates) else (None, None),
+    }
+
+
+def merge_group(a, b):
+    """グループの状態を合算する（summary は SUMMARY_AGG の一部の列だけでもよい。欠損キーのグループも残す）"""
+    summary = pd.concat([a['summary'], b['summary']])
+    agg = {column: how for column, how in SUMMARY_AGG.items() if column in summary.columns}
+    summary = summary.groupby(level=list(range(summary.index.nlevels)), sort=False, dropna=False).agg(agg)
+    prices = None
+    if a['prices'] is not None and b['prices'] is not None:
+        prices = pd.concat([a['prices'], b['prices']])
+        prices = prices.groupby(level=list(range(prices.index.nlevels)), sort=False).sum()
+    return {'keys': a['keys'], 'summary': summary, 'prices': prices}
+
+
+def merge_top(a, b):
+    rows = pd.concat([a['rows'], b['rows']], ignore_index=True)
+    rows = rows.iloc[grouped_top(rows, a['keys'], a['k'], a['by'], tiebreak='_seq')]
+    return {'keys': a['keys'], 'k': a['k'], 'by': a['by'], 'rows': rows}
+
+
+def merge_period(a, b):
+    values = [v for v in a + b if v is not None and not pd.isna(v)]
+    return (min(values), max(values)) if values else (None, None)
+
+
+def merge_states(a, b):
+    """2つの集計状態を合算する（b は seq_start=a['rows'] で作った、a より後の行の状態とする）"""
+    return {
+        'groups': {name: merge_group(a['groups'][name], b['groups'][name]) for name in a['groups']},
+        'top': {name: merge_top(a['top'][name], b['top'][name]) for name in a['top']},
+        'seen': np.union1d(a['seen'], b['seen']),
+        'rows': b['rows'],
+        'period': merge_period(a['period'], b['period']),
+    }
+
+
+def rollup(group, level, pairs):
+    """キー列 level の値を pairs（[元の値, 新しい値]の2列 DataFrame）で付け替えて再集計する
+
+    1つの値が複数の新しい値に対応してもよい（その行は両方に数えられる）。
+    """
+    new_level = pairs.columns[1]
+    keys = [new_level if key == level else key for key in group['keys']]
+
+    summary = group['summary'].reset_index().merge(pairs, on=level, how='inner')
+    summary = summary.groupby(keys, sort=False).agg(SUMMARY_AGG)
+    prices = None
+    if group['prices'] is not None:
+        prices = group['prices'].rename('n').reset_index().merge(pairs, on=level, how='inner')
+        prices = prices.groupby(keys + ['価格'], sort=False)['n'].sum()
+    return {'keys': keys, 'summary': summary, 'prices': prices}
+
+
+def group_codes(frame, keys):
+    """keys の組み合わせごとのグループ番号と、番号順のグループのキー（Index）を返す
+
+    番号は初出順で groupby(keys, sort=False).ngroup() と同じ。キーのどれかが欠損の行は -1。
+    キー列ごとに factorize した番号を1つの整数にまとめてからもう一度 factorize するので、
+    groupby を組み立てるより速い。
+    """
+    names = [keys] if isinstance(keys, str) else list(keys)
+    combined = np.zeros(len(frame), dtype=np.int64)
+    valid = np.ones(len(frame), dtype=bool)
+    for key in names:
+        codes, uniques = pd.factorize(frame[key])
+        valid &= codes >= 0
+        combined = combined * (len(uniques) + 1) + codes
+    result = np.full(len(frame), -1, dtype=np.int64)
+    result[valid], uniques = pd.factorize(combined[valid])
+    # 各グループの最初の行からキーを取る（同じ位置への代入は後のものが残るので、逆順に書き込む）
+    rows = np.flatnonzero(valid)[::-1]
+    first = np.empty(len(uniques), dtype=np.int64)
+    first[result[rows]] = rows
+    first_rows = frame[names].iloc[first]
+    if isinstance(keys, str):
+        return result, pd.Index(first_rows[keys].to_numpy(), name=keys)
+    return result, pd.MultiIndex.from_frame(first_rows)
+
+
+def ranking_order(frame, by, tiebreak=None):
+    """by の列の降順（前の列ほど優先。同じ値なら tiebreak の列の昇順、省略時は行の順）に並べた行番号
+
+    列ごとの安定ソートを後ろの列から重ねる。値が欠損の行は最後に回る。
+    """
+    order = np.argsort(frame[tiebreak].to_numpy(), kind='stable') if tiebreak else np.arange(len(frame))
+    for column in reversed(by):
+        values = frame[column].to_numpy(dtype=float)[order]
+        order = order[np.argsort(-values, kind='stable')]
+    return order
+
+
+def grouped_top(frame, keys, k, by=TOP_BY, tiebreak=None, ties=False, order=None):
+    """keys のグループごとに by の上位 k 行を選び、その行番号をグループ順（初出順）・順位順に返す
+
+    全行を by で1回だけ並べ（ranking_order。同じ並びを order に渡せば別のグループ分けにも使い回せる）、
+    それをグループ番号で安定ソートして各グループの先頭 k 行を取るので、計算量はグループの数によらない。
+    ties=True なら k 位と by の値がすべて同じ行も残す。キーが欠損の行と by の先頭の列が欠損の行は
+    選ばない（nlargest と同じ）。
+    """
+    frame, keys = group_keys(frame, [keys] if isinstance(keys, str) else keys)
+    if order is None:
+        order = ranking_order(frame, by, tiebreak)
+    codes, index = group_codes(frame, keys)
+    order = order[(codes[order] >= 0) & frame[by[0]].notna().to_numpy()[order]]
+    ordered_codes = codes[order]
+    if len(index) <= np.iinfo(np.uint16).max:
+        ordered_codes = ordered_codes.astype(np.uint16)
+    order = order[np.argsort(ordered_codes, kind='stable')]
+    ordered_codes = codes[order]
+
+    total = np.bincount(ordered_codes, minlength=len(index))
+    start = np.cumsum(total) - total
+    rank = np.arange(len(order)) - start[ordered_codes]
+    keep = rank < k
+    if ties and len(order):
+        # 各グループの k 位（k 件に満たなければ最下位）の行と by の値が同じ行
+        last = (start + np.minimum(total, k) - 1)[ordered_codes]
+        same = np.ones(len(order), dtype=bool)
+        for column in by:
+            values = frame[column].to_numpy(dtype=float)[order]
+            same &= values == values[last]
+        keep |= same
+    return order[keep]
+
+
+def price_index(codes, prices, counts=None, groups=None, price_order=None):
+    """(グループ, 価格) の順に並べた価格の索引
+
+    codes はグループ番号（0 から groups-1。負の値の行は対象外）、counts は価格ごとの件数（省略時は
+    1行1件）。グループごとに価格が昇順に連続して並び、各グループの先頭の順位と件数を持つので、
+    index_quantiles で全グループの任意の分位点をまとめて読める。欠損の価格は数えない。
+
+    並べ替えは、価格の昇順（price_order。同じ行の並びなら別のグループ分けにも使い回せる）を
+    グループ番号で安定ソートするだけ。グループ番号は小さい整数型にしてから並べるので基数ソートになる。
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    prices = np.asarray(prices, dtype=float)
+    if groups is None:
+        groups = int(codes.max()) + 1 if len(codes) else 0
+    if price_order is None:
+        price_order = np.argsort(prices)
+    keep = (codes >= 0) & ~np.isnan(prices)
+    order = price_order[keep[price_order]]
+    ordered_codes = codes[order]
+    if groups <= np.iinfo(np.uint16).max:
+        ordered_codes = ordered_codes.astype(np.uint16)
+    order = order[np.argsort(ordered_codes, kind='stable')]
+    if counts is None:
+        # 1行1件なら順位がそのまま位置なので累積件数は持たない
+        cum = None
+        total = np.bincount(ordered_codes, minlength=groups).astype(np.int64)
+    else:
+        counts = np.asarray(counts, dtype=np.int64)[order]
+        cum = np.cumsum(counts)
+        total = np.bincount(codes[order], weights=counts, minlength=groups).astype(np.int64)
+    return {
+        'prices': prices[order],
+        'cum': cum,
+        'start': np.cumsum(total) - total,
+        'total': total,
+    }
+
+
+def ranked_prices(index, ranks):
+    """索引の通し順位（グループの先頭の順位 + グループ内の順位、0始まり）の価格"""
+    ranks = np.asarray(ranks, dtype=np.int64)
+    if index['cum'] is not None:
+        # 順位 r の価格は、累積件数が r を超える最初の位置にある
+        ranks = np.searchsorted(index['cum'], ranks, side='right')
+    return index['prices'][ranks]
+
+
+def index_quantiles(index, qs):
+    """索引から全グループの分位点を1回のベクトル演算で求める（グループ × qs の配列。件数0のグループは NaN）
+
+    pandas の quantile と同じ線形補間。中央値（0.5）は pandas の median と同じく中央の2値の平均。
+    """
+    qs = np.asarray(qs, dtype=float)
+    total = index['total']
+    result = np.full((len(total), len(qs)), np.nan)
+    has = total > 0
+    if not has.any():
+        return result
+    pos = (total[has, None] - 1) * qs
+    lo = np.floor(pos)
+    hi = np.ceil(pos)
+    start = index['start'][has, None]
+    v_lo = ranked_prices(index, start + lo)
+    v_hi = ranked_prices(index, start + hi)
+    result[has] = np.where(qs == 0.5, (v_lo + v_hi) / 2, v_lo + (v_hi - v_lo) * (pos - lo))
+    return result
+
+
+def bootstrap_medians(index, resamples, rng):
+    """全グループの中央値のブートストラップ分布（グループ × resamples の配列。件数0のグループは NaN）
+
+    再標本（グループ内の n 件から n 件を復元抽出）の中央値は、再標本の k 番目に小さい値
+    （n が偶数なら k 番目と k+1 番目の平均、k = (n+1)//2）。一様乱数 n 個の k 番目の順序統計量は
+    Beta(k, n-k+1) に従い、k+1 番目はそこから残りの区間を Beta(1, n-k) の割合だけ進んだ位置に
+    なるので、これを経験分布の逆関数（ソート済みの価格の floor(u×n) 番目）で価格に直せば、
+    行を実際に抽出しなくても再標本の中央値と同じ分布の値が得られる。乱数はグループ × resamples 個だけで、
+    行数にはよらない。
+    """
+    total = index['total']
+    result = np.full((len(total), resamples), np.nan)
+    has = total > 0
+    if not has.any():
+        return result
+    n = total[has, None].astype(float)
+    k = np.floor((n + 1) / 2)
+    shape = (int(has.sum()), resamples)
+    u_lo = rng.beta(k, n - k + 1, size=shape)
+    # Beta(1, m) は一様乱数 v から 1 - v^(1/m) で作れる。n が1のとき k+1 番目は無い（奇数なので使わない）
+    u_hi = u_lo + (1 - u_lo) * (1 - rng.random(shape) ** (1 / np.maximum(n - k, 1)))
+    start = index['start'][has, None]
+    v_lo = ranked_prices(index, start + np.minimum(np.floor(u_lo * n), n - 1))
+    v_hi = ranked_prices(index, start + np.minimum(np.floor(u_hi * n), n - 1))
+    result[has] = np.where(n % 2 == 1, v_lo, (v_lo + v_hi) / 2)
+    return result
+
+
+def price_histogram(codes, prices, edges, groups, counts=None):
+    """グループ × 価格帯の件数行列（int64 の groups × (len(edges) - 1) 配列）
+
+    価格帯は pd.cut と同じ右閉区間 (edges[j], edges[j+1]]。全行の価格帯を1回の searchsorted で
+    求め、(グループ, 価格帯) を1つの番号にまとめて bincount するので、グループがいくつあっても
+    1回で数え終わる。範囲外・欠損の価格と負のグループ番号の行は数えない。counts は価格ごとの件数
+    （省略時は1行1件）。
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    edges = np.asarray(edges, dtype=float)
+    bins = len(edges) - 1
+    bucket = np.searchsorted(edges, np.asarray(prices, dtype=float), side='left') - 1
+    keep = (codes >= 0) & (bucket >= 0) & (bucket < bins)
+    weights = None if counts is None else np.asarray(counts, dtype=float)[keep]
+    cells = np.bincount(codes[keep] * bins + bucket[keep], weights=weights, minlength=groups * bins)
+    return cells.reshape(groups, bins).astype(np.int64)
+
+
+def group_price_counts(group):
+    """価格別件数を (summary の行番号, 価格, 件数) の配列に直す"""
+    summary = group['summary']
+    frame = group['prices'].rename('n').reset_index()
+    codes = summary.index.get_indexer(frame.set_index(group['keys']).index)
+    return codes, frame['価格'].to_numpy(dtype=float), frame['n'].to_numpy()
+
+
+def group_histogram(group, edges):
+    """価格別件数から各グループの価格帯別件数を求める（行が summary と同じグループの DataFrame）"""
+    summary = group['summary']
+    if group['prices'] is None or len(group['prices']) == 0:
+        return pd.DataFrame(0, index=summary.index, columns=range(len(edges) - 1))
+    codes, prices, counts = group_price_counts(group)
+    return pd.DataFrame(price_histogram(codes, prices, edges, len(summary), counts), index=summary.index)
+
+
+def group_quantiles(group, qs):
+    """価格別件数から各グループの分位点を求める（列が qs、行が summary と同じグループの DataFrame）"""
+    summary = group['summary']
+    if group['prices'] is None or len(group['prices']) == 0:
+        return pd.DataFrame(np.nan, index=summary.index, columns=list(qs))
+    codes, prices, counts = group_price_counts(group)
+    index = price_index(codes, prices, counts, len(summary))
+    return pd.DataFrame(index_quantiles(index, qs), index=summary.index, columns=list(qs))
+
+
+def group_table(group):
+    """集計状態から get_brand_stats と同じ項目の DataFrame を作る（仕入れ上限の列を除く）"""
+    summary = group['summary']
+    n = summary['price_n']
+    mean = summary['price_sum'] / n.where(n > 0)
+    var = (summary['price_sumsq'] - summary['price_sum'] * mean) / (n - 1).where(n > 1)
+    std = np.sqrt(var.clip(lower=0))
+    table = pd.DataFrame({
+        'count': summary['count'],
+        'sales': summary['sales'],
+        'revenue': summary['revenue'],
+        'avg_price': mean,
+        'min_price': summary['price_min'],
+        'max_price': summary['price_max'],
+        'cv': np.where(mean > 0, std / mean.where(mean > 0), 0),
+    }, index=summary.index)
+    quantiles = group_quantiles(group, list(PRICE_QUANTILES.values()))
+    for name, q in PRICE_QUANTILES.items():
+        table[name] = quantiles[q]
+    return table
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""ブランド検出ベンチマーク: 旧来の行ごとループ vs brand_index
+
+ブランドリストの件数を変えて、ブランド不明行のタイトルからブランドを検出する時間を比較する。
+
+    python benchmarks/bench_brand_detection.py --rows 50000 --brands 30 100 300 1000
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import build_complete_html as app  # noqa: E402
+from brand_index import build_brand_index  # noqa: E402
+
+FILLER_WORDS = ['Vintage', 'Gold', 'Silver', 'Pearl', 'Logo', 'Stud', 'Hoop', 'Drop', 'Clip On',
+                'Earrings', 'Rhinestone', 'Crystal', 'Authentic', 'Used', 'Box', 'Novelty']
+
+
+def make_brands(n, rng):
+    return [''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 10))) for _ in range(n)]
+
+
+def make_frame(rows, brands, rng):
+    """ブランド不明7割・タイトルにブランド名を含む行3割のデータ"""
+    titles, brand_col = [], []
+    for _ in range(rows):
+        words = rng.sample(FILLER_WORDS, 4)
+        if rng.random() < 0.3:
+            words.insert(rng.randint(0, 4), rng.choice(brands).title())
+        titles.append(' '.join(words))
+        brand_col.append(None if rng.random() < 0.7 else rng.choice(brands))
+    return pd.DataFrame({'タイトル': titles, 'ブランド': brand_col})
+
+
+def detect_legacy(df, brands):
+    """旧 detect_brand_from_title と同じ行ごとの線形探索"""
+    def detect(row):
+        brand = row['ブランド']
+        title = str(row['タイトル']).upper()
+        if pd.isna(brand) or brand == '(不明)' or brand == '':
+            for b in brands:
+                if b.upper() in title:
+                    return b
+        return brand
+    return df.apply(detect, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--brands', type=int, nargs='+', default=[30, 100, 300, 1000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'ブランド数':>10} {'旧ループ(s)':>12} {'インデックス構築(s)':>20} {'インデックス検出(s)':>20} {'倍率':>8}")
+    for n in args.brands:
+        rng = random.Random(args.seed)
+        brands = make_brands(n, rng)
+        df = make_frame(args.rows, brands, rng)
+
+        start = time.perf_counter()
+        expected = detect_legacy(df, brands)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = build_brand_index([(b, [b.upper()]) for b in brands])
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = app.detect_brands(df['ブランド'], df['タイトル'], index)
+        indexed_time = time.perf_counter() - start
+
+        assert (expected.fillna('').astype(object) == result.fillna('')).all(), '検出結果が旧ループと一致しません'
+        print(f"{n:>10} {legacy_time:>12.3f} {build_time:>20.4f} {indexed_time:>20.3f} {legacy_time / indexed_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""分類済み DataFrame のメモリ使用量の比較: 従来の型（object 文字列・int64）と省メモリな型
+
+合成データ（bench_pipeline.py と同じ --data-dir に保存・再利用）を行数ごとに読み込んで分類し、
+従来の表現と compact_frame（カテゴリ型・順序付きカテゴリの販売日・縮めた販売数・Arrow 文字列の
+タイトル）の列ごとのメモリ使用量と、同じフレームでの集計（analyze）の時間を比べる。
+
+    python benchmarks/bench_frame_memory.py --rows 100000 1000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import build_complete_html as app  # noqa: E402
+from bench_pipeline import DEFAULT_DATA_DIR, dataset  # noqa: E402
+
+
+def legacy_frame(df):
+    """従来の表現（文字列はすべて object、販売数は int64）に戻したコピー"""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, (pd.CategoricalDtype, pd.StringDtype)) or df[column].dtype == object:
+            df[column] = df[column].astype(object)
+    df['販売数'] = df['販売数'].astype('int64')
+    return df
+
+
+def timed_analyze(df):
+    start = time.perf_counter()
+    app.analyze(df.assign(仕入れ上限=app.purchase_limit(df['価格'])))
+    return time.perf_counter() - start
+
+
+def compare(csv_path):
+    compact = app.compact_frame(app.enrich(pd.read_csv(csv_path, dtype=app.csv_dtypes())))
+    legacy = legacy_frame(compact)
+    before, after = app.frame_memory(legacy), app.frame_memory(compact)
+    return compact, before, after, timed_analyze(legacy), timed_analyze(compact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', type=Path, default=DEFAULT_DATA_DIR, help='合成データの保存先')
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        compact, before, after, legacy_time, compact_time = compare(dataset(args.data_dir, rows, args.seed))
+        print(f"\n{rows:,}行")
+        print(f"  {'列':<12} {'型':<16} {'従来(MB)':>9} {'省メモリ(MB)':>12}")
+        for column in before.index:
+            print(f"  {column:<12} {str(compact[column].dtype):<16} "
+                  f"{before[column] / 1e6:>9.1f} {after[column] / 1e6:>12.1f}")
+        print(f"  合計 {before.sum() / 1e6:.1f}MB → {after.sum() / 1e6:.1f}MB"
+              f"（{1 - after.sum() / before.sum():.0%}削減）")
+        print(f"  集計（analyze）: {legacy_time:.2f}秒 → {compact_time:.2f}秒")
+
+
+if __name__ == '__main__':
+    main()
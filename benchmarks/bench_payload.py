@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""埋め込みグラフデータのベンチマーク: グラフ定義そのままの JSON vs ラベルの辞書を共有する列指向の形
+
+合成データ（ブランド数は --tail-brands で増やす）のレポートから、
+  plain:   chart_specs をそのまま compact_json にしたもの（従来の埋め込み）
+  columnar: encode_charts の形を payload_json にしたもの（ページでは decodeCharts で戻す）
+の大きさと書き出し時間を、1ファイル版のページと全ブランドの詳細ページについて比べる。
+node があれば、ブラウザと同じ JSON.parse（と decodeCharts）の時間も測り、元に戻した結果が一致するかも確かめる。
+
+    python benchmarks/bench_payload.py --rows 200000 --tail-brands 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import build_complete_html as app  # noqa: E402
+from generate_listings import generate_listings  # noqa: E402
+
+# JSON.parse（と decodeCharts）を repeat 回ずつ実行して1回あたりのミリ秒を出す node のスクリプト
+NODE_SCRIPT = '''
+const fs = require('fs');
+const {performance} = require('perf_hooks');
+%(decode)s
+const [plainPath, columnarPath, repeat] = process.argv.slice(1);
+const plain = fs.readFileSync(plainPath, 'utf8');
+const columnar = fs.readFileSync(columnarPath, 'utf8');
+const same = JSON.stringify(JSON.parse(plain)) === JSON.stringify(decodeCharts(JSON.parse(columnar)));
+const time = f => {
+    for (let i = 0; i < 50; i++) f();
+    const start = performance.now();
+    for (let i = 0; i < repeat; i++) f();
+    return (performance.now() - start) / repeat;
+};
+console.log(JSON.stringify({same, plain: time(() => JSON.parse(plain)),
+                            columnar: time(() => decodeCharts(JSON.parse(columnar)))}));
+'''
+
+
+def timed(func, *args, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def node_parse_times(plain, columnar, repeat):
+    """node で測った {'same', 'plain', 'columnar'}（node が無ければ None）"""
+    if shutil.which('node') is None:
+        return None
+    decode = app.PLOT_CHARTS['plotly'][app.PLOT_CHARTS['plotly'].index('function decodeCharts'):]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, 'plain.json'), os.path.join(tmp, 'columnar.json')]
+        for path, text in zip(paths, (plain, columnar)):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        script = NODE_SCRIPT % {'decode': decode}
+        proc = subprocess.run(['node', '-e', script, *paths, str(repeat)], capture_output=True, text=True,
+                              check=True)
+    return json.loads(proc.stdout)
+
+
+def compare(name, charts, repeat):
+    plain, plain_ms = timed(app.compact_json, charts)
+    columnar, columnar_ms = timed(lambda c: app.payload_json(app.encode_charts(c)), charts)
+    plain_bytes, columnar_bytes = len(plain.encode('utf-8')), len(columnar.encode('utf-8'))
+    print(f"\n{name}")
+    print(f"  大きさ   {plain_bytes:>12,} → {columnar_bytes:>12,} バイト（{1 - columnar_bytes / plain_bytes:.0%}削減）")
+    print(f"  書き出し {plain_ms:>10.2f}ms → {columnar_ms:>10.2f}ms")
+    parse = node_parse_times(plain, columnar, repeat)
+    if parse is None:
+        print("  読み込み: node が無いため測定せず")
+    else:
+        print(f"  読み込み {parse['plain']:>10.3f}ms → {parse['columnar']:>10.3f}ms（JSON.parse + decodeCharts）"
+              f"  元に戻した結果の一致: {parse['same']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--tail-brands', type=int, default=2000, help='ALL_BRANDS 以外の架空ブランドの数')
+    parser.add_argument('--repeat', type=int, default=500, help='node で JSON.parse を繰り返す回数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    raw = pd.concat(generate_listings(args.rows, args.seed, args.tail_brands), ignore_index=True)
+    report = app.aggregate(app.compact_frame(app.enrich(raw)))
+    print(f"{report['row_count']:,}行  {len(report['brand_stats_list']):,}ブランド"
+          f"  （書き出し: {'orjson' if app.orjson is not None else 'json'}）")
+
+    compare('1ファイル版のページ（全体分析 + Top20ブランドタブ）', app.chart_specs(report), args.repeat)
+
+    # 詳細ページはページごとに埋め込むので、全ページ分をまとめて1つの dict にして合計を測る
+    monthly_labels = app.chart_months(report['monthly_sales'])
+    pages = {tab['tab_id']: app.brand_tab_charts(tab, monthly_labels) for tab in app.brand_page_tabs(report)}
+    compare(f'ブランド別ページ（{len(pages):,}ページ分を1つの辞書で符号化した場合）', pages, max(args.repeat // 50, 5))
+    # 実際にはページごとに別々に埋め込む（同じ並びの配列が無ければ encode_charts は符号化しない）
+    plain = sum(len(app.compact_json({tab_id: charts}).encode('utf-8')) for tab_id, charts in pages.items())
+    columnar = sum(len(app.payload_json(app.encode_charts({tab_id: charts})).encode('utf-8'))
+                   for tab_id, charts in pages.items())
+    print(f"  ページごとに埋め込んだ合計 {plain:,} → {columnar:,} バイト")
+
+
+if __name__ == '__main__':
+    main()
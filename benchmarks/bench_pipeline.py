@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""パイプライン全体のベンチマーク: 合成データで段階ごとの時間とメモリを測る
+
+行数ごとに合成エクスポート（generate_listings.py）を作って --data-dir に保存・再利用し、
+子プロセスで1回ずつビルドして、段階ごとの時間とプロセスの最大RSSを測る。tracemalloc は
+処理を数倍遅くするので、段階ごとのメモリのピークは時間とは別の子プロセスで測る。
+  memory モード: load（read_csv）→ classify（enrich・compact_frame）→ aggregate（analyze）→ render → write
+  stream モード: ingest（チャンク読み込み・分類・集計状態の更新）→ aggregate（report_from_state）→ render → write
+結果は --results（JSON Lines）に追記し、同じ行数・モードの前回の結果との比を表示する。
+
+    python benchmarks/bench_pipeline.py --rows 10000 100000 1000000 10000000 --mode stream
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from generate_listings import write_listings  # noqa: E402
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / 'results' / 'pipeline.jsonl'
+DEFAULT_DATA_DIR = Path(tempfile.gettempdir()) / 'earring-bench'
+
+
+def measure(stages, name, func, *args):
+    """func を実行して時間（tracemalloc の計測中ならその段階の間のメモリのピークも）を stages に記録する"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = func(*args)
+    stages[name] = {'wall': time.perf_counter() - start}
+    if tracemalloc.is_tracing():
+        stages[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    return result
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_one(csv_path, mode, chunk_rows, trace_memory):
+    """1回分のビルドを計測する（子プロセスで実行する）"""
+    import pandas as pd
+    import build_complete_html as app
+
+    stages = {}
+    if trace_memory:
+        tracemalloc.start()
+    if mode == 'memory':
+        df = measure(stages, 'load', lambda path: pd.read_csv(path, dtype=app.csv_dtypes()), csv_path)
+        df = measure(stages, 'classify', lambda df: app.compact_frame(app.enrich(df)), df)
+
+        def aggregate(df):
+            df['仕入れ上限'] = app.purchase_limit(df['価格'])
+            return app.analyze(df)
+        report = measure(stages, 'aggregate', aggregate, df)
+        rows = len(df)
+        del df
+    else:
+        state = measure(stages, 'ingest', app.stream_state, csv_path, chunk_rows)
+        report = measure(stages, 'aggregate', app.report_from_state, state)
+        rows = state['rows']
+        del state
+
+    def render(report):
+        out = io.StringIO()
+        app.render_html(report, out)
+        return out.getvalue()
+    html = measure(stages, 'render', render, report)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        measure(stages, 'write', app.write_atomic, os.path.join(tmp, 'index.html'), lambda out: out.write(html))
+    if trace_memory:
+        tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'mode': mode,
+        'stages': stages,
+        'total': sum(s['wall'] for s in stages.values()),
+        'max_rss_mb': max_rss_mb(),
+        'html_bytes': len(html.encode('utf-8')),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path):
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def dataset(data_dir, rows, seed):
+    """合成データのCSV（同じ行数・シードなら作り直さない）"""
+    path = data_dir / f'listings_{rows}_{seed}.csv'
+    if not path.exists():
+        data_dir.mkdir(parents=True, exist_ok=True)
+        print(f"  合成データ生成中: {rows:,}行 → {path}", flush=True)
+        write_listings(str(path) + '.tmp', rows, seed)
+        os.replace(str(path) + '.tmp', path)
+    return path
+
+
+def run_child(csv_path, args, trace_memory):
+    command = [sys.executable, __file__, '--run-one', str(csv_path), '--mode', args.mode,
+               '--chunk-rows', str(args.chunk_rows)] + (['--trace-memory'] if trace_memory else [])
+    proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"終了コード {proc.returncode}\n{proc.stderr.strip()[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_result(result, previous):
+    stage_names = list(result['stages'])
+    print(f"\n{result['rows']:,}行 ({result['mode']})  合計 {result['total']:.2f}秒  最大RSS {result['max_rss_mb']:.0f}MB"
+          + (f"  前回比 {result['total'] / previous['total']:.2f}x（{previous['commit']}）" if previous else ''))
+    print(f"  {'段階':<10} {'時間(s)':>9} {'ピーク(MB)':>11} {'前回比':>8}")
+    for name in stage_names:
+        stage = result['stages'][name]
+        ratio = ''
+        if previous and name in previous['stages'] and previous['stages'][name]['wall'] > 0:
+            ratio = f"{stage['wall'] / previous['stages'][name]['wall']:.2f}x"
+        peak = f"{stage['peak_mb']:.1f}" if 'peak_mb' in stage else '-'
+        print(f"  {name:<10} {stage['wall']:>9.3f} {peak:>11} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument('--mode', choices=['memory', 'stream'], default='memory')
+    parser.add_argument('--chunk-rows', type=int, default=200000, help='stream モードのチャンク行数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', type=Path, default=DEFAULT_DATA_DIR, help='合成データの保存先')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS, help='結果を追記する JSON Lines')
+    parser.add_argument('--no-stage-memory', action='store_true',
+                        help='段階ごとのメモリのピーク（tracemalloc で測る2回目の実行）を省く')
+    parser.add_argument('--run-one', metavar='CSV', help=argparse.SUPPRESS)
+    parser.add_argument('--trace-memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.mode, args.chunk_rows, args.trace_memory)))
+        return
+
+    history = load_results(args.results)
+    commit = git_commit()
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    for rows in args.rows:
+        csv_path = dataset(args.data_dir, rows, args.seed)
+        # 行数ごとに別プロセスで測り、最大RSSが前の回の影響を受けないようにする
+        try:
+            result = run_child(csv_path, args, trace_memory=False)
+            if not args.no_stage_memory:
+                traced = run_child(csv_path, args, trace_memory=True)
+                for name, stage in traced['stages'].items():
+                    result['stages'][name]['peak_mb'] = stage['peak_mb']
+        except RuntimeError as e:
+            print(f"\n{rows:,}行: 失敗（{e}）")
+            continue
+        result.update({'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+                       'seed': args.seed})
+
+        previous = [r for r in history if r['rows'] == result['rows'] and r['mode'] == result['mode']]
+        print_result(result, previous[-1] if previous else None)
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+        history.append(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""ノベルティ・箱ありの価格プレミアムのベンチマーク: ブランドごとのループ vs 全ブランド一括のブートストラップ
+
+合成データ（ブランド数は --tail-brands で増やす）を分類し、
+  loop:   ブランドごとに行を絞り込んで中央値の差だけを求める従来の方法
+  batch:  frame_premiums（全ブランドの中央値と、--resamples 回分の再標本の中央値をまとめて求める）
+の時間を比べる。batch は信頼区間も求めたうえでの時間。
+
+    python benchmarks/bench_premiums.py --rows 1000000 --tail-brands 2000 --resamples 200 1000 5000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import build_complete_html as app  # noqa: E402
+from accumulators import group_codes  # noqa: E402
+from generate_listings import generate_listings  # noqa: E402
+
+
+def loop_premiums(df):
+    """ブランドごとに行を絞り込み、条件あり／なしの中央値の差を求める（点推定のみ）"""
+    result = {}
+    for brand, brand_df in df.groupby('ブランド', sort=False, observed=True):
+        for flag in app.PREMIUM_FLAGS.values():
+            on = brand_df[brand_df[flag] == True]
+            off = brand_df[brand_df[flag] == False]
+            if len(on) < 2 or len(off) < 2 or off['価格'].median() <= 0:
+                result[brand, flag] = 0.0
+            else:
+                result[brand, flag] = (on['価格'].median() - off['価格'].median()) / off['価格'].median() * 100
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--tail-brands', type=int, default=2000, help='ALL_BRANDS 以外の架空ブランドの数')
+    parser.add_argument('--resamples', type=int, nargs='+', default=[200, 1000, 5000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    raw = pd.concat(generate_listings(args.rows, args.seed, args.tail_brands), ignore_index=True)
+    df = app.compact_frame(app.enrich(raw))
+    codes, brands = group_codes(df, 'ブランド')
+    print(f"{len(df):,}行  {len(brands):,}ブランド")
+
+    start = time.perf_counter()
+    loop = loop_premiums(df)
+    print(f"  loop（点推定のみ）            {time.perf_counter() - start:7.2f}秒")
+
+    for resamples in args.resamples:
+        app.PREMIUM_RESAMPLES = resamples
+        start = time.perf_counter()
+        table = app.frame_premiums(df, codes, brands)
+        elapsed = time.perf_counter() - start
+        with_interval = int(table['novelty_low'].notna().sum() + table['box_low'].notna().sum())
+        print(f"  batch（再標本 {resamples:>5}回・区間つき） {elapsed:7.2f}秒  区間を出せた組 {with_interval:,}")
+
+    mismatch = sum(not np.isclose(loop[brand, flag], table.loc[brand, f'{name}_premium'])
+                   for brand in brands for name, flag in app.PREMIUM_FLAGS.items())
+    print(f"  点推定の不一致: {mismatch}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""合成の販売実績エクスポート生成
+
+build_complete_html.py が読むCSVと同じ列（タイトル・ブランド・価格・販売数・販売日）で、
+ブランドの偏り（ALL_BRANDS を Zipf 分布で選び、その他のブランドを長い裾として加える）、
+タイトルのキーワード、まとめ売り・ノベルティ・箱ありの頻度を実データに近づけたデータを作る。
+大きな行数でもメモリに載せきらないよう、chunk_rows 行ずつ生成して書き出す。
+
+    python benchmarks/generate_listings.py --rows 1000000 --out /tmp/listings_1m.csv
+"""
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from build_complete_html import ALL_BRANDS, BULK_KEYWORDS, HIGH_BRANDS, NOVELTY_KEYWORDS  # noqa: E402
+
+# 行ごとの出現率
+UNKNOWN_BRAND_RATE = 0.25       # ブランド列が「(不明)」か空欄
+TITLE_BRAND_RATE = 0.6          # ブランド不明行のうちタイトルにブランド名がある割合
+NOVELTY_RATE = 0.04
+BOX_RATE = 0.08
+BULK_RATE = 0.03
+OTHER_TYPE_RATE = 0.2           # タイトルにアイテムタイプの語がない割合
+MULTI_SALE_RATE = 0.12          # 販売数が2以上
+BLANK_SALES_RATE = 0.01         # 販売数が空欄
+
+DESCRIPTORS = ['Vintage', 'Gold', 'Silver', 'Gold Tone', 'Silver Tone', 'Pearl', 'Crystal', 'Rhinestone',
+               'Logo', 'CC', 'Enamel', 'Heart', 'Star', 'Flower', 'Ribbon', 'Authentic', 'Used', 'Two Tone',
+               'Large', 'Small', 'Mini', '925', '18K', 'Black', 'White', 'Red', 'Blue']
+# アイテムタイプ: (タイトルに入れる語, 出現率)
+TYPE_WORDS = {
+    'Stud': (['Stud', 'Studs'], 0.3), 'Hoop': (['Hoop', 'Hoops'], 0.15),
+    'Drop/Dangle': (['Drop', 'Dangle'], 0.2), 'Clip-on': (['Clip On', 'Clip-On'], 0.25),
+    'Huggie': (['Huggie'], 0.03), 'Threader': (['Threader'], 0.02), 'Ear Cuff': (['Ear Cuff'], 0.02),
+    'Leverback': (['Leverback'], 0.02), 'Chandelier': (['Chandelier'], 0.01),
+}
+BULK_COUNT_WORDS = ['PCS', 'Pieces', 'Pairs', 'Pair', 'Set']
+START_DATE = date(2025, 1, 1)
+DAYS = 400
+
+
+def brand_table(tail_brands, skew):
+    """ブランド名と選ばれる確率（ALL_BRANDS が上位、tail_brands 個の架空ブランドが裾）"""
+    names = list(ALL_BRANDS) + [f'Maker {i:04d}' for i in range(tail_brands)]
+    weights = 1.0 / np.arange(1, len(names) + 1) ** skew
+    return np.array(names, dtype=object), weights / weights.sum()
+
+
+def pick(rng, words, size):
+    return np.asarray(words, dtype=object)[rng.integers(0, len(words), size)]
+
+
+def join_words(rows, *columns):
+    """単語の列（None は飛ばす）を空白区切りで連結する"""
+    title = np.full(rows, '', dtype=object)
+    for column in columns:
+        column = np.broadcast_to(np.asarray(column, dtype=object), (rows,))
+        present = pd.notna(column)
+        title[present] = title[present] + ' ' + column[present]
+    return pd.Series(title, dtype=object).str[1:].to_numpy()
+
+
+def generate_chunk(rng, rows, brands, brand_p):
+    brand = brands[rng.choice(len(brands), size=rows, p=brand_p)]
+    high = np.isin(brand, HIGH_BRANDS)
+
+    unknown = rng.random(rows) < UNKNOWN_BRAND_RATE
+    in_title = ~unknown | (rng.random(rows) < TITLE_BRAND_RATE)
+    brand_column = brand.copy()
+    brand_column[unknown] = np.where(rng.random(unknown.sum()) < 0.5, '(不明)', None)
+
+    variants = [(word, p / len(words)) for words, p in TYPE_WORDS.values() for word in words]
+    type_p = np.array([p for _, p in variants])
+    type_word = np.array([word for word, _ in variants], dtype=object)[
+        rng.choice(len(variants), size=rows, p=type_p / type_p.sum())]
+    type_word[rng.random(rows) < OTHER_TYPE_RATE] = None
+
+    novelty = rng.random(rows) < NOVELTY_RATE
+    box = rng.random(rows) < BOX_RATE
+    bulk = rng.random(rows) < BULK_RATE
+    bulk_count = rng.random(rows) < 0.5
+    set_size = rng.integers(2, 21, rows)
+
+    bulk_word = np.where(bulk & ~bulk_count, pick(rng, BULK_KEYWORDS, rows), None)
+    bulk_word = np.where(bulk & bulk_count,
+                         pd.Series(set_size).astype(str).to_numpy(object) + ' ' + pick(rng, BULK_COUNT_WORDS, rows),
+                         bulk_word)
+    titles = join_words(
+        rows,
+        np.where(in_title, brand, None),
+        np.where(novelty, pick(rng, NOVELTY_KEYWORDS, rows), None),
+        pick(rng, DESCRIPTORS, rows),
+        np.where(rng.random(rows) < 0.5, pick(rng, DESCRIPTORS, rows), None),
+        type_word,
+        'Earrings',
+        bulk_word,
+        np.where(box, pick(rng, ['w/Box', 'with Box', 'Box'], rows), None),
+    )
+
+    # 価格: 対数正規（ハイブランドは高め、まとめ売りは割高、ノベルティは割安）
+    price = rng.lognormal(4.2, 0.75, rows) * np.where(high, 2.5, 1.0)
+    price *= np.where(bulk, 1.6, 1.0) * np.where(novelty, 0.7, 1.0) * np.where(box, 1.2, 1.0)
+
+    sales = np.where(rng.random(rows) < MULTI_SALE_RATE, rng.integers(2, 6, rows), 1).astype(object)
+    sales[rng.random(rows) < BLANK_SALES_RATE] = None
+
+    days = rng.integers(0, DAYS, rows)
+    sold = pd.to_datetime(START_DATE) + pd.to_timedelta(days, unit='D')
+
+    return pd.DataFrame({
+        'タイトル': titles,
+        'ブランド': brand_column,
+        '価格': np.round(price, 2),
+        '販売数': sales,
+        '販売日': sold.strftime('%Y-%m-%d'),
+    })
+
+
+def generate_listings(rows, seed=0, tail_brands=500, skew=1.1, chunk_rows=500000):
+    """rows 行の合成データを chunk_rows 行ずつの DataFrame として順に返す"""
+    rng = np.random.default_rng(seed)
+    brands, brand_p = brand_table(tail_brands, skew)
+    for start in range(0, rows, chunk_rows):
+        yield generate_chunk(rng, min(chunk_rows, rows - start), brands, brand_p)
+
+
+def write_listings(path, rows, seed=0, tail_brands=500, skew=1.1, chunk_rows=500000):
+    for i, chunk in enumerate(generate_listings(rows, seed, tail_brands, skew, chunk_rows)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tail-brands', type=int, default=500, help='ALL_BRANDS 以外の架空ブランドの数')
+    parser.add_argument('--skew', type=float, default=1.1, help='ブランド人気の Zipf 指数')
+    args = parser.parse_args()
+    write_listings(args.out, args.rows, args.seed, args.tail_brands, args.skew)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""タイトルからのブランド検出インデックス
+
+ブランド名キーワードをトライ構造の正規表現1本にまとめ、各タイトルを1回走査するだけで
+優先順位の最も高いブランドを求める。ブランド数が増えてもタイトルごとの
+キーワード総当たりにならない。
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def trie_pattern(node):
+    """トライをバックトラックの少ない正規表現に変換（同じ位置では最長一致を返す）"""
+    alternatives = [re.escape(ch) + trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not alternatives:
+        return ''
+    body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        return '(?:' + body + ')?'
+    return body
+
+
+def build_brand_index(rules):
+    """(ブランド名, [キーワード...]) のリストから検出インデックスを作る
+
+    rules は優先順（先頭ほど優先）。キーワードは大文字で指定する。
+    """
+    priority = {}
+    for rank, (_, keywords) in enumerate(rules):
+        for kw in keywords:
+            priority.setdefault(kw, rank)
+
+    # ある位置で最長一致したキーワードの接頭辞になっているキーワードも同じ位置で一致しているので、
+    # その中で最も優先度の高いものを事前に求めておく
+    best = {}
+    for kw in priority:
+        best[kw] = min(priority[kw[:i]] for i in range(1, len(kw) + 1) if kw[:i] in priority)
+
+    trie = {}
+    for kw in priority:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    return {
+        'pattern': re.compile('(?=(' + trie_pattern(trie) + '))') if trie else None,
+        'priority': best,
+        'brands': np.array([brand for brand, _ in rules], dtype=object),
+    }
+
+
+def match_brands(index, titles):
+    """各タイトルで最も優先度の高いブランド名を返す（一致なしは None）
+
+    重複タイトルはユニーク値だけを大文字化して照合し、元の行に展開する。
+    """
+    codes, uniques = pd.factorize(titles, use_na_sentinel=False)
+    result = np.full(len(uniques), None, dtype=object)
+    if len(uniques) > 0 and index['pattern'] is not None:
+        upper = pd.Series(uniques, dtype=object).map(str).str.upper()
+        found = upper.str.findall(index['pattern']).explode()
+        best = found.map(index['priority']).groupby(level=0).min()
+        best = best.reindex(range(len(uniques))).to_numpy()
+        matched = ~np.isnan(best)
+        result[matched] = index['brands'][best[matched].astype(int)]
+    return pd.Series(result[codes], index=titles.index, dtype=object)
@@ -7,8 +7,36 @@ from collections import defaultdict
 import re
 from datetime import datetime
 import numpy as np
+import os
+import glob
+import hashlib
+import argparse
+import sys
+import io
+from functools import partial
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import orjson
+except ImportError:  # orjson が無ければ埋め込みデータも標準の json で書き出す
+    orjson = None
+
+from brand_index import build_brand_index, match_brands
+from html_pack import (PRECOMPRESSED, add_style_rules, apply_style_classes, minify_html, minify_scripts, minify_styles,
+                       precompress, style_classes)
+from accumulators import (PRICE_QUANTILES, bootstrap_medians, build_state, group_codes, group_histogram,
+                          group_quantiles, group_table, grouped_top, index_quantiles, merge_states, new_row_mask,
+                          price_histogram, price_index, ranking_order, rollup, row_fingerprints)
+from instrument import stage, start_profile, stop_profile
+from sales_cube import CUBE_KEYS, build_cube, cube_rollup, monthly_table
+from svg_charts import render_chart
 
 # 設定
+INPUT_CSV = '/Users/naokijodan/Desktop/イヤリング市場データ_sheet8_2026-02-07.csv'
+OUTPUT_PATH = '/Users/naokijodan/Desktop/earring-market-analysis/index.html'
+CACHE_DIR = os.path.join(os.path.dirname(OUTPUT_PATH), '.cache')
 SHIPPING_JPY = 2700
 EXCHANGE_RATE = 155
 FEE_RATE = 0.20
@@ -57,49 +85,64 @@ BRAND_JP = {
     'A BATHING APE': 'ア ベイシング エイプ',
 }
 
-# CSVファイル読み込み
-df = pd.read_csv('/Users/naokijodan/Desktop/イヤリング市場データ_sheet8_2026-02-07.csv')
-
-print(f"=== データ読み込み完了 ===")
-print(f"総件数: {len(df)}")
-
-# 販売数を数値に変換
-df['販売数'] = pd.to_numeric(df['販売数'], errors='coerce').fillna(1).astype(int)
-df['売上'] = df['価格'] * df['販売数']
-
-total_sales = int(df['販売数'].sum())
-total_revenue = float(df['売上'].sum())
-
-period_start = df['販売日'].min()
-period_end = df['販売日'].max()
-
-df['販売日_dt'] = pd.to_datetime(df['販売日'], errors='coerce')
-df['販売月'] = df['販売日_dt'].dt.to_period('M').astype(str)
-
-# アイテムタイプ分類
-def extract_item_type(title):
-    title_upper = str(title).upper()
-    if 'STUD' in title_upper:
-        return 'Stud'
-    if 'HOOP' in title_upper:
-        return 'Hoop'
-    if 'DROP' in title_upper or 'DANGLE' in title_upper:
-        return 'Drop/Dangle'
-    if 'CLIP' in title_upper:
-        return 'Clip-on'
-    if 'HUGGIE' in title_upper:
-        return 'Huggie'
-    if 'THREADER' in title_upper:
-        return 'Threader'
-    if 'CUFF' in title_upper:
-        return 'Ear Cuff'
-    if 'LEVERBACK' in title_upper:
-        return 'Leverback'
-    if 'CHANDELIER' in title_upper:
-        return 'Chandelier'
-    return 'Other'
-
-df['アイテムタイプ'] = df['タイトル'].apply(extract_item_type)
+# タイトル分類ルール（アイテムタイプは上から順に最初に一致したものを採用）
+ITEM_TYPE_RULES = [
+    ('Stud', ['STUD']),
+    ('Hoop', ['HOOP']),
+    ('Drop/Dangle', ['DROP', 'DANGLE']),
+    ('Clip-on', ['CLIP']),
+    ('Huggie', ['HUGGIE']),
+    ('Threader', ['THREADER']),
+    ('Ear Cuff', ['CUFF']),
+    ('Leverback', ['LEVERBACK']),
+    ('Chandelier', ['CHANDELIER']),
+]
+NOVELTY_KEYWORDS = ['NOVELTY', 'GWP', 'LIMITED', 'NOT FOR SALE', '非売品', 'RARE', 'VIP', 'GIFT']
+BOX_KEYWORDS = ['W/BOX', 'WITH BOX', 'BOX']
+BULK_COUNT_PATTERN = r'(\d+)\s*(PCS|PIECES|PAIRS?|SET)'
+BULK_KEYWORDS = ['LOT', 'BULK', 'SET OF', 'BUNDLE', 'COLLECTION', 'まとめ', 'セット']
+
+def keyword_pattern(keywords):
+    return '|'.join(re.escape(kw) for kw in keywords)
+
+def classify_titles(titles):
+    """アイテムタイプ・ノベルティ・箱あり・まとめ売り詳細をまとめて判定する
+
+    重複の多いタイトルはユニーク値だけを1回大文字化し、各ルールを
+    ベクトル化した文字列演算で判定してから元の行に展開する。
+    """
+    with stage('unique_titles'):
+        codes, uniques = pd.factorize(titles, use_na_sentinel=False)
+        upper = pd.Series(uniques, dtype=object).map(str).str.upper()
+
+    with stage('item_type'):
+        item_type = np.select(
+            [upper.str.contains(keyword_pattern(kws)).to_numpy(bool) for _, kws in ITEM_TYPE_RULES],
+            [item_type for item_type, _ in ITEM_TYPE_RULES],
+            'Other'
+        ).astype(object)
+
+    # まとめ売り判定: セット数 → キーワードの順
+    with stage('bulk'):
+        set_count = upper.str.extract(BULK_COUNT_PATTERN)[0].astype(float).to_numpy()
+        bulk_detail = np.select(
+            [set_count >= 10, set_count >= 5, set_count >= 2,
+             upper.str.contains(keyword_pattern(BULK_KEYWORDS)).to_numpy(bool)],
+            ['10個以上', '5-9個', '2-4個', 'セット（個数不明）'],
+            None
+        )
+
+    with stage('novelty'):
+        novelty = upper.str.contains(keyword_pattern(NOVELTY_KEYWORDS)).to_numpy(bool)
+    with stage('box'):
+        box = upper.str.contains(keyword_pattern(BOX_KEYWORDS)).to_numpy(bool)
+
+    return pd.DataFrame({
+        'アイテムタイプ': item_type[codes],
+        'まとめ売り詳細': bulk_detail[codes],
+        'ノベルティ': novelty[codes],
+        '箱あり': box[codes],
+    }, index=titles.index)
 
 # ブランドカテゴリ分類
 HIGH_BRANDS = ['CHANEL', 'DIOR', 'LOUIS VUITTON', 'GUCCI', 'HERMES', 'PRADA', 'FENDI', 'CELINE',
@@ -111,26 +154,21 @@ CHARACTER_BRANDS = ['POKEMON', 'SANRIO', 'DISNEY']
 
 ALL_BRANDS = HIGH_BRANDS + DESIGNER_BRANDS + CHARACTER_BRANDS
 
-def detect_brand_from_title(row):
-    brand = row['ブランド']
-    title = str(row['タイトル']).upper()
-    if pd.isna(brand) or brand == '(不明)' or brand == '':
-        if 'VIVIENNE' in title or 'WESTWOOD' in title:
-            return 'Vivienne Westwood'
-        if 'POKEMON' in title or 'POKÉMON' in title:
-            return 'POKEMON'
-        if 'TIFFANY' in title:
-            return 'TIFFANY'
-        if 'SWAROVSKI' in title:
-            return 'SWAROVSKI'
-        if 'GEORG JENSEN' in title:
-            return 'Georg Jensen'
-        for b in ALL_BRANDS:
-            if b.upper() in title:
-                return b
-    return brand
-
-df['ブランド'] = df.apply(detect_brand_from_title, axis=1)
+# タイトルからのブランド検出ルール（先頭ほど優先）
+BRAND_TITLE_RULES = [
+    ('Vivienne Westwood', ['VIVIENNE', 'WESTWOOD']),
+    ('POKEMON', ['POKEMON', 'POKÉMON']),
+    ('TIFFANY', ['TIFFANY']),
+    ('SWAROVSKI', ['SWAROVSKI']),
+    ('Georg Jensen', ['GEORG JENSEN']),
+] + [(b, [b.upper()]) for b in ALL_BRANDS]
+BRAND_INDEX = build_brand_index(BRAND_TITLE_RULES)
+
+def detect_brands(brands, titles, index=BRAND_INDEX):
+    """ブランド不明の行だけタイトルからブランドを補完する（index は build_brand_index の索引）"""
+    unknown = brands.isna() | brands.isin(['(不明)', ''])
+    detected = match_brands(index, titles[unknown]).reindex(brands.index)
+    return brands.astype(object).mask(detected.notna(), detected)
 
 def categorize_brand(brand):
     if pd.isna(brand) or brand == '(不明)' or brand == '':
@@ -147,70 +185,198 @@ def categorize_brand(brand):
             return 'キャラクター'
     return 'その他'
 
-df['ブランドカテゴリ'] = df['ブランド'].apply(categorize_brand)
-
-# まとめ売り判定（詳細分析用）
-def analyze_bulk(title):
-    title_upper = str(title).upper()
-    # セット数を抽出
-    match = re.search(r'(\d+)\s*(PCS|PIECES|PAIRS?|SET)', title_upper)
-    if match:
-        count = int(match.group(1))
-        if count >= 10:
-            return '10個以上'
-        elif count >= 5:
-            return '5-9個'
-        elif count >= 2:
-            return '2-4個'
-
-    bulk_keywords = ['LOT', 'BULK', 'SET OF', 'BUNDLE', 'COLLECTION', 'まとめ', 'セット']
-    for kw in bulk_keywords:
-        if kw in title_upper:
-            return 'セット（個数不明）'
-    return None
-
-df['まとめ売り詳細'] = df['タイトル'].apply(analyze_bulk)
-df['まとめ売り'] = df['まとめ売り詳細'].notna()
-
-# ノベルティ判定
-def is_novelty(title):
-    novelty_keywords = ['NOVELTY', 'GWP', 'LIMITED', 'NOT FOR SALE', '非売品', 'RARE', 'VIP', 'GIFT']
-    title_upper = str(title).upper()
-    for kw in novelty_keywords:
-        if kw in title_upper:
-            return True
-    return False
-
-df['ノベルティ'] = df['タイトル'].apply(is_novelty)
-
-# 箱あり判定
-def has_box(title):
-    title_upper = str(title).upper()
-    return 'W/BOX' in title_upper or 'WITH BOX' in title_upper or 'BOX' in title_upper
-
-df['箱あり'] = df['タイトル'].apply(has_box)
-
-# 仕入れ上限計算
-df['仕入れ上限'] = df['価格'] * EXCHANGE_RATE * (1 - FEE_RATE) - SHIPPING_JPY
+# 分類ルールの版数（判定ロジックを変えたら上げる。ルール表の変更はキャッシュキーに自動で反映される）
+CLASSIFY_RULES_VERSION = 1
+
+def classify_rules_fingerprint():
+    rules = [CLASSIFY_RULES_VERSION, ITEM_TYPE_RULES, NOVELTY_KEYWORDS, BOX_KEYWORDS, BULK_COUNT_PATTERN,
+             BULK_KEYWORDS, BRAND_TITLE_RULES, HIGH_BRANDS, DESIGNER_BRANDS, CHARACTER_BRANDS]
+    return hashlib.sha256(json.dumps(rules, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+def enrich(df):
+    """読み込んだ販売データに数値変換・日付・分類の派生列を追加する"""
+    # 販売数を数値に変換
+    with stage('numeric'):
+        df['販売数'] = pd.to_numeric(df['販売数'], errors='coerce').fillna(1).astype(int)
+        df['売上'] = df['価格'] * df['販売数']
+
+    with stage('parse_dates'):
+        df['販売日_dt'] = pd.to_datetime(df['販売日'], errors='coerce')
+        df['販売月'] = df['販売日_dt'].dt.to_period('M').astype(str)
+
+    with stage('classify_titles'):
+        title_flags = classify_titles(df['タイトル'])
+    df['アイテムタイプ'] = title_flags['アイテムタイプ']
+    with stage('detect_brands'):
+        df['ブランド'] = detect_brands(df['ブランド'], df['タイトル'])
+    with stage('categorize_brands'):
+        df['ブランドカテゴリ'] = df['ブランド'].apply(categorize_brand)
+    df['まとめ売り詳細'] = title_flags['まとめ売り詳細']
+    df['まとめ売り'] = df['まとめ売り詳細'].notna()
+    df['ノベルティ'] = title_flags['ノベルティ']
+    df['箱あり'] = title_flags['箱あり']
+    return df
+
+# 全件読み込み時の列の型: 少種類の文字列はカテゴリ型、タイトルは Arrow 文字列（pyarrow があれば）
+CATEGORY_COLUMNS = ['ブランド', 'アイテムタイプ', 'ブランドカテゴリ', 'まとめ売り詳細', '販売月']
+
+def csv_dtypes():
+    dtypes = {'ブランド': 'category'}
+    try:
+        import pyarrow  # noqa: F401
+        dtypes['タイトル'] = 'string[pyarrow]'
+    except ImportError:
+        pass
+    return dtypes
+
+def narrow_int(values):
+    """合計まで収まる最小の整数型に変換する（どのグループの合計も全体の合計を超えないので桁あふれしない）"""
+    bound = int(values.abs().sum())
+    for dtype in (np.int8, np.int16, np.int32):
+        if bound <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
+
+def compact_frame(df):
+    """分類済みの DataFrame を省メモリな型にする
+
+    少種類の文字列はカテゴリ型（groupby はカテゴリコードで行われる）、販売日は順序付きカテゴリ、
+    販売数は narrow_int で縮める。価格と売上は合計・中央値をそのまま表示するので float64 のまま。
+    """
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
+    df['販売日'] = df['販売日'].astype(pd.CategoricalDtype(sorted(df['販売日'].dropna().unique()), ordered=True))
+    df['販売数'] = narrow_int(df['販売数'])
+    return df
+
+def frame_memory(df):
+    """列ごとのメモリ使用量（バイト、文字列の中身まで含む）"""
+    return df.memory_usage(deep=True, index=False)
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_enriched(csv_path, cache_dir=CACHE_DIR):
+    """CSVを読み込んで enrich した DataFrame と、キャッシュを使ったかを返す
+
+    CSVの内容ハッシュと分類ルールの版数をキーに、分類済みデータを Parquet で保存しておき、
+    同じ入力なら読み込み・日付変換・分類をすべて省略する。Parquet が使えない環境ではキャッシュしない。
+    """
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    cache_key = f"{file_hash(csv_path)[:16]}_{classify_rules_fingerprint()}"
+    cache_path = os.path.join(cache_dir, f'{stem}.{cache_key}.parquet')
+    if os.path.exists(cache_path):
+        try:
+            with stage('ingest'):
+                return pd.read_parquet(cache_path), True
+        except ImportError:
+            pass
+
+    with stage('ingest'):
+        df = pd.read_csv(csv_path, dtype=csv_dtypes())
+    with stage('enrich'):
+        df = compact_frame(enrich(df))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with stage('cache_write'):
+            df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except ImportError:
+        print("⚠️ pyarrow が無いため分類済みキャッシュを保存しません")
+        return df, False
+    # 同じCSVの古いキャッシュを削除
+    for old_path in glob.glob(os.path.join(cache_dir, glob.escape(stem) + '.*.parquet')):
+        if old_path != cache_path:
+            os.remove(old_path)
+    return df, False
+
+# 仕入れ上限計算（設定値に依存するためキャッシュには含めない）
+def purchase_limit(price):
+    return price * EXCHANGE_RATE * (1 - FEE_RATE) - SHIPPING_JPY
 
 # ブランド別統計
-def get_brand_stats(brand_df):
+def get_brand_stats(brand_df, price_order=None):
     if len(brand_df) == 0:
-        return {'count': 0, 'sales': 0, 'revenue': 0, 'avg_price': 0, 'median_price': 0,
-                'min_price': 0, 'max_price': 0, 'cv': 0, 'purchase_limit': 0}
-    sales = int(brand_df['販売数'].sum())
-    prices = brand_df['価格']
-    return {
-        'count': len(brand_df),
-        'sales': sales,
-        'revenue': float(brand_df['売上'].sum()),
-        'avg_price': float(prices.mean()),
-        'median_price': float(prices.median()),
-        'min_price': float(prices.min()),
-        'max_price': float(prices.max()),
-        'cv': float(prices.std() / prices.mean()) if prices.mean() > 0 else 0,
-        'purchase_limit': float(brand_df['仕入れ上限'].median())
-    }
+        return dict.fromkeys(STATS_KEYS, 0)
+    columns = brand_df[['価格', '販売数', '売上']]
+    return aggregate_stats(columns.assign(_all=0), '_all', price_order)[0]
+
+# 統計 dict の項目（価格の分位点と、それを仕入れ上限に換算した値を含む）
+LIMIT_QUANTILES = {'purchase_limit': 'median_price', 'purchase_limit_p25': 'p25_price',
+                   'purchase_limit_p75': 'p75_price', 'purchase_limit_p90': 'p90_price'}
+STATS_KEYS = (['count', 'sales', 'revenue', 'avg_price', 'min_price', 'max_price', 'cv']
+              + list(PRICE_QUANTILES) + list(LIMIT_QUANTILES))
+
+def add_purchase_limits(table):
+    """価格の分位点から仕入れ上限の分位点を求める
+
+    仕入れ上限は価格の増加する一次関数なので、その分位点は価格の分位点を同じ式で換算した値になる
+    （仕入れ上限の列を並べ替え直す必要はない）。
+    """
+    for limit, price in LIMIT_QUANTILES.items():
+        table[limit] = purchase_limit(table[price])
+    return table
+
+# グループ別統計（1パス集計）
+def aggregate_stats(frame, keys, price_order=None):
+    """keys でグループ化し、全グループの get_brand_stats 相当の統計を1回の groupby で計算する
+
+    中央値などの分位点は、(グループ, 価格) の順に並べた価格の索引から全グループ分をまとめて読む
+    （accumulators.price_index）。同じ frame を何通りにも集計するときは、価格の昇順
+    （np.argsort(frame['価格'])）を price_order に渡せば価格のソートは1回で済む。
+    keys が列名1つならグループ値、リストならタプルをキーとする dict を返す。
+    グループの並びは初出順（unique() と同じ）。
+    """
+    if len(frame) == 0:
+        return {}
+    grouped = frame.groupby(keys, sort=False, observed=True)
+    agg = grouped.agg(
+        count=('価格', 'size'),
+        sales=('販売数', 'sum'),
+        revenue=('売上', 'sum'),
+        avg_price=('価格', 'mean'),
+        min_price=('価格', 'min'),
+        max_price=('価格', 'max'),
+        std_price=('価格', 'std'),
+    )
+    mean = agg['avg_price']
+    agg['cv'] = np.where(mean > 0, agg['std_price'] / mean.where(mean > 0), 0)
+    # グループ番号は agg の行の並び（初出順）と同じ。キーが欠損の行は -1 で索引に入らない
+    codes, _ = group_codes(frame, keys)
+    index = price_index(codes, frame['価格'], groups=len(agg), price_order=price_order)
+    quantiles = index_quantiles(index, list(PRICE_QUANTILES.values()))
+    for j, name in enumerate(PRICE_QUANTILES):
+        agg[name] = quantiles[:, j]
+    return stats_dicts(add_purchase_limits(agg))
+
+
+def stats_dicts(agg):
+    """グループ別統計の DataFrame（列は STATS_KEYS）をグループキー → 統計 dict に変換"""
+    result = {}
+    for key, row in zip(agg.index, agg.itertuples(index=False)):
+        stats = {name: float(getattr(row, name)) for name in STATS_KEYS}
+        stats['count'] = int(row.count)
+        stats['sales'] = int(row.sales)
+        result[key] = stats
+    return result
+
+def brand_stats_by(pair_stats):
+    """(外側キー, ブランド) の統計を、外側キーごとの販売数順ブランドリストに変換"""
+    nested = defaultdict(list)
+    for (outer, brand), stats in pair_stats.items():
+        if brand == '' or brand == '(不明)':
+            continue
+        stats = dict(stats)
+        stats['brand'] = brand
+        nested[outer].append(stats)
+    for stats_list in nested.values():
+        stats_list.sort(key=lambda x: x['sales'], reverse=True)
+    return nested
 
 def get_stability(cv):
     if cv <= 0.3:
@@ -222,96 +388,592 @@ def get_stability(cv):
     else:
         return '☆☆☆'
 
-def calc_novelty_premium(brand_df):
-    novelty = brand_df[brand_df['ノベルティ'] == True]
-    regular = brand_df[brand_df['ノベルティ'] == False]
-    if len(novelty) < 2 or len(regular) < 2:
-        return 0.0
-    return float((novelty['価格'].median() - regular['価格'].median()) / regular['価格'].median() * 100) if regular['価格'].median() > 0 else 0.0
-
-def calc_box_premium(brand_df):
-    with_box = brand_df[brand_df['箱あり'] == True]
-    without_box = brand_df[brand_df['箱あり'] == False]
-    if len(with_box) < 2 or len(without_box) < 2:
-        return 0.0
-    return float((with_box['価格'].median() - without_box['価格'].median()) / without_box['価格'].median() * 100) if without_box['価格'].median() > 0 else 0.0
-
-def get_price_distribution(prices):
-    bins = [0, 50, 100, 150, 200, 250, 300, 400, 500, 750, 1000, float('inf')]
-    labels = ['$0-49', '$50-99', '$100-149', '$150-199', '$200-249', '$250-299',
-              '$300-399', '$400-499', '$500-749', '$750-999', '$1000+']
-    distribution = pd.cut(prices, bins=bins, labels=labels).value_counts().sort_index()
-    return {str(k): int(v) for k, v in distribution.items()}
+# ノベルティ・箱ありの価格プレミアムの信頼区間（ブートストラップの再標本数・信頼水準・乱数シード）
+PREMIUM_RESAMPLES = 1000
+PREMIUM_CI_LEVEL = 0.95
+PREMIUM_SEED = 0
+PREMIUM_FLAGS = {'novelty': 'ノベルティ', 'box': '箱あり'}
+
+def flag_premiums(codes, flags, prices, groups, counts=None, resamples=None):
+    """グループごとの「条件あり／なし」の中央値の差（%）と、そのブートストラップ信頼区間
+
+    codes はグループ番号（0 から groups-1。負の値の行は対象外）、flags は条件の真偽。グループ × 条件の
+    セルで価格の索引を1回作り、全グループの中央値と resamples 回分の再標本の中央値をまとめて求める
+    （accumulators.bootstrap_medians。条件あり・なしはそれぞれの件数で別々に再標本する）。
+    条件あり・なしのどちらかが2件未満か、なしの中央値が0以下のグループは点推定を0、区間を NaN にする。
+    行がグループ番号、列が premium・low・high の DataFrame を返す。
+    """
+    resamples = PREMIUM_RESAMPLES if resamples is None else resamples
+    codes = np.asarray(codes, dtype=np.int64)
+    cells = np.where(codes >= 0, codes * 2 + np.asarray(flags, dtype=bool), -1)
+    index = price_index(cells, prices, counts, groups * 2)
+    total = index['total'].reshape(groups, 2)
+    median = index_quantiles(index, [0.5]).reshape(groups, 2)
+    valid = (total >= 2).all(axis=1) & (median[:, 0] > 0)
+    result = pd.DataFrame({'premium': 0.0, 'low': np.nan, 'high': np.nan}, index=range(groups))
+    if not valid.any():
+        return result
+    off, on = median[valid, 0], median[valid, 1]
+    result.loc[valid, 'premium'] = (on - off) / off * 100
+
+    boot = bootstrap_medians(index, resamples, np.random.default_rng(PREMIUM_SEED)).reshape(groups, 2, resamples)
+    boot_off, boot_on = boot[valid, 0], boot[valid, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boot_premium = np.where(boot_off > 0, (boot_on - boot_off) / boot_off * 100, np.nan)
+    tail = (1 - PREMIUM_CI_LEVEL) / 2
+    quantile = np.nanquantile if np.isnan(boot_premium).any() else np.quantile
+    result.loc[valid, ['low', 'high']] = quantile(boot_premium, [tail, 1 - tail], axis=1).T
+    return result
+
+def frame_premiums(frame, codes, index):
+    """行データからグループごとのノベルティ・箱ありのプレミアムの表を作る
+
+    codes は行のグループ番号、index は番号順のグループのキー。列は novelty_premium・novelty_low・
+    novelty_high・box_premium…
+    """
+    tables = []
+    for name, flag in PREMIUM_FLAGS.items():
+        table = flag_premiums(codes, frame[flag].to_numpy(dtype=bool), frame['価格'], len(index))
+        tables.append(table.add_prefix(f'{name}_'))
+    return pd.concat(tables, axis=1).set_axis(index)
+
+def state_premiums(flag_groups, key, index):
+    """集計状態（条件 × key のグループの価格別件数）から frame_premiums と同じ表を作る"""
+    tables = []
+    for name, flag in PREMIUM_FLAGS.items():
+        frame = flag_groups[name]['prices'].rename('n').reset_index()
+        codes = index.get_indexer(frame[key])
+        table = flag_premiums(codes, frame[flag].to_numpy(dtype=bool), frame['価格'], len(index), frame['n'])
+        tables.append(table.add_prefix(f'{name}_'))
+    return pd.concat(tables, axis=1).set_axis(index)
+
+def premium_fields(premiums, key):
+    """プレミアムの表から1グループ分のタブの項目（novelty_premium と区間 novelty_premium_ci など）を引く
+
+    多数のグループを引くときは premiums に表の to_dict('index') を渡すと、行ごとの .loc を避けられる。
+    """
+    fields = {}
+    row = premiums.get(key, {}) if isinstance(premiums, dict) else premiums.loc[key] if key in premiums.index else {}
+    for name in PREMIUM_FLAGS:
+        fields[f'{name}_premium'] = float(row.get(f'{name}_premium', 0.0))
+        fields[f'{name}_premium_ci'] = (float(row.get(f'{name}_low', np.nan)), float(row.get(f'{name}_high', np.nan)))
+    return fields
+
+PRICE_BINS = [0, 50, 100, 150, 200, 250, 300, 400, 500, 750, 1000, float('inf')]
+PRICE_LABELS = ['$0-49', '$50-99', '$100-149', '$150-199', '$200-249', '$250-299',
+                '$300-399', '$400-499', '$500-749', '$750-999', '$1000+']
+
+# 価格帯の区切り方: 'fixed' は PRICE_BINS、'quantile' は全体の価格の分位点で PRICE_QUANTILE_BINS 等分
+# （区切りは有効数字2桁に丸める。stream モードでは価格を丸めて数えるので、分位点の区切りの件数は近似値）
+PRICE_BIN_MODE = 'fixed'
+PRICE_QUANTILE_BINS = 10
+
+def price_labels(edges):
+    """区切りから '$50-99'・'$1000+' 形式のラベルを作る（PRICE_LABELS と同じ書式）"""
+    labels = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        labels.append(f"${low:.0f}+" if np.isinf(high) else f"${low:.0f}-{high - 1:.0f}")
+    return labels
+
+def price_bins(overall_quantiles=None):
+    """価格帯の区切りとラベル
+
+    'quantile' のときは overall_quantiles（全体の価格の分位点を返す関数。分位の配列を受け取る）で区切る。
+    """
+    if PRICE_BIN_MODE != 'quantile':
+        return PRICE_BINS, PRICE_LABELS
+    qs = np.arange(1, PRICE_QUANTILE_BINS) / PRICE_QUANTILE_BINS
+    cuts = sorted({float(f"{q:.2g}") for q in overall_quantiles(qs) if q > 0})
+    edges = [0] + cuts + [float('inf')]
+    return edges, price_labels(edges)
+
+def histogram_table(matrix, index, labels):
+    """グループ × 価格帯の件数行列を DataFrame にする（任意のグループの分布は行を引くだけ）"""
+    return pd.DataFrame(matrix, index=index, columns=labels)
+
+def price_histograms(frame, keys, edges, labels):
+    """keys のグループごとの価格帯別件数（全行の価格帯を1回で求める accumulators.price_histogram）"""
+    codes, index = group_codes(frame, keys)
+    return histogram_table(price_histogram(codes, frame['価格'], edges, len(index)), index, labels)
+
+def distribution(table, key):
+    """価格帯別件数の表からグループ1つ分の分布（ラベル → 件数）を引く（table は表か、その to_dict('index')）"""
+    row = table[key] if isinstance(table, dict) else table.loc[key]
+    return {label: int(n) for label, n in row.items()}
 
 # 検索リンク生成関数
-def gen_ebay_link(brand, item_type=None):
+# タイプ指定の無い検索でブランド名のあとに付ける語（eBay, メルカリ の URL に入る形）。
+# ノベルティ・まとめ売りのタブは専用の語で検索する。ブラウザ側の ebayLink / mercariLink も同じ規則で作る
+SEARCH_QUERIES = {
+    'earrings': ('earrings', 'イヤリング'),
+    'novelty': ('novelty+earrings', 'ノベルティ%20イヤリング'),
+    'bundle': ('earrings+lot', 'イヤリング%20まとめ'),
+}
+
+def gen_ebay_link(brand, item_type=None, query='earrings'):
     brand_search = brand.replace(' ', '+')
     if item_type and item_type in TYPE_KEYWORDS:
         type_en = TYPE_KEYWORDS[item_type]['en'].replace(' ', '+')
         return f"https://www.ebay.com/sch/i.html?_nkw={brand_search}+{type_en}&LH_Sold=1&LH_Complete=1"
-    return f"https://www.ebay.com/sch/i.html?_nkw={brand_search}+earrings&LH_Sold=1&LH_Complete=1"
+    return f"https://www.ebay.com/sch/i.html?_nkw={brand_search}+{SEARCH_QUERIES[query][0]}&LH_Sold=1&LH_Complete=1"
 
-def gen_mercari_link(brand, item_type=None):
+def gen_mercari_link(brand, item_type=None, query='earrings'):
     brand_jp = BRAND_JP.get(brand, brand)
     if item_type and item_type in TYPE_KEYWORDS:
         type_jp = TYPE_KEYWORDS[item_type]['jp']
         return f"https://jp.mercari.com/search?keyword={brand_jp}%20{type_jp}&status=on_sale"
-    return f"https://jp.mercari.com/search?keyword={brand_jp}%20イヤリング&status=on_sale"
+    return f"https://jp.mercari.com/search?keyword={brand_jp}%20{SEARCH_QUERIES[query][1]}&status=on_sale"
 
 # 検索リンク行生成（チェックボックス付き）
-def gen_search_links(brand, item_type=None, row_id=''):
-    ebay_url = gen_ebay_link(brand, item_type)
-    mercari_url = gen_mercari_link(brand, item_type)
-    return f'''
+SEARCH_LINKS = '''
         <a href="{ebay_url}" target="_blank" class="link-btn link-ebay">eBay</a>
         <input type="checkbox" class="search-checkbox" data-id="{row_id}_ebay">
         <a href="{mercari_url}" target="_blank" class="link-btn link-mercari">メルカリ</a>
         <input type="checkbox" class="search-checkbox" data-id="{row_id}_mercari">
     '''
 
-# ブランド別統計リスト
-brand_stats_list = []
-for brand in df['ブランド'].dropna().unique():
-    if brand == '' or brand == '(不明)':
-        continue
-    brand_df = df[df['ブランド'] == brand]
-    stats = get_brand_stats(brand_df)
-    stats['brand'] = brand
-    stats['category'] = categorize_brand(brand)
-    brand_stats_list.append(stats)
-brand_stats_list.sort(key=lambda x: x['sales'], reverse=True)
-top20_brands = brand_stats_list[:20]
-
-overall_stats = get_brand_stats(df)
-
-# アイテムタイプ別統計
-item_type_stats = {}
-for item_type in df['アイテムタイプ'].unique():
-    type_df = df[df['アイテムタイプ'] == item_type]
-    item_type_stats[item_type] = get_brand_stats(type_df)
-
-# ブランドカテゴリ別統計
-brand_cat_stats = {}
-for cat in df['ブランドカテゴリ'].unique():
-    cat_df = df[df['ブランドカテゴリ'] == cat]
-    brand_cat_stats[cat] = {
-        'sales': int(cat_df['販売数'].sum()),
-        'revenue': float(cat_df['売上'].sum())
+def search_links_html(ebay_url, mercari_url, row_id):
+    return SEARCH_LINKS.format(ebay_url=ebay_url, mercari_url=mercari_url, row_id=row_id)
+
+def gen_search_links(brand, item_type=None, row_id='', query='earrings'):
+    return search_links_html(gen_ebay_link(brand, item_type, query), gen_mercari_link(brand, item_type, query), row_id)
+
+# ブランド個別タブの対象ブランド判定（表記ゆれをまとめるブランドは部分一致）
+def tab_brand_matches(tab_brand, brand):
+    for key in ('Vivienne', 'TIFFANY', 'Georg Jensen'):
+        if key in tab_brand:
+            return key.upper() in brand.upper()
+    return brand.upper() == tab_brand.upper()
+
+def brand_tab_id(brand):
+    return brand.replace(' ', '_').replace('&', '').replace('.', '')
+
+def brand_cat_sales(cube):
+    """ブランドカテゴリ別の販売数・売上（売上キューブから）"""
+    return {row.Index: {'sales': int(row.sales), 'revenue': float(row.revenue)}
+            for row in cube_rollup(cube, ['ブランドカテゴリ']).itertuples()}
+
+def brand_tab_cube_views(cube, tab_pairs):
+    """ブランドタブごとのアイテムタイプ別件数（件数順、同数は出現順）と月別販売数を売上キューブから求める
+
+    tab_pairs は [ブランド, _tab] の DataFrame（表記ゆれのまとめを含むタブ番号の対応）。
+    """
+    item_dist = defaultdict(dict)
+    for (tab_no, item_type), count in cube_rollup(cube, ['ブランド', 'アイテムタイプ'], tab_pairs)['count'].items():
+        item_dist[tab_no][item_type] = int(count)
+    monthly = defaultdict(dict)
+    for (tab_no, month), sales in cube_rollup(cube, ['ブランド', '販売月'], tab_pairs)['sales'].items():
+        monthly[tab_no][month] = int(sales)
+    item_dist = {tab_no: dict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
+                 for tab_no, counts in item_dist.items()}
+    monthly = {tab_no: dict(sorted(sales.items())) for tab_no, sales in monthly.items()}
+    return item_dist, monthly
+
+# 上位の出品（順位の付け方: 順位を決める列。前の列ほど優先し、すべて同じなら先の行を優先）
+TOP_K = 15
+TOP_RANKINGS = {'sales': ['販売数'], 'revenue': ['売上', '販売数'], 'price': ['価格', '販売数']}
+# 全グループ分の上位の出品を持つグループ分け（report['top_listings'][グループ分け][順位の付け方]）
+TOP_GROUPINGS = {'brand': ['ブランド'], 'type_brand': ['アイテムタイプ', 'ブランド']}
+TOP_COLUMNS = ['ブランド', 'タイトル', '価格', '販売数', '売上', 'アイテムタイプ']
+
+def top_listing(frame, keys, order=None, by=TOP_RANKINGS['sales']):
+    """keys のグループごとの上位 TOP_K 行（グループ順・順位順。order は by で並べた ranking_order）"""
+    return frame.iloc[grouped_top(frame, keys, TOP_K, by, order=order)]
+
+def listing_table(rows):
+    """上位の行を TOP_COLUMNS と仕入れ上限の表にする"""
+    return rows[TOP_COLUMNS].assign(仕入れ上限=purchase_limit(rows['価格'])).reset_index(drop=True)
+
+def analyze(df):
+    """分類済みデータから、HTML生成に使う集計結果一式（レポート）を作る"""
+    report = {
+        'row_count': len(df),
+        'total_sales': int(df['販売数'].sum()),
+        'total_revenue': float(df['売上'].sum()),
+        'period_start': df['販売日'].min(),
+        'period_end': df['販売日'].max(),
     }
 
-# 月別データ
-monthly_sales = df.groupby(['販売月', 'アイテムタイプ'])['販売数'].sum().unstack(fill_value=0)
-price_dist = get_price_distribution(df['価格'])
+    # 月 × タイプ × ブランド × カテゴリの売上キューブ（件数・販売数・売上の切り口はここから求める）
+    with stage('cube'):
+        cube = build_cube(df)
+        report['sales_cube'] = cube
+
+    # 価格の昇順（分位点用の価格の索引は、グループ分けごとにこの並びをグループ番号で安定ソートして作る）
+    with stage('price_order'):
+        price_order = np.argsort(df['価格'].to_numpy())
+
+    # ブランド別統計リスト
+    with stage('brand_stats'):
+        brand_stats_list = []
+        for brand, stats in aggregate_stats(df, 'ブランド', price_order).items():
+            if brand == '' or brand == '(不明)':
+                continue
+            stats['brand'] = brand
+            stats['category'] = categorize_brand(brand)
+            brand_stats_list.append(stats)
+        brand_stats_list.sort(key=lambda x: x['sales'], reverse=True)
+        report['brand_stats_list'] = brand_stats_list
+        report['overall_stats'] = get_brand_stats(df, price_order)
+
+    # ノベルティ・箱ありの価格プレミアム（全ブランド分をまとめて求める）
+    with stage('premiums'):
+        codes, brands = group_codes(df, 'ブランド')
+        report['brand_premiums'] = frame_premiums(df, codes, brands)
 
-print(f"\n=== トップ20ブランド ===")
-for i, b in enumerate(top20_brands, 1):
-    print(f"  {i}. {b['brand']} ({b['sales']}件)")
+    # アイテムタイプ別統計
+    with stage('item_type_stats'):
+        report['item_type_stats'] = aggregate_stats(df, 'アイテムタイプ', price_order)
+
+    # ブランドカテゴリ別統計
+    with stage('brand_category'):
+        report['brand_cat_stats'] = brand_cat_sales(cube)
+
+    # アイテムタイプ別タブのブランド統計
+    with stage('type_brand'):
+        report['type_brand_stats'] = brand_stats_by(aggregate_stats(df, ['アイテムタイプ', 'ブランド'], price_order))
+
+    # 月別データ
+    with stage('monthly'):
+        report['monthly_sales'] = monthly_table(cube)
+
+    # 価格帯分布（全体・ブランド別・タイプ×ブランド別の件数行列。グラフの分布は行を引くだけ）
+    with stage('price_hist'):
+        everything = np.zeros(len(df))
+        edges, labels = price_bins(lambda qs: index_quantiles(
+            price_index(everything, df['価格'], groups=1, price_order=price_order), qs)[0])
+        report['price_hist'] = {
+            'brand': price_histograms(df, 'ブランド', edges, labels),
+            'type_brand': price_histograms(df, ['アイテムタイプ', 'ブランド'], edges, labels),
+        }
+        overall_hist = histogram_table(price_histogram(everything, df['価格'], edges, 1), [0], labels)
+        report['price_dist'] = distribution(overall_hist, 0)
+
+    # 上位の出品（順位の付け方ごとに全行を1回だけ並べ、どのグループ分けもその並びから各グループの先頭を取る）
+    with stage('top_listings'):
+        orders = {name: ranking_order(df, by) for name, by in TOP_RANKINGS.items()}
+        report['top_listings'] = {
+            grouping: {name: listing_table(top_listing(df, keys, orders[name], by)) for name, by in TOP_RANKINGS.items()}
+            for grouping, keys in TOP_GROUPINGS.items()
+        }
+
+    # ノベルティ
+    with stage('novelty'):
+        novelty_df = df[df['ノベルティ'] == True]
+        report['novelty_count'] = len(novelty_df)
+        report['novelty_stats'] = aggregate_stats(df, 'ノベルティ', price_order).get(True, {'sales': 0, 'median_price': 0, 'revenue': 0})
+        report['novelty_brand_stats'] = brand_stats_by(aggregate_stats(df, ['ノベルティ', 'ブランド'], price_order))[True]
+        novelty_top = top_listing(df, 'ノベルティ', orders['sales'])
+        report['novelty_top'] = novelty_top[novelty_top['ノベルティ'] == True][['ブランド', 'タイトル', '価格', '販売数', '仕入れ上限']].to_dict('records')
+
+    # まとめ売り
+    with stage('bundle'):
+        bundle_df = df[df['まとめ売り'] == True]
+        report['bundle_count'] = len(bundle_df)
+        report['bundle_stats'] = aggregate_stats(df, 'まとめ売り', price_order).get(True, {'sales': 0, 'median_price': 0, 'revenue': 0})
+
+        # セット内容別統計
+        bundle_type_stats = bundle_df.groupby('まとめ売り詳細', observed=True).agg({
+            'タイトル': 'count',
+            '販売数': 'sum',
+            '価格': 'median'
+        }).reset_index()
+        bundle_type_stats.columns = ['タイプ', '件数', '販売数', '中央値']
+        report['bundle_type_stats'] = bundle_type_stats.sort_values('販売数', ascending=False).to_dict('records')
+        report['bundle_brand_stats'] = brand_stats_by(aggregate_stats(df, ['まとめ売り', 'ブランド'], price_order))[True]
+        bundle_top = top_listing(df, 'まとめ売り', orders['sales'])
+        report['bundle_top'] = bundle_top[bundle_top['まとめ売り'] == True][['ブランド', 'タイトル', '価格', '販売数']].to_dict('records')
+
+    # Top20ブランドのタブ
+    with stage('brand_tabs'):
+        top20_brand_tabs = [(stats['brand'], brand_tab_id(stats['brand'])) for stats in brand_stats_list[:20]]
+        report['top20_brand_tabs'] = top20_brand_tabs
+
+        # ブランド個別タブの対象行（表記ゆれはユニークなブランド名で判定してから結合）
+        tab_pairs = [
+            (brand, tab_no)
+            for tab_no, (tab_brand, _) in enumerate(top20_brand_tabs)
+            for brand in df['ブランド'].dropna().unique()
+            if tab_brand_matches(tab_brand, str(brand))
+        ]
+        tab_pairs = pd.DataFrame(tab_pairs, columns=['ブランド', '_tab'])
+        tab_df = df.merge(tab_pairs, on='ブランド', how='inner')
+        tab_item_dist, tab_monthly = brand_tab_cube_views(cube, tab_pairs)
+        brand_tab_frames = dict(tuple(tab_df.groupby('_tab', sort=False)))
+        brand_tab_top = dict(tuple(top_listing(tab_df, '_tab').groupby('_tab', sort=False)))
+        brand_tab_stats = aggregate_stats(tab_df, '_tab')
+        brand_tab_hist = price_histograms(tab_df, '_tab', edges, labels)
+        brand_tab_premiums = frame_premiums(tab_df, tab_df['_tab'].to_numpy(), pd.RangeIndex(len(top20_brand_tabs)))
+        brand_tab_type_stats = defaultdict(list)
+        for (tab_no, item_type), type_stats in aggregate_stats(tab_df, ['_tab', 'アイテムタイプ']).items():
+            type_stats['type'] = item_type
+            brand_tab_type_stats[tab_no].append(type_stats)
+
+        brand_tabs = []
+        for tab_no, (brand, tab_id) in enumerate(top20_brand_tabs):
+            brand_df = brand_tab_frames.get(tab_no)
+            if brand_df is None:
+                continue
+            item_stats = brand_tab_type_stats[tab_no]
+            item_stats.sort(key=lambda x: x['sales'], reverse=True)
+            brand_tabs.append({
+                'brand': brand,
+                'tab_id': tab_id,
+                'stats': brand_tab_stats[tab_no],
+                **premium_fields(brand_tab_premiums, tab_no),
+                'novelty_count': int(brand_df['ノベルティ'].sum()),
+                'bulk_count': int(brand_df['まとめ売り'].sum()),
+                'item_stats': item_stats,
+                'top_items': brand_tab_top[tab_no][['タイトル', '価格', '販売数', '仕入れ上限', 'アイテムタイプ']].to_dict('records'),
+                'price_dist': distribution(brand_tab_hist, tab_no),
+                'item_dist': tab_item_dist[tab_no],
+                'monthly_sales': tab_monthly[tab_no],
+            })
+        report['brand_tabs'] = brand_tabs
+    return report
+
+# 差分ビルド用の集計状態で保持するグループ（名前: (キー列, 価格別件数を持つか)）
+STATE_GROUPINGS = {
+    'overall': ([], True),
+    'brand': (['ブランド'], True),
+    'type': (['アイテムタイプ'], True),
+    'type_brand': (['アイテムタイプ', 'ブランド'], True),
+    'novelty': (['ノベルティ'], True),
+    'novelty_brand': (['ノベルティ', 'ブランド'], True),
+    'bundle': (['まとめ売り'], True),
+    'bundle_brand': (['まとめ売り', 'ブランド'], True),
+    'box_brand': (['箱あり', 'ブランド'], True),
+    'bulk_detail': (['まとめ売り詳細'], True),
+}
+STATE_TOP_LISTS = {
+    'novelty': (['ノベルティ'], TOP_K, TOP_RANKINGS['sales']),
+    'bundle': (['まとめ売り'], TOP_K, TOP_RANKINGS['sales']),
+    **{f'{grouping}_{name}': (keys, TOP_K, by)
+       for grouping, keys in TOP_GROUPINGS.items() for name, by in TOP_RANKINGS.items()},
+}
+STATE_TOP_COLUMNS = TOP_COLUMNS
+
+def build_report_state(frame, **kwargs):
+    """レポート用の集計状態（STATE_GROUPINGS のグループと売上キューブ）を作る。kwargs は build_state へ"""
+    state = build_state(frame, STATE_GROUPINGS, STATE_TOP_LISTS, STATE_TOP_COLUMNS, **kwargs)
+    state['groups']['cube'] = {'keys': CUBE_KEYS, 'summary': build_cube(frame), 'prices': None}
+    return state
+
+def incremental_state_path(csv_path, cache_dir=CACHE_DIR):
+    """エクスポートのシート単位（ファイル名末尾の日付を除いた名前）で状態ファイルを分ける"""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, 'incremental', re.sub(r'_\d{4}-\d{2}-\d{2}$', '', stem) + '.pkl')
+
+def update_incremental_state(csv_path, cache_dir=CACHE_DIR):
+    """保存済みの集計状態に、今回のエクスポートで新しく増えた行だけを分類して足し込む
+
+    新規行の判定は販売日とフィンガープリントで行う。集計は取り込んだ全履歴が対象で、
+    エクスポートから消えた行は差し引かない。分類ルールが変わった場合は全件を取り込み直す。
+    (状態, 新規行数) を返す。
+    """
+    state_path = incremental_state_path(csv_path, cache_dir)
+    state = pd.read_pickle(state_path) if os.path.exists(state_path) else None
+    # 分類ルールや保持するグループが変わっていたら全件を取り込み直す
+    if state is not None and (state.get('rules') != classify_rules_fingerprint()
+                              or set(state['groups']) != set(STATE_GROUPINGS) | {'cube'}
+                              or set(state['top']) != set(STATE_TOP_LISTS)):
+        state = None
+
+    with stage('read_csv'):
+        raw = pd.read_csv(csv_path, dtype=str)
+    with stage('fingerprint'):
+        fingerprints = row_fingerprints(raw)
+        is_new = new_row_mask(raw, fingerprints, state)
+    if state is not None and not is_new.any():
+        return state, 0
+
+    delta = raw[is_new].copy()
+    delta['価格'] = pd.to_numeric(delta['価格'], errors='coerce')
+    with stage('enrich'):
+        delta = enrich(delta)
+    with stage('build_state'):
+        delta_state = build_report_state(delta, seq_start=state['rows'] if state else 0,
+                                         fingerprints=fingerprints[is_new])
+    with stage('merge_state'):
+        state = delta_state if state is None else merge_states(state, delta_state)
+    state['rules'] = classify_rules_fingerprint()
+
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with stage('save_state'):
+        pd.to_pickle(state, state_path + '.tmp')
+    os.replace(state_path + '.tmp', state_path)
+    return state, int(is_new.sum())
+
+# ストリーミング取り込みの設定（中央値などの分位点は相対誤差 STREAM_PRICE_ALPHA 以内の近似値になる）
+STREAM_CHUNK_ROWS = 200000
+STREAM_PRICE_ALPHA = 0.005
+
+def stream_state(csv_path, chunk_rows=STREAM_CHUNK_ROWS, price_alpha=STREAM_PRICE_ALPHA):
+    """CSVを chunk_rows 行ずつ読み込み・分類して集計状態に足し込む
+
+    同時にメモリに載るのは1チャンク分の行と集計状態だけで、価格別件数は対数バケットに
+    丸めるため状態の大きさも行数に依存しない。件数・売上・平均などは全件読み込みと同じ値、
+    中央値は相対誤差 price_alpha 以内、価格帯分布は誤差なし（accumulators.sketch_prices）。
+    """
+    state = None
+    chunks = iter(pd.read_csv(csv_path, chunksize=chunk_rows))
+    while True:
+        with stage('read_chunk'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with stage('enrich'):
+            chunk = enrich(chunk)
+        with stage('build_state'):
+            chunk_state = build_report_state(chunk, seq_start=state['rows'] if state else 0,
+                                             price_alpha=price_alpha, price_edges=PRICE_BINS)
+        with stage('merge_state'):
+            state = chunk_state if state is None else merge_states(state, chunk_state)
+    return state
+
+def state_stats(group):
+    return stats_dicts(add_purchase_limits(group_table(group)))
+
+def state_histograms(group, edges, labels):
+    return group_histogram(group, edges).set_axis(labels, axis=1)
+
+def top_records(rows, columns, k=TOP_K):
+    rows = rows.iloc[grouped_top(rows, [], k, TOP_RANKINGS['sales'], tiebreak='_seq')]
+    rows = rows.assign(仕入れ上限=purchase_limit(rows['価格']))
+    return rows[columns].to_dict('records')
+
+def report_from_state(state):
+    """差分ビルドの集計状態から analyze と同じ形式のレポートを作る"""
+    groups = state['groups']
+    overall = state_stats(groups['overall'])[0]
+    report = {
+        'row_count': overall['count'],
+        'total_sales': overall['sales'],
+        'total_revenue': overall['revenue'],
+        'period_start': state['period'][0],
+        'period_end': state['period'][1],
+        'overall_stats': overall,
+        'sales_cube': groups['cube']['summary'],
+    }
 
-# HTML生成開始
-html_parts = []
+    with stage('brand_stats'):
+        brand_stats_list = []
+        for brand, stats in state_stats(groups['brand']).items():
+            if brand == '' or brand == '(不明)':
+                continue
+            stats['brand'] = brand
+            stats['category'] = categorize_brand(brand)
+            brand_stats_list.append(stats)
+        brand_stats_list.sort(key=lambda x: x['sales'], reverse=True)
+        report['brand_stats_list'] = brand_stats_list
+
+    with stage('premiums'):
+        report['brand_premiums'] = state_premiums({'novelty': groups['novelty_brand'], 'box': groups['box_brand']},
+                                                  'ブランド', groups['brand']['summary'].index)
+
+    with stage('item_type_stats'):
+        report['item_type_stats'] = state_stats(groups['type'])
+    with stage('brand_category'):
+        report['brand_cat_stats'] = brand_cat_sales(groups['cube']['summary'])
+    with stage('type_brand'):
+        report['type_brand_stats'] = brand_stats_by(state_stats(groups['type_brand']))
+
+    with stage('monthly'):
+        report['monthly_sales'] = monthly_table(groups['cube']['summary'])
+
+    with stage('price_hist'):
+        edges, labels = price_bins(lambda qs: group_quantiles(groups['overall'], qs).to_numpy()[0])
+        report['price_hist'] = {
+            'brand': state_histograms(groups['brand'], edges, labels),
+            'type_brand': state_histograms(groups['type_brand'], edges, labels),
+        }
+        report['price_dist'] = distribution(state_histograms(groups['overall'], edges, labels), 0)
+
+    with stage('top_listings'):
+        top_lists = state['top']
+        report['top_listings'] = {
+            grouping: {name: listing_table(top_lists[f'{grouping}_{name}']['rows']) for name in TOP_RANKINGS}
+            for grouping in TOP_GROUPINGS
+        }
+
+    with stage('novelty'):
+        empty_stats = {'sales': 0, 'median_price': 0, 'revenue': 0}
+        novelty_stats = state_stats(groups['novelty'])
+        report['novelty_count'] = novelty_stats.get(True, {}).get('count', 0)
+        report['novelty_stats'] = novelty_stats.get(True, empty_stats)
+        report['novelty_brand_stats'] = brand_stats_by(state_stats(groups['novelty_brand']))[True]
+        novelty_rows = top_lists['novelty']['rows']
+        report['novelty_top'] = top_records(novelty_rows[novelty_rows['ノベルティ'] == True],
+                                            ['ブランド', 'タイトル', '価格', '販売数', '仕入れ上限'])
+
+    with stage('bundle'):
+        bundle_stats = state_stats(groups['bundle'])
+        report['bundle_count'] = bundle_stats.get(True, {}).get('count', 0)
+        report['bundle_stats'] = bundle_stats.get(True, empty_stats)
+        bundle_type_stats = [
+            {'タイプ': detail, '件数': stats['count'], '販売数': stats['sales'], '中央値': stats['median_price']}
+            for detail, stats in state_stats(groups['bulk_detail']).items()
+        ]
+        report['bundle_type_stats'] = sorted(bundle_type_stats, key=lambda x: x['販売数'], reverse=True)
+        report['bundle_brand_stats'] = brand_stats_by(state_stats(groups['bundle_brand']))[True]
+        bundle_rows = top_lists['bundle']['rows']
+        report['bundle_top'] = top_records(bundle_rows[bundle_rows['まとめ売り'] == True],
+                                           ['ブランド', 'タイトル', '価格', '販売数'])
+
+    # Top20ブランドのタブ（表記ゆれのまとめは集計状態の付け替えで行う）
+    with stage('brand_tabs'):
+        top20_brand_tabs = [(stats['brand'], brand_tab_id(stats['brand'])) for stats in brand_stats_list[:20]]
+        report['top20_brand_tabs'] = top20_brand_tabs
+        tab_pairs = pd.DataFrame([
+            (brand, tab_no)
+            for tab_no, (tab_brand, _) in enumerate(top20_brand_tabs)
+            for brand in groups['brand']['summary'].index
+            if tab_brand_matches(tab_brand, str(brand))
+        ], columns=['ブランド', '_tab'])
+        tab_group = rollup(groups['brand'], 'ブランド', tab_pairs)
+        tab_stats = state_stats(tab_group)
+        tab_hist = state_histograms(tab_group, edges, labels)
+        tab_type_stats = state_stats(rollup(groups['type_brand'], 'ブランド', tab_pairs))
+        tab_flag_groups = {'novelty': rollup(groups['novelty_brand'], 'ブランド', tab_pairs),
+                           'box': rollup(groups['box_brand'], 'ブランド', tab_pairs)}
+        tab_novelty_stats = state_stats(tab_flag_groups['novelty'])
+        tab_premiums = state_premiums(tab_flag_groups, '_tab', pd.RangeIndex(len(top20_brand_tabs)))
+        tab_bundle_stats = state_stats(rollup(groups['bundle_brand'], 'ブランド', tab_pairs))
+        tab_top_rows = top_lists['brand_sales']['rows'].merge(tab_pairs, on='ブランド', how='inner')
+        tab_item_dist, tab_monthly = brand_tab_cube_views(groups['cube']['summary'], tab_pairs)
+
+        brand_tabs = []
+        for tab_no, (brand, tab_id) in enumerate(top20_brand_tabs):
+            if tab_no not in tab_stats:
+                continue
+            item_stats = []
+            for (item_type, type_tab), type_stats in tab_type_stats.items():
+                if type_tab == tab_no:
+                    type_stats['type'] = item_type
+                    item_stats.append(type_stats)
+            item_stats.sort(key=lambda x: x['sales'], reverse=True)
+            brand_tabs.append({
+                'brand': brand,
+                'tab_id': tab_id,
+                'stats': tab_stats[tab_no],
+                **premium_fields(tab_premiums, tab_no),
+                'novelty_count': tab_novelty_stats.get((True, tab_no), {}).get('count', 0),
+                'bulk_count': tab_bundle_stats.get((True, tab_no), {}).get('count', 0),
+                'item_stats': item_stats,
+                'top_items': top_records(tab_top_rows[tab_top_rows['_tab'] == tab_no],
+                                         ['タイトル', '価格', '販売数', '仕入れ上限', 'アイテムタイプ']),
+                'price_dist': distribution(tab_hist, tab_no),
+                'item_dist': tab_item_dist[tab_no],
+                'monthly_sales': tab_monthly[tab_no],
+            })
+        report['brand_tabs'] = brand_tabs
+    return report
+
+# ===== HTML出力 =====
+# 各タブを生成したそばからバッファ付きの出力ストリームに書き出す（ページ全体を文字列として持たない）
 
 # CSSスタイル
-css = '''
+CSS = '''
 :root {
     --bg-primary: #ffffff;
     --bg-secondary: #f5f5f5;
@@ -546,6 +1208,8 @@ tr:hover { background: rgba(99, 102, 241, 0.05); }
 .strategy-card h4 { margin-bottom: 10px; font-size: 0.95em; }
 .strategy-card ul { margin-left: 18px; font-size: 0.85em; }
 .checked-row { opacity: 0.4; text-decoration: line-through; }
+.data-table.virtual { max-height: 600px; overflow-y: auto; }
+.table-spacer td { padding: 0; border: 0; }
 .brand-grid {
     display: grid;
     grid-template-columns: repeat(2, 1fr);
@@ -585,40 +1249,14 @@ tr:hover { background: rgba(99, 102, 241, 0.05); }
 #VALENTINO .stat-card { border-top: 3px solid #c41e3a; }
 '''
 
-# グラフ用データ準備
-item_type_labels = list(item_type_stats.keys())
-item_type_sales = [item_type_stats[k]['sales'] for k in item_type_labels]
-
-brand_cat_labels = list(brand_cat_stats.keys())
-brand_cat_sales = [brand_cat_stats[k]['sales'] for k in brand_cat_labels]
-
-top20_brand_labels = [s['brand'][:12] for s in top20_brands]
-top20_brand_sales = [s['sales'] for s in top20_brands]
-
-price_dist_labels = list(price_dist.keys())
-price_dist_values = list(price_dist.values())
-
-monthly_labels = monthly_sales.index.tolist()[-12:] if len(monthly_sales) > 12 else monthly_sales.index.tolist()
-monthly_data = {}
-for col in monthly_sales.columns:
-    monthly_data[col] = monthly_sales[col].tail(12).tolist()
-
-# Top20ブランドのタブID生成
-top20_brand_tabs = []
-for stats in top20_brands:
-    brand = stats['brand']
-    tab_id = brand.replace(' ', '_').replace('&', '').replace('.', '')
-    top20_brand_tabs.append((brand, tab_id))
-
-# HTML開始
-html_parts.append(f'''<!DOCTYPE html>
+# HTMLテンプレート（繰り返し出てくる部品は str.format のテンプレートとして読み込み時に1回だけ用意する）
+PAGE_HEAD = '''<!DOCTYPE html>
 <html lang="ja">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>イヤリング市場分析（完全版）</title>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-    <style>
+{chart_library}    <style>
 {css}
     </style>
 </head>
@@ -628,709 +1266,75 @@ html_parts.append(f'''<!DOCTYPE html>
             <button onclick="toggleTheme()" id="themeBtn">🌙 ダークモード</button>
         </div>
         <h1>💎 イヤリング市場分析（完全版）</h1>
-        <p>データ期間: {period_start} ~ {period_end} | 生成: {datetime.now().strftime("%Y-%m-%d %H:%M")} | 総件数: {len(df)}件</p>
+        <p>データ期間: {period_start} ~ {period_end} | 生成: {generated} | 総件数: {row_count}件</p>
     </div>
 
     <div class="controls">
         <div class="control-group">
             <label>💱 為替:</label>
-            <input type="number" id="exchangeRate" value="{EXCHANGE_RATE}" step="0.1">
+            <input type="number" id="exchangeRate" value="{exchange_rate}" step="0.1">
             <button class="btn btn-secondary" onclick="updateExchangeRate()">🔄</button>
         </div>
         <div class="control-group">
             <label>📦 送料:</label>
-            <input type="number" id="shippingCost" value="{SHIPPING_JPY}" step="100">円
+            <input type="number" id="shippingCost" value="{shipping}" step="100">円
         </div>
         <div class="control-group">
             <label>💰 手数料:</label>
-            <input type="number" id="feeRate" value="{int(FEE_RATE * 100)}" step="1">%
+            <input type="number" id="feeRate" value="{fee_percent}" step="1">%
         </div>
         <button class="btn btn-primary" onclick="recalculate()">🔄 再計算</button>
     </div>
 
     <div class="tabs">
-        <button class="tab active" onclick="showTab('overview')">📊 全体分析</button>
-        <button class="tab" onclick="showTab('brands')">🏷️ ブランド一覧</button>
-        <button class="tab" onclick="showTab('stud')">💎 Stud</button>
-        <button class="tab" onclick="showTab('hoop')">⭕ Hoop</button>
-        <button class="tab" onclick="showTab('drop')">💧 Drop</button>
-        <button class="tab" onclick="showTab('clipon')">📎 Clip-on</button>
-        <button class="tab" onclick="showTab('novelty')">🎁 ノベルティ</button>
-        <button class="tab" onclick="showTab('bundle')">📦 まとめ売り</button>
-        <button class="tab" onclick="showTab('recommend')">⭐ おすすめ</button>
-''')
-
-# Top20ブランドタブを追加
-for brand, tab_id in top20_brand_tabs:
-    short_name = brand[:10] if len(brand) > 10 else brand
-    html_parts.append(f'        <button class="tab" onclick="showTab(\'{tab_id}\')">{short_name}</button>\n')
-
-html_parts.append('    </div>\n')
-
-# 全体分析タブ
-html_parts.append(f'''
-    <div id="overview" class="tab-content active">
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="icon">📦</div>
-                <div class="label">総販売数</div>
-                <div class="value">{total_sales:,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">💰</div>
-                <div class="label">総売上</div>
-                <div class="value">${total_revenue:,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📊</div>
-                <div class="label">平均価格</div>
-                <div class="value">${overall_stats["avg_price"]:.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📈</div>
-                <div class="label">中央値</div>
-                <div class="value">${overall_stats["median_price"]:.0f}</div>
-            </div>
-        </div>
-
-        <div class="insight-box">
-            <h3>💡 市場インサイト</h3>
-            <ul>
-                <li>🔝 <strong>ハイブランドが市場の{brand_cat_stats.get("ハイブランド", {}).get("sales", 0) / total_sales * 100:.0f}%</strong>を占める（{brand_cat_stats.get("ハイブランド", {}).get("sales", 0):,}件）</li>
-                <li>💎 <strong>シャネルが独占</strong>: {top20_brands[0]['sales']:,}件で圧倒的シェア</li>
-                <li>🎁 <strong>ノベルティ</strong>: {int(df['ノベルティ'].sum())}件 / <strong>まとめ売り</strong>: {int(df['まとめ売り'].sum())}件</li>
-            </ul>
-        </div>
-
-        <h2 class="section-title">📊 カテゴリ別分析</h2>
-        <div class="chart-grid">
-            <div class="chart-container"><div id="itemTypeBarChart" style="height:350px;"></div></div>
-            <div class="chart-container"><div id="brandCatPieChart" style="height:350px;"></div></div>
-        </div>
-
-        <h2 class="section-title">🏷️ ブランド別分析（Top20）</h2>
-        <div class="chart-grid">
-            <div class="chart-container"><div id="brandBarChart" style="height:450px;"></div></div>
-            <div class="chart-container"><div id="brandPieChart" style="height:450px;"></div></div>
-        </div>
-
-        <h2 class="section-title">💰 価格帯分布</h2>
-        <div class="chart-container"><div id="priceDistChart" style="height:300px;"></div></div>
-
-        <h2 class="section-title">📅 月別販売数推移</h2>
-        <div class="chart-container"><div id="monthlyTrendChart" style="height:300px;"></div></div>
-
-        <h2 class="section-title">🏷️ ブランド別詳細（Top20）</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>販売数</th>
-                        <th>最低</th>
-                        <th>最高</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>CV</th>
-                        <th>安定度</th>
-                        <th>検索</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-for i, stats in enumerate(top20_brands):
-    brand = stats['brand']
-    stability = get_stability(stats['cv'])
-    row_id = f"overview_{brand.replace(' ', '_')}"
-    html_parts.append(f'''
-                    <tr>
-                        <td><strong>{brand}</strong></td>
-                        <td>{stats["sales"]:,}</td>
-                        <td>${stats["min_price"]:.0f}</td>
-                        <td>${stats["max_price"]:.0f}</td>
-                        <td class="highlight">${stats["median_price"]:.0f}</td>
-                        <td data-usd="{stats['median_price']:.2f}">¥{int(stats["purchase_limit"]):,}</td>
-                        <td>{stats["cv"]:.2f}</td>
-                        <td>{stability}</td>
-                        <td>{gen_search_links(brand, None, row_id)}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-    </div>
-''')
-
-# ブランド一覧タブ
-html_parts.append('''
-    <div id="brands" class="tab-content">
-        <h2 class="section-title">🏷️ ブランド別販売実績（全ブランド）</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>カテゴリ</th>
-                        <th>販売数</th>
-                        <th>売上</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>CV</th>
-                        <th>安定度</th>
-                        <th>検索</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-for i, stats in enumerate(brand_stats_list[:50]):
-    brand = stats['brand']
-    stability = get_stability(stats['cv'])
-    row_id = f"brands_{brand.replace(' ', '_')}_{i}"
-    html_parts.append(f'''
-                    <tr>
-                        <td><strong>{brand}</strong></td>
-                        <td>{stats['category']}</td>
-                        <td>{stats['sales']:,}</td>
-                        <td>${stats['revenue']:,.0f}</td>
-                        <td class="highlight">${stats['median_price']:.0f}</td>
-                        <td data-usd="{stats['median_price']:.2f}">¥{int(stats['purchase_limit']):,}</td>
-                        <td>{stats['cv']:.2f}</td>
-                        <td>{stability}</td>
-                        <td>{gen_search_links(brand, None, row_id)}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-    </div>
-''')
-
-# アイテムタイプ別タブ生成
-for item_type, tab_id in [('Stud', 'stud'), ('Hoop', 'hoop'), ('Drop/Dangle', 'drop'), ('Clip-on', 'clipon')]:
-    type_df = df[df['アイテムタイプ'] == item_type]
-    if len(type_df) == 0:
-        continue
-    type_stats = get_brand_stats(type_df)
-
-    type_brand_stats = []
-    for brand in type_df['ブランド'].dropna().unique():
-        if brand == '' or brand == '(不明)':
-            continue
-        b_df = type_df[type_df['ブランド'] == brand]
-        b_stats = get_brand_stats(b_df)
-        b_stats['brand'] = brand
-        type_brand_stats.append(b_stats)
-    type_brand_stats.sort(key=lambda x: x['sales'], reverse=True)
-
-    type_en = TYPE_KEYWORDS.get(item_type, {}).get('en', 'earrings')
-    type_jp = TYPE_KEYWORDS.get(item_type, {}).get('jp', 'イヤリング')
-
-    html_parts.append(f'''
-    <div id="{tab_id}" class="tab-content">
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="icon">📦</div>
-                <div class="label">販売数</div>
-                <div class="value">{type_stats['sales']:,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">💰</div>
-                <div class="label">売上</div>
-                <div class="value">${type_stats['revenue']:,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📈</div>
-                <div class="label">中央値</div>
-                <div class="value">${type_stats['median_price']:.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📊</div>
-                <div class="label">仕入上限</div>
-                <div class="value" data-usd="{type_stats['median_price']:.2f}">¥{int(type_stats['purchase_limit']):,}</div>
-            </div>
-        </div>
-
-        <h2 class="section-title">🏷️ {item_type} ブランド別詳細</h2>
-        <p style="margin-bottom:15px;color:var(--text-secondary);">検索キーワード: <strong>{type_en}</strong> / <strong>{type_jp}</strong></p>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>販売数</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>CV</th>
-                        <th>安定度</th>
-                        <th>検索（タイプ込み）</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-    for j, b_stats in enumerate(type_brand_stats[:25]):
-        brand = b_stats['brand']
-        stability = get_stability(b_stats['cv'])
-        row_id = f"{tab_id}_{brand.replace(' ', '_')}_{j}"
-        html_parts.append(f'''
-                    <tr>
-                        <td><strong>{brand}</strong></td>
-                        <td>{b_stats['sales']:,}</td>
-                        <td class="highlight">${b_stats['median_price']:.0f}</td>
-                        <td data-usd="{b_stats['median_price']:.2f}">¥{int(b_stats['purchase_limit']):,}</td>
-                        <td>{b_stats['cv']:.2f}</td>
-                        <td>{stability}</td>
-                        <td>{gen_search_links(brand, item_type, row_id)}</td>
-                    </tr>
-''')
-
-    html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-    </div>
-''')
-
-# ノベルティタブ（詳細分析）
-novelty_df = df[df['ノベルティ'] == True]
-novelty_stats = get_brand_stats(novelty_df) if len(novelty_df) > 0 else {'sales': 0, 'median_price': 0, 'revenue': 0}
-
-# ノベルティのブランド別統計
-novelty_brand_stats = []
-for brand in novelty_df['ブランド'].dropna().unique():
-    if brand == '' or brand == '(不明)':
-        continue
-    b_df = novelty_df[novelty_df['ブランド'] == brand]
-    b_stats = get_brand_stats(b_df)
-    b_stats['brand'] = brand
-    novelty_brand_stats.append(b_stats)
-novelty_brand_stats.sort(key=lambda x: x['sales'], reverse=True)
-
-# ノベルティの価格帯分布
-novelty_price_dist = get_price_distribution(novelty_df['価格']) if len(novelty_df) > 0 else {}
-
-html_parts.append(f'''
-    <div id="novelty" class="tab-content">
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="icon">🎁</div>
-                <div class="label">ノベルティ件数</div>
-                <div class="value">{len(novelty_df):,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📦</div>
-                <div class="label">総販売数</div>
-                <div class="value">{novelty_stats.get('sales', 0):,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">💰</div>
-                <div class="label">総売上</div>
-                <div class="value">${novelty_stats.get('revenue', 0):,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📈</div>
-                <div class="label">中央値</div>
-                <div class="value">${novelty_stats.get('median_price', 0):.0f}</div>
-            </div>
-        </div>
-
-        <div class="insight-box">
-            <h3>🎁 ノベルティ市場の特徴</h3>
-            <ul>
-                <li>💎 仕入れルート: 百貨店購入特典、ビューティーカウンター、VIPイベント</li>
-                <li>🏷️ キーワード: NOVELTY, GWP, LIMITED, VIP, GIFT, NOT FOR SALE</li>
-                <li>📈 CHANELノベルティが最も取引量が多い</li>
-            </ul>
-        </div>
-
-        <h2 class="section-title">🏷️ ブランド別ノベルティ分析</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>件数</th>
-                        <th>販売数</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>検索</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-for i, b_stats in enumerate(novelty_brand_stats[:15]):
-    brand = b_stats['brand']
-    row_id = f"novelty_{brand.replace(' ', '_')}_{i}"
-    brand_jp = BRAND_JP.get(brand, brand)
-    ebay_url = f"https://www.ebay.com/sch/i.html?_nkw={brand.replace(' ', '+')}+novelty+earrings&LH_Sold=1&LH_Complete=1"
-    mercari_url = f"https://jp.mercari.com/search?keyword={brand_jp}%20ノベルティ%20イヤリング&status=on_sale"
-    html_parts.append(f'''
-                    <tr>
-                        <td><strong>{brand}</strong></td>
-                        <td>{b_stats['count']}</td>
-                        <td>{b_stats['sales']}</td>
-                        <td class="highlight">${b_stats['median_price']:.0f}</td>
-                        <td data-usd="{b_stats['median_price']:.2f}">¥{int(b_stats['purchase_limit']):,}</td>
-                        <td>
-                            <a href="{ebay_url}" target="_blank" class="link-btn link-ebay">eBay</a>
-                            <input type="checkbox" class="search-checkbox" data-id="{row_id}_ebay">
-                            <a href="{mercari_url}" target="_blank" class="link-btn link-mercari">メルカリ</a>
-                            <input type="checkbox" class="search-checkbox" data-id="{row_id}_mercari">
-                        </td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-
-        <h2 class="section-title">📌 ノベルティ人気商品 Top15</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>商品名</th>
-                        <th>販売数</th>
-                        <th>価格</th>
-                        <th>仕入上限</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-novelty_top = novelty_df.nlargest(15, '販売数')[['ブランド', 'タイトル', '価格', '販売数', '仕入れ上限']].to_dict('records')
-for i, item in enumerate(novelty_top):
-    title = str(item['タイトル'])[:50] + '...' if len(str(item['タイトル'])) > 50 else str(item['タイトル'])
-    brand = item['ブランド'] if pd.notna(item['ブランド']) else 'N/A'
-    html_parts.append(f'''
-                    <tr>
-                        <td>{brand}</td>
-                        <td>{title}</td>
-                        <td>{item['販売数']}</td>
-                        <td class="highlight">${item['価格']:.0f}</td>
-                        <td data-usd="{item['価格']:.2f}">¥{int(item['仕入れ上限']):,}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-    </div>
-''')
-
-# まとめ売りタブ（詳細分析）
-bundle_df = df[df['まとめ売り'] == True]
-bundle_stats = get_brand_stats(bundle_df) if len(bundle_df) > 0 else {'sales': 0, 'median_price': 0, 'revenue': 0}
-
-# セット内容別統計
-bundle_type_stats = bundle_df.groupby('まとめ売り詳細').agg({
-    'タイトル': 'count',
-    '販売数': 'sum',
-    '価格': 'median'
-}).reset_index()
-bundle_type_stats.columns = ['タイプ', '件数', '販売数', '中央値']
-bundle_type_stats = bundle_type_stats.sort_values('販売数', ascending=False)
-
-# まとめ売りのブランド別統計
-bundle_brand_stats = []
-for brand in bundle_df['ブランド'].dropna().unique():
-    if brand == '' or brand == '(不明)':
-        continue
-    b_df = bundle_df[bundle_df['ブランド'] == brand]
-    b_stats = get_brand_stats(b_df)
-    b_stats['brand'] = brand
-    bundle_brand_stats.append(b_stats)
-bundle_brand_stats.sort(key=lambda x: x['sales'], reverse=True)
-
-html_parts.append(f'''
-    <div id="bundle" class="tab-content">
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="icon">📦</div>
-                <div class="label">まとめ売り件数</div>
-                <div class="value">{len(bundle_df):,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📊</div>
-                <div class="label">総販売数</div>
-                <div class="value">{bundle_stats.get('sales', 0):,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">💰</div>
-                <div class="label">総売上</div>
-                <div class="value">${bundle_stats.get('revenue', 0):,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📈</div>
-                <div class="label">中央値</div>
-                <div class="value">${bundle_stats.get('median_price', 0):.0f}</div>
+'''
+TAB_BUTTON = '        <button class="tab{active}" onclick="showTab(\'{tab_id}\')">{label}</button>\n'
+TAB_OPEN = '\n    <div id="{tab_id}" class="tab-content{active}">\n'
+TAB_CLOSE = '    </div>\n'
+
+STAT_CARD = '''            <div class="stat-card">
+                <div class="icon">{icon}</div>
+                <div class="label">{label}</div>
+                <div class="{value_class}">{value}</div>
             </div>
-        </div>
+'''
 
+INSIGHT_BOX = '''
         <div class="insight-box">
-            <h3>📦 まとめ売り市場の特徴</h3>
+            <h3>{title}</h3>
             <ul>
-                <li>⚠️ 単価分析には不向き（平均価格が歪む）</li>
-                <li>💎 ブランド品のセットは希少性あり</li>
-                <li>📉 ノーブランドのまとめ売りは利益率低め</li>
-            </ul>
-        </div>
-
-        <h2 class="section-title">📊 セット内容別分析</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>セットタイプ</th>
-                        <th>件数</th>
-                        <th>販売数</th>
-                        <th>中央値</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-for _, row in bundle_type_stats.iterrows():
-    html_parts.append(f'''
-                    <tr>
-                        <td><strong>{row['タイプ']}</strong></td>
-                        <td>{row['件数']}</td>
-                        <td>{row['販売数']}</td>
-                        <td class="highlight">${row['中央値']:.0f}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-
-        <h2 class="section-title">🏷️ ブランド別まとめ売り分析</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>件数</th>
-                        <th>販売数</th>
-                        <th>中央値</th>
-                        <th>検索</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-for i, b_stats in enumerate(bundle_brand_stats[:15]):
-    brand = b_stats['brand']
-    row_id = f"bundle_{brand.replace(' ', '_')}_{i}"
-    brand_jp = BRAND_JP.get(brand, brand)
-    ebay_url = f"https://www.ebay.com/sch/i.html?_nkw={brand.replace(' ', '+')}+earrings+lot&LH_Sold=1&LH_Complete=1"
-    mercari_url = f"https://jp.mercari.com/search?keyword={brand_jp}%20イヤリング%20まとめ&status=on_sale"
-    html_parts.append(f'''
-                    <tr>
-                        <td><strong>{brand}</strong></td>
-                        <td>{b_stats['count']}</td>
-                        <td>{b_stats['sales']}</td>
-                        <td class="highlight">${b_stats['median_price']:.0f}</td>
-                        <td>
-                            <a href="{ebay_url}" target="_blank" class="link-btn link-ebay">eBay</a>
-                            <input type="checkbox" class="search-checkbox" data-id="{row_id}_ebay">
-                            <a href="{mercari_url}" target="_blank" class="link-btn link-mercari">メルカリ</a>
-                            <input type="checkbox" class="search-checkbox" data-id="{row_id}_mercari">
-                        </td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-
-        <h2 class="section-title">📌 まとめ売り人気商品 Top15</h2>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>ブランド</th>
-                        <th>商品名</th>
-                        <th>販売数</th>
-                        <th>価格</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-bundle_top = bundle_df.nlargest(15, '販売数')[['ブランド', 'タイトル', '価格', '販売数']].to_dict('records')
-for item in bundle_top:
-    title = str(item['タイトル'])[:50] + '...' if len(str(item['タイトル'])) > 50 else str(item['タイトル'])
-    brand = item['ブランド'] if pd.notna(item['ブランド']) else 'N/A'
-    html_parts.append(f'''
-                    <tr>
-                        <td>{brand}</td>
-                        <td>{title}</td>
-                        <td>{item['販売数']}</td>
-                        <td class="highlight">${item['価格']:.0f}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
-            </table>
+{items}            </ul>
         </div>
-    </div>
-''')
-
-# おすすめ出品順序タブ
-for stats in brand_stats_list:
-    stats['score'] = stats['sales'] * stats['median_price']
-brand_stats_list.sort(key=lambda x: x['score'], reverse=True)
+'''
+LIST_ITEM = '                <li>{}</li>\n'.format
 
-html_parts.append('''
-    <div id="recommend" class="tab-content">
-        <h2 class="section-title">⭐ おすすめ出品順序 TOP20</h2>
-        <p style="margin-bottom:15px;color:var(--text-secondary);">スコア = 販売数 × 中央値</p>
-        <div class="table-container">
+# データ表: 行の値を JSON で埋め込み、<tr> はブラウザの renderTable が作る。
+# 行が TABLE_VIRTUAL_ROWS より多い表は高さを決めてスクロールさせ、見えている行の前後だけを作る
+DATA_TABLE = '''        <div class="table-container data-table{virtual}">
             <table>
                 <thead>
                     <tr>
-                        <th>順位</th>
-                        <th>ブランド</th>
-                        <th>販売数</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>スコア</th>
-                        <th>検索</th>
-                    </tr>
+{headers}                    </tr>
                 </thead>
-                <tbody>
-''')
-
-for i, stats in enumerate(brand_stats_list[:20]):
-    brand = stats['brand']
-    row_id = f"rec_{brand.replace(' ', '_')}_{i}"
-    rank_style = ''
-    if i == 0:
-        rank_style = 'style="color: gold; font-weight: bold;"'
-    elif i == 1:
-        rank_style = 'style="color: silver; font-weight: bold;"'
-    elif i == 2:
-        rank_style = 'style="color: #cd7f32; font-weight: bold;"'
-
-    html_parts.append(f'''
-                    <tr>
-                        <td {rank_style}>{i + 1}</td>
-                        <td><strong>{brand}</strong></td>
-                        <td>{stats['sales']:,}</td>
-                        <td class="highlight">${stats['median_price']:.0f}</td>
-                        <td data-usd="{stats['median_price']:.2f}">¥{int(stats['purchase_limit']):,}</td>
-                        <td>{stats['score']:,.0f}</td>
-                        <td>{gen_search_links(brand, None, row_id)}</td>
-                    </tr>
-''')
-
-html_parts.append('''
-                </tbody>
+                <tbody></tbody>
             </table>
+            <script type="application/json">{data}</script>
         </div>
-    </div>
-''')
-
-# ブランド個別タブ生成（Top20）
-brand_price_data = {}
-
-for brand, tab_id in top20_brand_tabs:
-    # ブランドデータ抽出
-    if 'Vivienne' in brand:
-        brand_df = df[df['ブランド'].str.contains('Vivienne', case=False, na=False)].copy()
-    elif 'TIFFANY' in brand:
-        brand_df = df[df['ブランド'].str.contains('TIFFANY', case=False, na=False)].copy()
-    elif 'Georg Jensen' in brand:
-        brand_df = df[df['ブランド'].str.contains('Georg Jensen', case=False, na=False)].copy()
-    else:
-        brand_df = df[df['ブランド'].str.upper() == brand.upper()].copy()
-
-    if len(brand_df) == 0:
-        continue
-
-    b_stats = get_brand_stats(brand_df)
-    novelty_premium = calc_novelty_premium(brand_df)
-    box_premium = calc_box_premium(brand_df)
-    novelty_count = int(brand_df['ノベルティ'].sum())
-    bulk_count = int(brand_df['まとめ売り'].sum())
-    brand_jp = BRAND_JP.get(brand, brand)
-
-    # アイテムタイプ別統計
-    item_stats = []
-    for item_type in brand_df['アイテムタイプ'].unique():
-        type_df = brand_df[brand_df['アイテムタイプ'] == item_type]
-        if len(type_df) > 0:
-            type_stats = get_brand_stats(type_df)
-            type_stats['type'] = item_type
-            item_stats.append(type_stats)
-    item_stats.sort(key=lambda x: x['sales'], reverse=True)
-
-    # 人気商品Top15
-    top_items = brand_df.nlargest(15, '販売数')[['タイトル', '価格', '販売数', '仕入れ上限', 'アイテムタイプ']].to_dict('records')
-
-    # グラフ用データ
-    brand_price_dist = get_price_distribution(brand_df['価格'])
-    item_dist = brand_df['アイテムタイプ'].value_counts().to_dict()
-    brand_price_data[tab_id] = {
-        'price_labels': list(brand_price_dist.keys()),
-        'price_values': list(brand_price_dist.values()),
-        'item_labels': list(item_dist.keys()),
-        'item_values': list(item_dist.values())
-    }
-
-    html_parts.append(f'''
-    <div id="{tab_id}" class="tab-content">
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="icon">📦</div>
-                <div class="label">総販売数</div>
-                <div class="value">{b_stats['sales']:,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">💰</div>
-                <div class="label">総売上</div>
-                <div class="value">${b_stats['revenue']:,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📈</div>
-                <div class="label">中央値</div>
-                <div class="value">${b_stats['median_price']:.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">📊</div>
-                <div class="label">CV値</div>
-                <div class="value">{b_stats['cv']:.2f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="icon">🎁</div>
-                <div class="label">ノベルティ</div>
-                <div class="value">{novelty_count}件</div>
-            </div>
-        </div>
+'''
+TABLE_HEADER = '                        <th>{}</th>\n'.format
+TABLE_VIRTUAL_ROWS = 100
+PRICE_TEXT = '${:.0f}'.format
 
+BRAND_STRATEGY = '''
         <div class="strategy-box">
             <h3>🎯 {brand} 仕入れ戦略</h3>
             <div class="strategy-grid">
                 <div class="strategy-card good">
                     <h4>✅ 狙い目条件</h4>
                     <ul>
-                        <li>箱・保証書付き（{box_premium:+.0f}%）</li>
-                        <li>ノベルティ（{novelty_premium:+.0f}%）</li>
-                        <li>人気: {", ".join([s["type"] for s in item_stats[:2]])}</li>
+                        <li>箱・保証書付き（{box_premium:+.0f}%{box_interval}）</li>
+                        <li>ノベルティ（{novelty_premium:+.0f}%{novelty_interval}）</li>
+                        <li>人気: {popular_types}</li>
                     </ul>
                 </div>
                 <div class="strategy-card bad">
@@ -1343,8 +1347,10 @@ for brand, tab_id in top20_brand_tabs:
                 </div>
                 <div class="strategy-card price">
                     <h4>💰 仕入れ目安</h4>
-                    <p>通常: ¥{int(b_stats['purchase_limit']):,}以下</p>
-                    <p>上限: ${b_stats['median_price']:.0f}前後</p>
+                    <p>通常: ¥{purchase_limit:,}以下</p>
+                    <p>価格帯（P25〜P75）: ¥{purchase_limit_p25:,}〜¥{purchase_limit_p75:,}</p>
+                    <p>高値品（P90）: ¥{purchase_limit_p90:,}まで</p>
+                    <p>上限: ${median_price:.0f}前後</p>
                 </div>
             </div>
         </div>
@@ -1360,268 +1366,1537 @@ for brand, tab_id in top20_brand_tabs:
                 <div id="{tab_id}_item_chart" style="height: 280px;"></div>
             </div>
         </div>
+        <div class="brand-chart-container">
+            <h4>月別販売数推移</h4>
+            <div id="{tab_id}_monthly_chart" style="height: 260px;"></div>
+        </div>
+'''
 
-        <h3 class="section-title">📋 アイテムタイプ別詳細</h3>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>タイプ</th>
-                        <th>販売数</th>
-                        <th>比率</th>
-                        <th>中央値</th>
-                        <th>仕入上限</th>
-                        <th>CV</th>
-                        <th>検索（タイプ込み）</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
-
-    for k, type_stats in enumerate(item_stats):
-        ratio = type_stats['sales'] / b_stats['sales'] * 100 if b_stats['sales'] > 0 else 0
-        stability = get_stability(type_stats['cv'])
-        row_id = f"{tab_id}_type_{type_stats['type'].replace('/', '_')}_{k}"
-        html_parts.append(f'''
-                    <tr>
-                        <td><strong>{type_stats["type"]}</strong></td>
-                        <td>{type_stats["sales"]}</td>
-                        <td>{ratio:.1f}%</td>
-                        <td class="highlight">${type_stats["median_price"]:.0f}</td>
-                        <td data-usd="{type_stats['median_price']:.2f}">¥{int(type_stats["purchase_limit"]):,}</td>
-                        <td>{type_stats["cv"]:.2f}</td>
-                        <td>{gen_search_links(brand, type_stats['type'], row_id)}</td>
-                    </tr>
-''')
+def write_stats_grid(out, cards, usd=None):
+    """cards: (アイコン, ラベル, 表示値)。仕入上限のカードは (アイコン, ラベル, 元のドル価格) を usd と一緒に渡す"""
+    out.write('        <div class="stats-grid">\n')
+    for card in cards:
+        if isinstance(card[2], str):
+            value, value_class = card[2], 'value'
+        else:
+            value, value_class = usd_limit(usd, card[2]), 'value usd-limit'
+        out.write(STAT_CARD.format(icon=card[0], label=card[1], value=value, value_class=value_class))
+    out.write('        </div>\n')
+
+def write_insight_box(out, title, items):
+    out.write(INSIGHT_BOX.format(title=title, items=''.join(LIST_ITEM(item) for item in items)))
+
+def write_data_table(out, columns, rows, search=None):
+    """行の値を埋め込んだ表を書き出す（<tr> はブラウザの renderTable が作る）
+
+    columns: (見出し, 種類) の並び。種類は
+      'cell' / 'strong' / 'price': 表示する文字列（'price' は価格の強調表示）
+      'limit': ドル価格（仕入上限をその時点の為替・送料・手数料で計算して表示する）
+      'rank':  順位（上位は RANK_STYLES の色）
+      'page':  (リンク先, 表示名)
+      'search': 検索リンク（値は持たず、search の規則で行ごとに作る）
+    rows: 行ごとに、'search' 以外の列の値を列の順に並べたもの
+    search: table_search の戻り値
+    """
+    data = {'columns': [kind for _, kind in columns], 'rows': rows}
+    if search is not None:
+        data['search'] = search
+    out.write(DATA_TABLE.format(
+        virtual=' virtual' if len(rows) > TABLE_VIRTUAL_ROWS else '',
+        headers=''.join(TABLE_HEADER(header) for header, _ in columns),
+        # </script> などで埋め込みが途切れないように < は JSON のエスケープにする
+        data=payload_json(data).replace('<', '\\u003c'),
+    ))
+
+def table_search(row_id, brand, item_type=None, query='earrings'):
+    """データ表の検索リンク列の規則（gen_search_links をブラウザ側で行ごとに行う）
+
+    brand・item_type は行の値の位置（整数）か、表全体で同じ値。row_id の {brand} はブランド名の空白を _ に、
+    {type} はタイプの / を _ にしたもの、{i} は0始まり・{k} は1始まりの行番号に置き換える。
+    """
+    return {'id': row_id, 'brand': brand, 'type': item_type, 'query': query}
+
+# 統計カードの仕入上限の表示（元のドル価格はタブ内の出現順に usd へ記録し、JS の再計算でカードの位置と対応させる。
+# データ表の仕入上限は行の値から renderTable が計算するので usd には入れない）
+def usd_limit(usd, price):
+    usd.append(float(price))
+    return f"¥{int(purchase_limit(price)):,}"
+
+# プレミアムの信頼区間の表示（区間が無ければ何も書かない）
+def premium_interval_text(interval):
+    low, high = interval
+    if np.isnan(low) or np.isnan(high):
+        return ''
+    return f"、{PREMIUM_CI_LEVEL:.0%}区間 {low:+.0f}〜{high:+.0f}%"
+
+def listing_brand(item):
+    """上位の出品の表に出すブランド名（ブランドが判定できなかった出品は N/A）"""
+    return item['ブランド'] if pd.notna(item['ブランド']) else 'N/A'
+
+def short_title(title, length=50):
+    title = str(title)
+    return title[:length] + '...' if len(title) > length else title
+
+def write_page_head(out, report, tabs, generated=None, chart_backend='plotly'):
+    out.write(PAGE_HEAD.format(
+        chart_library=CHART_LIBRARY[chart_backend],
+        css=CSS,
+        period_start=report['period_start'],
+        period_end=report['period_end'],
+        generated=generated or datetime.now().strftime("%Y-%m-%d %H:%M"),
+        row_count=report['row_count'],
+        exchange_rate=EXCHANGE_RATE,
+        shipping=SHIPPING_JPY,
+        fee_percent=int(FEE_RATE * 100),
+    ))
+    for i, (tab_id, label, _) in enumerate(tabs):
+        out.write(TAB_BUTTON.format(active=' active' if i == 0 else '', tab_id=tab_id, label=label))
+    out.write('    </div>\n')
+
+def write_overview_tab(out, usd, report):
+    overall_stats = report['overall_stats']
+    brand_cat_stats = report['brand_cat_stats']
+    total_sales = report['total_sales']
+    top20_brands = report['brand_stats_list'][:20]
+    high_sales = brand_cat_stats.get("ハイブランド", {}).get("sales", 0)
+
+    write_stats_grid(out, [
+        ('📦', '総販売数', f"{total_sales:,}"),
+        ('💰', '総売上', f"${report['total_revenue']:,.0f}"),
+        ('📊', '平均価格', f"${overall_stats['avg_price']:.0f}"),
+        ('📈', '中央値', f"${overall_stats['median_price']:.0f}"),
+    ])
+    write_insight_box(out, '💡 市場インサイト', [
+        f"🔝 <strong>ハイブランドが市場の{high_sales / total_sales * 100:.0f}%</strong>を占める（{high_sales:,}件）",
+        f"💎 <strong>シャネルが独占</strong>: {top20_brands[0]['sales']:,}件で圧倒的シェア",
+        f"🎁 <strong>ノベルティ</strong>: {report['novelty_count']}件 / <strong>まとめ売り</strong>: {report['bundle_count']}件",
+    ])
+    out.write('''
+        <h2 class="section-title">📊 カテゴリ別分析</h2>
+        <div class="chart-grid">
+            <div class="chart-container"><div id="itemTypeBarChart" style="height:350px;"></div></div>
+            <div class="chart-container"><div id="brandCatPieChart" style="height:350px;"></div></div>
+        </div>
 
-    html_parts.append(f'''
-                </tbody>
-            </table>
+        <h2 class="section-title">🏷️ ブランド別分析（Top20）</h2>
+        <div class="chart-grid">
+            <div class="chart-container"><div id="brandBarChart" style="height:450px;"></div></div>
+            <div class="chart-container"><div id="brandPieChart" style="height:450px;"></div></div>
         </div>
 
-        <h3 class="section-title">📌 人気商品 Top15</h3>
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th>順位</th>
-                        <th>商品名</th>
-                        <th>タイプ</th>
-                        <th>販売数</th>
-                        <th>価格</th>
-                        <th>仕入上限</th>
-                        <th>検索</th>
-                    </tr>
-                </thead>
-                <tbody>
-''')
+        <h2 class="section-title">💰 価格帯分布</h2>
+        <div class="chart-container"><div id="priceDistChart" style="height:300px;"></div></div>
 
-    for k, item in enumerate(top_items, 1):
-        title = str(item['タイトル'])[:45] + '...' if len(str(item['タイトル'])) > 45 else str(item['タイトル'])
-        item_type = item['アイテムタイプ']
-        row_id = f"{tab_id}_top_{k}"
-        html_parts.append(f'''
-                    <tr>
-                        <td><strong>{k}</strong></td>
-                        <td>{title}</td>
-                        <td>{item_type}</td>
-                        <td>{item["販売数"]}</td>
-                        <td class="highlight">${item["価格"]:.0f}</td>
-                        <td data-usd="{item['価格']:.2f}">¥{int(item["仕入れ上限"]):,}</td>
-                        <td>{gen_search_links(brand, item_type, row_id)}</td>
-                    </tr>
+        <h2 class="section-title">📅 月別販売数推移</h2>
+        <div class="chart-container"><div id="monthlyTrendChart" style="height:300px;"></div></div>
+
+        <h2 class="section-title">🏷️ ブランド別詳細（Top20）</h2>
 ''')
+    write_data_table(out, [('ブランド', 'strong'), ('販売数', 'cell'), ('最低', 'cell'), ('最高', 'cell'),
+                           ('中央値', 'price'), ('仕入上限', 'limit'), ('CV', 'cell'), ('安定度', 'cell'),
+                           ('検索', 'search')], [
+        [stats['brand'], f"{stats['sales']:,}", PRICE_TEXT(stats['min_price']), PRICE_TEXT(stats['max_price']),
+         PRICE_TEXT(stats['median_price']), float(stats['median_price']), f"{stats['cv']:.2f}",
+         get_stability(stats['cv'])]
+        for stats in top20_brands
+    ], table_search('overview_{brand}', 0))
+
+def write_brands_tab(out, usd, report):
+    out.write('        <h2 class="section-title">🏷️ ブランド別販売実績（全ブランド）</h2>\n')
+    write_data_table(out, [('ブランド', 'strong'), ('カテゴリ', 'cell'), ('販売数', 'cell'), ('売上', 'cell'),
+                           ('中央値', 'price'), ('仕入上限', 'limit'), ('CV', 'cell'), ('安定度', 'cell'),
+                           ('検索', 'search')], [
+        [stats['brand'], str(stats['category']), f"{stats['sales']:,}", f"${stats['revenue']:,.0f}",
+         PRICE_TEXT(stats['median_price']), float(stats['median_price']), f"{stats['cv']:.2f}",
+         get_stability(stats['cv'])]
+        for stats in report['brand_stats_list']
+    ], table_search('brands_{brand}_{i}', 0))
+
+# アイテムタイプ別タブ
+def write_item_type_tab(out, usd, report, item_type, tab_id):
+    type_stats = report['item_type_stats'][item_type]
+    type_en = TYPE_KEYWORDS.get(item_type, {}).get('en', 'earrings')
+    type_jp = TYPE_KEYWORDS.get(item_type, {}).get('jp', 'イヤリング')
 
-    html_parts.append('''
-                </tbody>
-            </table>
-        </div>
-    </div>
+    write_stats_grid(out, [
+        ('📦', '販売数', f"{type_stats['sales']:,}"),
+        ('💰', '売上', f"${type_stats['revenue']:,.0f}"),
+        ('📈', '中央値', f"${type_stats['median_price']:.0f}"),
+        ('📊', '仕入上限', type_stats['median_price']),
+    ], usd)
+    out.write(f'''
+        <h2 class="section-title">🏷️ {item_type} ブランド別詳細</h2>
+        <p style="margin-bottom:15px;color:var(--text-secondary);">検索キーワード: <strong>{type_en}</strong> / <strong>{type_jp}</strong></p>
 ''')
+    write_data_table(out, [('ブランド', 'strong'), ('販売数', 'cell'), ('中央値', 'price'), ('仕入上限', 'limit'),
+                           ('CV', 'cell'), ('安定度', 'cell'), ('検索（タイプ込み）', 'search')], [
+        [b_stats['brand'], f"{b_stats['sales']:,}", PRICE_TEXT(b_stats['median_price']),
+         float(b_stats['median_price']), f"{b_stats['cv']:.2f}", get_stability(b_stats['cv'])]
+        for b_stats in report['type_brand_stats'][item_type]
+    ], table_search(tab_id + '_{brand}_{i}', 0, item_type))
+
+# ノベルティタブ（詳細分析）
+def write_novelty_tab(out, usd, report):
+    novelty_stats = report['novelty_stats']
+
+    write_stats_grid(out, [
+        ('🎁', 'ノベルティ件数', f"{report['novelty_count']:,}"),
+        ('📦', '総販売数', f"{novelty_stats.get('sales', 0):,}"),
+        ('💰', '総売上', f"${novelty_stats.get('revenue', 0):,.0f}"),
+        ('📈', '中央値', f"${novelty_stats.get('median_price', 0):.0f}"),
+    ])
+    write_insight_box(out, '🎁 ノベルティ市場の特徴', [
+        '💎 仕入れルート: 百貨店購入特典、ビューティーカウンター、VIPイベント',
+        '🏷️ キーワード: NOVELTY, GWP, LIMITED, VIP, GIFT, NOT FOR SALE',
+        '📈 CHANELノベルティが最も取引量が多い',
+    ])
+    out.write('\n        <h2 class="section-title">🏷️ ブランド別ノベルティ分析</h2>\n')
+    write_data_table(out, [('ブランド', 'strong'), ('件数', 'cell'), ('販売数', 'cell'), ('中央値', 'price'),
+                           ('仕入上限', 'limit'), ('検索', 'search')], [
+        [b_stats['brand'], str(b_stats['count']), str(b_stats['sales']), PRICE_TEXT(b_stats['median_price']),
+         float(b_stats['median_price'])]
+        for b_stats in report['novelty_brand_stats']
+    ], table_search('novelty_{brand}_{i}', 0, query='novelty'))
+
+    out.write('\n        <h2 class="section-title">📌 ノベルティ人気商品 Top15</h2>\n')
+    write_data_table(out, [('ブランド', 'cell'), ('商品名', 'cell'), ('販売数', 'cell'), ('価格', 'price'),
+                           ('仕入上限', 'limit')], [
+        [listing_brand(item), short_title(item['タイトル']), str(item['販売数']), PRICE_TEXT(item['価格']),
+         float(item['価格'])]
+        for item in report['novelty_top']
+    ])
 
-# JavaScript
-monthly_traces = []
-for item_type, values in monthly_data.items():
-    monthly_traces.append({
-        'x': monthly_labels,
-        'y': values,
-        'name': item_type,
-        'type': 'scatter',
-        'mode': 'lines+markers'
-    })
-
-html_parts.append(f'''
+# まとめ売りタブ（詳細分析）
+def write_bundle_tab(out, usd, report):
+    bundle_stats = report['bundle_stats']
+
+    write_stats_grid(out, [
+        ('📦', 'まとめ売り件数', f"{report['bundle_count']:,}"),
+        ('📊', '総販売数', f"{bundle_stats.get('sales', 0):,}"),
+        ('💰', '総売上', f"${bundle_stats.get('revenue', 0):,.0f}"),
+        ('📈', '中央値', f"${bundle_stats.get('median_price', 0):.0f}"),
+    ])
+    write_insight_box(out, '📦 まとめ売り市場の特徴', [
+        '⚠️ 単価分析には不向き（平均価格が歪む）',
+        '💎 ブランド品のセットは希少性あり',
+        '📉 ノーブランドのまとめ売りは利益率低め',
+    ])
+    out.write('\n        <h2 class="section-title">📊 セット内容別分析</h2>\n')
+    write_data_table(out, [('セットタイプ', 'strong'), ('件数', 'cell'), ('販売数', 'cell'), ('中央値', 'price')], [
+        [str(row['タイプ']), str(row['件数']), str(row['販売数']), PRICE_TEXT(row['中央値'])]
+        for row in report['bundle_type_stats']
+    ])
+
+    out.write('\n        <h2 class="section-title">🏷️ ブランド別まとめ売り分析</h2>\n')
+    write_data_table(out, [('ブランド', 'strong'), ('件数', 'cell'), ('販売数', 'cell'), ('中央値', 'price'),
+                           ('検索', 'search')], [
+        [b_stats['brand'], str(b_stats['count']), str(b_stats['sales']), PRICE_TEXT(b_stats['median_price'])]
+        for b_stats in report['bundle_brand_stats']
+    ], table_search('bundle_{brand}_{i}', 0, query='bundle'))
+
+    out.write('\n        <h2 class="section-title">📌 まとめ売り人気商品 Top15</h2>\n')
+    write_data_table(out, [('ブランド', 'cell'), ('商品名', 'cell'), ('販売数', 'cell'), ('価格', 'price')], [
+        [listing_brand(item), short_title(item['タイトル']), str(item['販売数']), PRICE_TEXT(item['価格'])]
+        for item in report['bundle_top']
+    ])
+
+# おすすめ出品順序タブ（スコア = 販売数 × 中央値）。上位3位の順位の色
+RANK_STYLES = ['color: gold; font-weight: bold;', 'color: silver; font-weight: bold;',
+               'color: #cd7f32; font-weight: bold;']
+
+def write_recommend_tab(out, usd, report):
+    ranked = sorted(report['brand_stats_list'], key=lambda x: x['sales'] * x['median_price'], reverse=True)[:20]
+
+    out.write('''        <h2 class="section-title">⭐ おすすめ出品順序 TOP20</h2>
+        <p style="margin-bottom:15px;color:var(--text-secondary);">スコア = 販売数 × 中央値</p>
+''')
+    write_data_table(out, [('順位', 'rank'), ('ブランド', 'strong'), ('販売数', 'cell'), ('中央値', 'price'),
+                           ('仕入上限', 'limit'), ('スコア', 'cell'), ('検索', 'search')], [
+        [i + 1, stats['brand'], f"{stats['sales']:,}", PRICE_TEXT(stats['median_price']),
+         float(stats['median_price']), f"{stats['sales'] * stats['median_price']:,.0f}"]
+        for i, stats in enumerate(ranked)
+    ], table_search('rec_{brand}_{i}', 1))
+
+# ブランド個別タブ（Top20）
+def write_brand_tab(out, usd, tab):
+    brand = tab['brand']
+    tab_id = tab['tab_id']
+    b_stats = tab['stats']
+    item_stats = tab['item_stats']
+
+    write_stats_grid(out, [
+        ('📦', '総販売数', f"{b_stats['sales']:,}"),
+        ('💰', '総売上', f"${b_stats['revenue']:,.0f}"),
+        ('📈', '中央値', f"${b_stats['median_price']:.0f}"),
+        ('📊', 'CV値', f"{b_stats['cv']:.2f}"),
+        ('🎁', 'ノベルティ', f"{tab['novelty_count']}件"),
+    ])
+    out.write(BRAND_STRATEGY.format(
+        brand=brand,
+        tab_id=tab_id,
+        box_premium=tab['box_premium'],
+        box_interval=premium_interval_text(tab['box_premium_ci']),
+        novelty_premium=tab['novelty_premium'],
+        novelty_interval=premium_interval_text(tab['novelty_premium_ci']),
+        popular_types=", ".join([s["type"] for s in item_stats[:2]]),
+        bulk_count=tab['bulk_count'],
+        purchase_limit=int(b_stats['purchase_limit']),
+        purchase_limit_p25=int(b_stats['purchase_limit_p25']),
+        purchase_limit_p75=int(b_stats['purchase_limit_p75']),
+        purchase_limit_p90=int(b_stats['purchase_limit_p90']),
+        median_price=b_stats['median_price'],
+    ))
+
+    out.write('\n        <h3 class="section-title">📋 アイテムタイプ別詳細</h3>\n')
+    write_data_table(out, [('タイプ', 'strong'), ('販売数', 'cell'), ('比率', 'cell'), ('中央値', 'price'),
+                           ('仕入上限', 'limit'), ('CV', 'cell'), ('検索（タイプ込み）', 'search')], [
+        [type_stats['type'], str(type_stats['sales']),
+         f"{type_stats['sales'] / b_stats['sales'] * 100 if b_stats['sales'] > 0 else 0:.1f}%",
+         PRICE_TEXT(type_stats['median_price']), float(type_stats['median_price']), f"{type_stats['cv']:.2f}"]
+        for type_stats in item_stats
+    ], table_search(tab_id + '_type_{type}_{i}', brand, 0))
+
+    out.write('\n        <h3 class="section-title">📌 人気商品 Top15</h3>\n')
+    write_data_table(out, [('順位', 'strong'), ('商品名', 'cell'), ('タイプ', 'cell'), ('販売数', 'cell'),
+                           ('価格', 'price'), ('仕入上限', 'limit'), ('検索', 'search')], [
+        [str(k), short_title(item['タイトル'], 45), str(item['アイテムタイプ']), str(item['販売数']),
+         PRICE_TEXT(item['価格']), float(item['価格'])]
+        for k, item in enumerate(tab['top_items'], 1)
+    ], table_search(tab_id + '_top_{k}', brand, 2))
+
+# タブバーのタブ（タブID, タブ名, 中身を書き出す関数）。中身が無いタブは関数が None
+ITEM_TYPE_TABS = [('Stud', 'stud', '💎 Stud'), ('Hoop', 'hoop', '⭕ Hoop'),
+                  ('Drop/Dangle', 'drop', '💧 Drop'), ('Clip-on', 'clipon', '📎 Clip-on')]
+
+def report_tabs(report):
+    tabs = [
+        ('overview', '📊 全体分析', partial(write_overview_tab, report=report)),
+        ('brands', '🏷️ ブランド一覧', partial(write_brands_tab, report=report)),
+    ]
+    for item_type, tab_id, label in ITEM_TYPE_TABS:
+        writer = None
+        if item_type in report['item_type_stats']:
+            writer = partial(write_item_type_tab, report=report, item_type=item_type, tab_id=tab_id)
+        tabs.append((tab_id, label, writer))
+    tabs += [
+        ('novelty', '🎁 ノベルティ', partial(write_novelty_tab, report=report)),
+        ('bundle', '📦 まとめ売り', partial(write_bundle_tab, report=report)),
+        ('recommend', '⭐ おすすめ', partial(write_recommend_tab, report=report)),
+    ]
+    # Top20ブランドタブ
+    brand_tabs = {tab['tab_id']: tab for tab in report['brand_tabs']}
+    for brand, tab_id in report['top20_brand_tabs']:
+        writer = partial(write_brand_tab, tab=brand_tabs[tab_id]) if tab_id in brand_tabs else None
+        tabs.append((tab_id, brand[:10], writer))
+    return tabs
+
+# グラフ定義（Plotly のトレースと、共通レイアウトへの上書き）
+def chart_specs(report):
+    """タブID → そのタブのグラフ [{'id': 要素ID, 'data': トレース, 'layout': レイアウト}]"""
+    item_type_stats = report['item_type_stats']
+    brand_cat_stats = report['brand_cat_stats']
+    top20_brands = report['brand_stats_list'][:20]
+    price_dist = report['price_dist']
+    monthly_sales = report['monthly_sales']
+
+    top20_brand_labels = [s['brand'][:12] for s in top20_brands]
+    top20_brand_sales = [s['sales'] for s in top20_brands]
+
+    monthly_labels = chart_months(monthly_sales)
+    monthly_traces = []
+    for item_type in monthly_sales.columns:
+        monthly_traces.append({
+            'x': monthly_labels,
+            'y': monthly_sales[item_type].tail(12).tolist(),
+            'name': item_type,
+            'type': 'scatter',
+            'mode': 'lines+markers'
+        })
+
+    charts = {'overview': [
+        {'id': 'itemTypeBarChart',
+         'data': [{'x': list(item_type_stats.keys()), 'y': [s['sales'] for s in item_type_stats.values()],
+                   'type': 'bar', 'marker': {'color': '#6366f1'}}],
+         'layout': {'title': 'アイテムタイプ別販売数'}},
+        {'id': 'brandCatPieChart',
+         'data': [{'labels': list(brand_cat_stats.keys()), 'values': [s['sales'] for s in brand_cat_stats.values()],
+                   'type': 'pie', 'hole': 0.4}],
+         'layout': {'title': 'ブランドカテゴリ別'}},
+        {'id': 'brandBarChart',
+         'data': [{'y': top20_brand_labels, 'x': top20_brand_sales, 'type': 'bar', 'orientation': 'h',
+                   'marker': {'color': '#8b5cf6'}}],
+         'layout': {'title': 'ブランド別販売数 Top20', 'margin': {'l': 100}}},
+        {'id': 'brandPieChart',
+         'data': [{'labels': top20_brand_labels[:10], 'values': top20_brand_sales[:10], 'type': 'pie', 'hole': 0.4}],
+         'layout': {'title': 'ブランド別シェア Top10'}},
+        {'id': 'priceDistChart',
+         'data': [{'x': list(price_dist.keys()), 'y': list(price_dist.values()), 'type': 'bar',
+                   'marker': {'color': '#10b981'}}],
+         'layout': {'title': '価格帯別販売数'}},
+        {'id': 'monthlyTrendChart',
+         'data': monthly_traces,
+         'layout': {'title': '月別販売数推移', 'showlegend': True}},
+    ]}
+
+    for tab in report['brand_tabs']:
+        charts[tab['tab_id']] = brand_tab_charts(tab, monthly_labels)
+    return charts
+
+def chart_months(monthly_sales):
+    """月別推移のグラフに出す月（直近12か月）"""
+    return monthly_sales.index.tolist()[-12:] if len(monthly_sales) > 12 else monthly_sales.index.tolist()
+
+def brand_tab_charts(tab, monthly_labels):
+    tab_id = tab['tab_id']
+    return [
+        {'id': f'{tab_id}_price_chart',
+         'data': [{'x': list(tab['price_dist'].keys()), 'y': list(tab['price_dist'].values()), 'type': 'bar',
+                   'marker': {'color': '#6366f1'}}],
+         'layout': {'title': ''}},
+        {'id': f'{tab_id}_item_chart',
+         'data': [{'labels': list(tab['item_dist'].keys()), 'values': list(tab['item_dist'].values()),
+                   'type': 'pie', 'hole': 0.4}],
+         'layout': {'title': ''}},
+        {'id': f'{tab_id}_monthly_chart',
+         'data': [{'x': monthly_labels, 'y': [tab['monthly_sales'].get(month, 0) for month in monthly_labels],
+                   'type': 'scatter', 'mode': 'lines+markers', 'line': {'color': '#8b5cf6'}}],
+         'layout': {'title': ''}},
+    ]
+
+def compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def payload_json(value):
+    """ページに埋め込むデータの JSON（orjson があればそれで書き出す。出力は compact_json と同じ形）"""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return compact_json(value)
+
+def encode_charts(charts):
+    """グラフ定義を、ラベルの辞書を共有する列指向の形にする（ページでは decodeCharts で元に戻す）
+
+    文字列だけの配列（価格帯・月・アイテムタイプ・ブランドのラベル）は、すべての文字列を1回ずつ並べた
+    strings への整数コードの配列にし、同じ並びの配列は arrays に1回だけ置いて {'$l': 番号} で参照する。
+    ブランドタブごとの価格帯ラベルや、アイテムタイプごとの月の並びは1回しか書き出されない。
+    同じ並びの配列が1つも無ければ（ブランド別ページのようにブランドが1つだけのとき）辞書の分だけ
+    大きくなるので、charts は符号化せずにそのまま入れる。
+    """
+    strings, arrays = {}, {}
+    references = 0
+
+    def encode(value):
+        nonlocal references
+        if isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+            codes = tuple(strings.setdefault(v, len(strings)) for v in value)
+            references += 1
+            return {'$l': arrays.setdefault(codes, len(arrays))}
+        if isinstance(value, list):
+            return [encode(v) for v in value]
+        if isinstance(value, dict):
+            return {key: encode(v) for key, v in value.items()}
+        return value
+
+    encoded = encode(charts)
+    if references == len(arrays):
+        return {'strings': [], 'arrays': [], 'charts': charts}
+    return {'strings': list(strings), 'arrays': [list(codes) for codes in arrays], 'charts': encoded}
+
+# JavaScript（1ファイル版・分割版で共通の部分）
+SCRIPT_COMMON = '''
     <script>
-        function toggleTheme() {{
+        function toggleTheme() {
             const body = document.body;
             const btn = document.getElementById('themeBtn');
-            if (body.getAttribute('data-theme') === 'dark') {{
+            if (body.getAttribute('data-theme') === 'dark') {
                 body.removeAttribute('data-theme');
                 btn.textContent = '🌙 ダークモード';
                 localStorage.setItem('theme', 'light');
-            }} else {{
+            } else {
                 body.setAttribute('data-theme', 'dark');
                 btn.textContent = '☀️ ライトモード';
                 localStorage.setItem('theme', 'dark');
-            }}
-        }}
+            }
+        }
 
-        if (localStorage.getItem('theme') === 'dark') {{
+        if (localStorage.getItem('theme') === 'dark') {
             document.body.setAttribute('data-theme', 'dark');
             document.getElementById('themeBtn').textContent = '☀️ ライトモード';
-        }}
+        }
 
-        function showTab(tabId) {{
+        function showTab(tabId) {
             document.querySelectorAll('.tab-content').forEach(c => c.classList.remove('active'));
             document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
             document.getElementById(tabId).classList.add('active');
             event.target.classList.add('active');
-        }}
-
-        async function updateExchangeRate() {{
-            try {{
+            activeTab = tabId;
+            loadTab(tabId);
+            updateLimits(tabId);
+            // 非表示のあいだに作った表は行の高さを測れていないので、表示したところで作り直す
+            (dataTables[tabId] || []).forEach(table => {
+                if (table.virtual && !table.rowHeight) {
+                    table.start = -1;
+                    renderTable(table);
+                }
+            });
+        }
+
+        async function updateExchangeRate() {
+            try {
                 const response = await fetch('https://api.exchangerate-api.com/v4/latest/USD');
                 const data = await response.json();
                 const rate = data.rates.JPY;
                 document.getElementById('exchangeRate').value = rate.toFixed(2);
                 recalculate();
                 alert('為替更新: 1USD = ' + rate.toFixed(2) + '円');
-            }} catch (error) {{
+            } catch (error) {
                 alert('為替取得に失敗');
-            }}
-        }}
+            }
+        }
+
+        // 仕入上限の再計算: タブごとにドル価格の配列と、同じ順に並んだ統計カードの .usd-limit を対応させておき、
+        // 表示中のタブだけを1回のループで書き換える。他のタブは表示したときに最新の設定で書き換える。
+        // データ表の仕入上限は行の値から作り直す（renderTable）。
+        // 計算式は Python の purchase_limit と同じ（price * 為替 * (1 - 手数料) - 送料 を整数に切り捨て）。
+        let activeTab = 'overview';
+        let ratesVersion = 0;
+        const limitTabs = {};
+
+        function currentRates() {
+            return {
+                rate: parseFloat(document.getElementById('exchangeRate').value),
+                shipping: parseFloat(document.getElementById('shippingCost').value),
+                keep: 1 - parseFloat(document.getElementById('feeRate').value) / 100
+            };
+        }
+
+        function limitText(usd, rates) {
+            // Python の int() と同じく -0 は 0 と表示する
+            return '¥' + (Math.trunc(usd * rates.rate * rates.keep - rates.shipping) || 0).toLocaleString('en-US');
+        }
+
+        function registerLimits(tabId, usd) {
+            const root = document.getElementById(tabId);
+            limitTabs[tabId] = {
+                usd: Float64Array.from(usd),
+                cells: Array.from(root.getElementsByClassName('usd-limit')).filter(cell => !cell.closest('.data-table')),
+                version: 0
+            };
+        }
+
+        function updateLimits(tabId) {
+            const tab = limitTabs[tabId];
+            if (!tab || tab.version === ratesVersion) return;
+            const rates = currentRates();
+            const usd = tab.usd;
+            const cells = tab.cells;
+            for (let i = 0; i < usd.length; i++) {
+                cells[i].textContent = limitText(usd[i], rates);
+            }
+            (dataTables[tabId] || []).forEach(table => renderTable(table));
+            tab.version = ratesVersion;
+        }
+
+        function recalculate() {
+            ratesVersion++;
+            updateLimits(activeTab);
+        }
+
+        function loadChecks() {
+            return JSON.parse(localStorage.getItem('earringChecks') || '{}');
+        }
+
+        // チェック状態は localStorage に保存し、データ表の行を作り直すたびにそこから戻す
+        function initCheckboxes(root) {
+            root.addEventListener('change', function(event) {
+                const checkbox = event.target;
+                if (!checkbox.classList || !checkbox.classList.contains('search-checkbox')) return;
+                const row = checkbox.closest('tr');
+                const saved = loadChecks();
+                if (checkbox.checked) {
+                    saved[checkbox.dataset.id] = true;
+                } else {
+                    delete saved[checkbox.dataset.id];
+                }
+                // 同じ行の両方がチェックされたらグレーアウト
+                if (row) {
+                    const checkboxes = row.querySelectorAll('.search-checkbox');
+                    const allChecked = Array.from(checkboxes).every(cb => cb.checked);
+                    if (allChecked) {
+                        row.classList.add('checked-row');
+                    } else {
+                        row.classList.remove('checked-row');
+                    }
+                }
+                localStorage.setItem('earringChecks', JSON.stringify(saved));
+            });
+        }
+
+        // データ表（write_data_table）: 埋め込んだ行の値から <tr> を作る。.virtual の表は見えている行の
+        // 前後 TABLE_OVERSCAN 行だけを作り、その上下は行の高さ分の空き行にしてスクロール位置を保つ
+        const TABLE_OVERSCAN = 20;
+        const TABLE_ROW_HEIGHT = 40;  // 行の高さを測れるまでの仮の値（px）
+        const TABLE_VIEW_HEIGHT = 600;  // 非表示のタブの表で高さを測れないときの表示範囲（.data-table.virtual の max-height）
+        const dataTables = {};
+
+        function escapeHtml(value) {
+            return String(value).replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})[c]);
+        }
+
+        function ownValue(object, key) {
+            return key != null && Object.prototype.hasOwnProperty.call(object, key) ? object[key] : undefined;
+        }
+
+        // gen_ebay_link / gen_mercari_link と同じ規則
+        function ebayLink(brand, itemType, query) {
+            const keywords = itemType ? ownValue(searchRules.types, itemType) : undefined;
+            const words = keywords ? keywords.en.replaceAll(' ', '+') : searchRules.queries[query][0];
+            return 'https://www.ebay.com/sch/i.html?_nkw=' + brand.replaceAll(' ', '+') + '+' + words
+                + '&LH_Sold=1&LH_Complete=1';
+        }
+
+        function mercariLink(brand, itemType, query) {
+            const brandJp = ownValue(searchRules.brands, brand) ?? brand;
+            const keywords = itemType ? ownValue(searchRules.types, itemType) : undefined;
+            const words = keywords ? keywords.jp : searchRules.queries[query][1];
+            return 'https://jp.mercari.com/search?keyword=' + brandJp + '%20' + words + '&status=on_sale';
+        }
+
+        // 行の検索リンク（table_search の規則。値の位置が整数なら行の値、それ以外は表全体で同じ値）
+        function searchCell(search, row, i, saved) {
+            const brand = typeof search.brand === 'number' ? row[search.brand] : search.brand;
+            const itemType = typeof search.type === 'number' ? row[search.type] : search.type;
+            const rowId = search.id
+                .replace('{brand}', () => brand.replaceAll(' ', '_'))
+                .replace('{type}', () => String(itemType).replaceAll('/', '_'))
+                .replace('{i}', i)
+                .replace('{k}', i + 1);
+            const checkbox = site => '<input type="checkbox" class="search-checkbox" data-id="' + escapeHtml(rowId + '_' + site)
+                + '"' + (saved[rowId + '_' + site] ? ' checked' : '') + '>';
+            const checked = saved[rowId + '_ebay'] || saved[rowId + '_mercari'];
+            // ボタンとチェックボックスの間の空白は SEARCH_LINKS と同じく残す
+            return {
+                checked: checked,
+                html: '<td> <a href="' + escapeHtml(ebayLink(brand, itemType, search.query))
+                    + '" target="_blank" class="link-btn link-ebay">eBay</a> ' + checkbox('ebay')
+                    + ' <a href="' + escapeHtml(mercariLink(brand, itemType, search.query))
+                    + '" target="_blank" class="link-btn link-mercari">メルカリ</a> ' + checkbox('mercari') + ' </td>'
+            };
+        }
+
+        function tableRow(data, row, i, rates, saved) {
+            let html = '';
+            let checked = false;
+            let value = 0;
+            for (const kind of data.columns) {
+                if (kind === 'search') {
+                    const cell = searchCell(data.search, row, i, saved);
+                    checked = cell.checked;
+                    html += cell.html;
+                    continue;
+                }
+                const v = row[value++];
+                if (kind === 'strong') html += '<td><strong>' + escapeHtml(v) + '</strong></td>';
+                else if (kind === 'price') html += '<td class="highlight">' + escapeHtml(v) + '</td>';
+                else if (kind === 'limit') html += '<td class="usd-limit">' + limitText(v, rates) + '</td>';
+                else if (kind === 'rank') html += '<td style="' + (rankStyles[i] || '') + '">' + v + '</td>';
+                else if (kind === 'page') html += '<td><strong><a href="' + escapeHtml(v[0]) + '">' + escapeHtml(v[1]) + '</a></strong></td>';
+                else html += '<td>' + escapeHtml(v) + '</td>';
+            }
+            return (checked ? '<tr class="checked-row">' : '<tr>') + html + '</tr>';
+        }
+
+        function spacerRow(height, span) {
+            return '<tr class="table-spacer"><td colspan="' + span + '" style="height:' + height + 'px"></td></tr>';
+        }
+
+        function renderTable(table) {
+            const rows = table.data.rows;
+            const box = table.container;
+            const height = table.rowHeight || TABLE_ROW_HEIGHT;
+            let start = 0;
+            let end = rows.length;
+            if (table.virtual) {
+                const count = Math.ceil((box.clientHeight || TABLE_VIEW_HEIGHT) / height) + 2 * TABLE_OVERSCAN;
+                start = Math.max(0, Math.min(Math.floor(box.scrollTop / height) - TABLE_OVERSCAN, rows.length - count));
+                end = Math.min(rows.length, start + count);
+            }
+            if (start === table.start && end === table.end && table.version === ratesVersion) return;
+            const rates = currentRates();
+            const saved = loadChecks();
+            const span = table.data.columns.length;
+            let html = start > 0 ? spacerRow(start * height, span) : '';
+            for (let i = start; i < end; i++) html += tableRow(table.data, rows[i], i, rates, saved);
+            if (end < rows.length) html += spacerRow((rows.length - end) * height, span);
+            table.tbody.innerHTML = html;
+            table.start = start;
+            table.end = end;
+            table.version = ratesVersion;
+            // 表示中なら作った行の平均の高さを測り、仮の値と違えばそれで作り直す
+            if (table.virtual && !table.rowHeight && end > start) {
+                const body = table.tbody.rows;
+                const first = body[start > 0 ? 1 : 0];
+                const last = body[start > 0 ? end - start : end - start - 1];
+                const measured = (last.offsetTop + last.offsetHeight - first.offsetTop) / (end - start);
+                if (measured > 0) {
+                    table.rowHeight = measured;
+                    table.start = -1;
+                    renderTable(table);
+                }
+            }
+        }
+
+        function initTables(root) {
+            root.querySelectorAll('.data-table').forEach(container => {
+                const tab = container.closest('.tab-content');
+                const table = {
+                    container: container,
+                    tbody: container.querySelector('tbody'),
+                    data: JSON.parse(container.querySelector('script').textContent),
+                    virtual: container.classList.contains('virtual'),
+                    rowHeight: 0,
+                    start: -1,
+                    end: -1,
+                    version: -1
+                };
+                (dataTables[tab.id] = dataTables[tab.id] || []).push(table);
+                if (table.virtual) {
+                    let frame = 0;
+                    container.addEventListener('scroll', () => {
+                        if (!frame) frame = requestAnimationFrame(() => { frame = 0; renderTable(table); });
+                    });
+                }
+                renderTable(table);
+            });
+        }
+'''
 
-        function recalculate() {{
-            const rate = parseFloat(document.getElementById('exchangeRate').value);
-            const shipping = parseFloat(document.getElementById('shippingCost').value);
-            const feeRate = parseFloat(document.getElementById('feeRate').value) / 100;
+# グラフの描き方ごとの、<head> で読み込むライブラリと plotCharts（タブのグラフを描く関数）
+# 'plotly' はブラウザで Plotly が描く（CDN から読み込むのでオフラインでは表示されない）。'svg' は
+# svg_charts で作った静的な SVG を差し込むだけで、外部の読み込みが無く、オフラインでも表示できる
+CHART_LIBRARY = {
+    'plotly': '    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>\n',
+    'svg': '',
+}
+PLOT_CHARTS = {
+    'plotly': '''
+        const chartLayout = {
+            paper_bgcolor: 'transparent',
+            plot_bgcolor: 'transparent',
+            font: { color: '#333', size: 11 },
+            margin: { t: 30, r: 20, b: 50, l: 50 }
+        };
+
+        function plotCharts(charts) {
+            charts.forEach(chart => Plotly.newPlot(chart.id, chart.data, {...chartLayout, ...chart.layout}));
+        }
+
+        // encode_charts の形から元のグラフ定義に戻す（{'$l': 番号} を arrays の番号のラベル配列にする）
+        function decodeCharts(payload) {
+            const arrays = payload.arrays.map(codes => codes.map(code => payload.strings[code]));
+            // 取り出したオブジェクトをその場で書き換える（数値の配列は中を見ない）
+            const decode = value => {
+                if (value === null || typeof value !== 'object') return value;
+                if (Array.isArray(value)) {
+                    if (typeof value[0] !== 'number') for (let i = 0; i < value.length; i++) value[i] = decode(value[i]);
+                    return value;
+                }
+                if (value.$l !== undefined) return arrays[value.$l].slice();
+                for (const key in value) value[key] = decode(value[key]);
+                return value;
+            };
+            return decode(payload.charts);
+        }
+''',
+    'svg': '''
+        function plotCharts(charts) {
+            charts.forEach(chart => { document.getElementById(chart.id).innerHTML = chart.svg; });
+        }
+
+        function decodeCharts(payload) {
+            return payload;
+        }
+''',
+}
+CHART_BACKENDS = list(PLOT_CHARTS)
+
+# SVG の viewBox の大きさ（HTML のグラフ要素の高さと、1400px のコンテナの1列か2列かに合わせる）。
+# グラフIDが完全に一致するものを優先し、無ければ末尾で引く
+CHART_SIZES = {
+    'itemTypeBarChart': (650, 350), 'brandCatPieChart': (650, 350),
+    'brandBarChart': (650, 450), 'brandPieChart': (650, 450),
+    'priceDistChart': (1300, 300), 'monthlyTrendChart': (1300, 300),
+    '_price_chart': (650, 280), '_item_chart': (650, 280), '_monthly_chart': (1300, 260),
+}
+
+def chart_size(chart_id):
+    if chart_id in CHART_SIZES:
+        return CHART_SIZES[chart_id]
+    return next(size for suffix, size in CHART_SIZES.items() if chart_id.endswith(suffix))
+
+def chart_payload(charts, chart_backend='plotly'):
+    """タブID → グラフ定義の並び を、ページに埋め込む形にする
+
+    'plotly' は encode_charts の列指向の形、'svg' はタブID → [{'id', 'svg'}]。どちらもページの
+    decodeCharts でタブID → グラフの並びに戻る。
+    """
+    if chart_backend == 'plotly':
+        return encode_charts(charts)
+    return {tab_id: [{'id': spec['id'], 'svg': render_chart(spec, *chart_size(spec['id']))} for spec in specs]
+            for tab_id, specs in charts.items()}
+
+# データ表の検索リンクと順位の色（renderTable が使う）
+TABLE_RULES = '''
+        const searchRules = {search_rules};
+        const rankStyles = {rank_styles};
+'''
 
-            document.querySelectorAll('[data-usd]').forEach(cell => {{
-                const usd = parseFloat(cell.getAttribute('data-usd'));
-                const limit = Math.floor(usd * rate * (1 - feeRate) - shipping);
-                cell.textContent = '¥' + limit.toLocaleString();
-            }});
+def search_rules():
+    """gen_ebay_link / gen_mercari_link の規則のうち、ブラウザ側の ebayLink / mercariLink に渡す表"""
+    return {'types': TYPE_KEYWORDS, 'brands': BRAND_JP, 'queries': SEARCH_QUERIES}
+
+def write_script_common(out, chart_backend='plotly', active_tab=None):
+    """1ファイル版・分割版・ブランド別ページで共通のスクリプト（active_tab は最初に表示するタブ）"""
+    script = SCRIPT_COMMON
+    if active_tab is not None:
+        script = script.replace("let activeTab = 'overview';", f"let activeTab = '{active_tab}';")
+    out.write(script)
+    out.write(TABLE_RULES.format(search_rules=compact_json(search_rules()), rank_styles=compact_json(RANK_STYLES)))
+    out.write(PLOT_CHARTS[chart_backend])
+
+# 1ファイル版: 全タブとグラフデータを埋め込み、読み込み時にすべて描画する
+SCRIPT_SINGLE = '''
+        const tabCharts = decodeCharts({charts});
+        const tabUsd = {usd};
+
+        function loadTab(tabId) {{
+            if (!limitTabs[tabId] && tabUsd[tabId]) registerLimits(tabId, tabUsd[tabId]);
         }}
 
-        function initCheckboxes() {{
-            const saved = JSON.parse(localStorage.getItem('earringChecks') || '{{}}');
-            document.querySelectorAll('.search-checkbox').forEach(checkbox => {{
-                const id = checkbox.dataset.id;
-                if (saved[id]) {{
-                    checkbox.checked = true;
-                    const row = checkbox.closest('tr');
-                    if (row) row.classList.add('checked-row');
-                }}
-                checkbox.addEventListener('change', function() {{
-                    const row = this.closest('tr');
-                    if (this.checked) {{
-                        saved[id] = true;
-                    }} else {{
-                        delete saved[id];
-                    }}
-                    // 同じ行の両方がチェックされたらグレーアウト
-                    if (row) {{
-                        const checkboxes = row.querySelectorAll('.search-checkbox');
-                        const allChecked = Array.from(checkboxes).every(cb => cb.checked);
-                        if (allChecked) {{
-                            row.classList.add('checked-row');
-                        }} else {{
-                            row.classList.remove('checked-row');
-                        }}
-                    }}
-                    localStorage.setItem('earringChecks', JSON.stringify(saved));
+        document.addEventListener('DOMContentLoaded', function() {{
+            initCheckboxes(document);
+            initTables(document);
+            Object.values(tabCharts).forEach(plotCharts);
+            loadTab(activeTab);
+        }});
+    </script>
+</body>
+</html>
+'''
+
+# 分割版: タブを初めて開いたときに tabs/<タブID>.json を取得して描画する
+SCRIPT_SPLIT = '''
+        const buildId = '{build_id}';
+        const loadedTabs = {{}};
+
+        function loadTab(tabId) {{
+            if (loadedTabs[tabId]) return;
+            const root = document.getElementById(tabId);
+            loadedTabs[tabId] = fetch('{shard_dir}/' + encodeURIComponent(tabId) + '.json?v=' + buildId)
+                .then(response => response.json())
+                .then(shard => {{
+                    root.innerHTML = shard.html;
+                    initTables(root);
+                    registerLimits(tabId, shard.usd);
+                    if (activeTab === tabId) updateLimits(tabId);
+                    initCheckboxes(root);
+                    plotCharts(decodeCharts(shard.charts)[tabId] || []);
+                }})
+                .catch(() => {{
+                    delete loadedTabs[tabId];
+                    root.innerHTML = '<p>タブの読み込みに失敗しました</p>';
                 }});
-            }});
         }}
 
         document.addEventListener('DOMContentLoaded', function() {{
-            initCheckboxes();
-
-            const layout = {{
-                paper_bgcolor: 'transparent',
-                plot_bgcolor: 'transparent',
-                font: {{ color: '#333', size: 11 }},
-                margin: {{ t: 30, r: 20, b: 50, l: 50 }}
-            }};
-
-            Plotly.newPlot('itemTypeBarChart', [{{
-                x: {json.dumps(item_type_labels)},
-                y: {json.dumps(item_type_sales)},
-                type: 'bar',
-                marker: {{ color: '#6366f1' }}
-            }}], {{...layout, title: 'アイテムタイプ別販売数'}});
-
-            Plotly.newPlot('brandCatPieChart', [{{
-                labels: {json.dumps(brand_cat_labels)},
-                values: {json.dumps(brand_cat_sales)},
-                type: 'pie',
-                hole: 0.4
-            }}], {{...layout, title: 'ブランドカテゴリ別'}});
-
-            Plotly.newPlot('brandBarChart', [{{
-                y: {json.dumps(top20_brand_labels)},
-                x: {json.dumps(top20_brand_sales)},
-                type: 'bar',
-                orientation: 'h',
-                marker: {{ color: '#8b5cf6' }}
-            }}], {{...layout, title: 'ブランド別販売数 Top20', margin: {{ l: 100 }}}});
-
-            Plotly.newPlot('brandPieChart', [{{
-                labels: {json.dumps(top20_brand_labels[:10])},
-                values: {json.dumps(top20_brand_sales[:10])},
-                type: 'pie',
-                hole: 0.4
-            }}], {{...layout, title: 'ブランド別シェア Top10'}});
-
-            Plotly.newPlot('priceDistChart', [{{
-                x: {json.dumps(price_dist_labels)},
-                y: {json.dumps(price_dist_values)},
-                type: 'bar',
-                marker: {{ color: '#10b981' }}
-            }}], {{...layout, title: '価格帯別販売数'}});
-
-            Plotly.newPlot('monthlyTrendChart', {json.dumps(monthly_traces)}, {{
-                ...layout,
-                title: '月別販売数推移',
-                showlegend: true
-            }});
-
-            const brandData = {json.dumps(brand_price_data)};
-            for (const [tabId, data] of Object.entries(brandData)) {{
-                const priceChartId = tabId + '_price_chart';
-                const itemChartId = tabId + '_item_chart';
-
-                if (document.getElementById(priceChartId)) {{
-                    Plotly.newPlot(priceChartId, [{{
-                        x: data.price_labels,
-                        y: data.price_values,
-                        type: 'bar',
-                        marker: {{ color: '#6366f1' }}
-                    }}], {{...layout, title: ''}});
-                }}
-
-                if (document.getElementById(itemChartId)) {{
-                    Plotly.newPlot(itemChartId, [{{
-                        labels: data.item_labels,
-                        values: data.item_values,
-                        type: 'pie',
-                        hole: 0.4
-                    }}], {{...layout, title: ''}});
-                }}
-            }}
+            loadTab('overview');
         }});
     </script>
 </body>
 </html>
-''')
+'''
 
-# HTMLファイル出力
-html_content = ''.join(html_parts)
-output_path = '/Users/naokijodan/Desktop/earring-market-analysis/index.html'
-with open(output_path, 'w', encoding='utf-8') as f:
-    f.write(html_content)
+# 分割版のタブデータを置くディレクトリ（出力HTMLからの相対パス）
+SHARD_DIR = 'tabs'
+
+def render_tab(writer):
+    """タブ1つ分の中身を (HTML断片, 仕入上限のドル価格) で返す"""
+    body = io.StringIO()
+    usd = []
+    writer(body, usd)
+    return body.getvalue(), usd
+
+def render_html(report, out, chart_backend='plotly'):
+    """全タブを埋め込んだ1ファイル版のHTMLを out（テキストストリーム）に書き出す
+
+    chart_backend はグラフの描き方（CHART_BACKENDS）。
+    """
+    tabs = report_tabs(report)
+    with stage('head'):
+        write_page_head(out, report, tabs, chart_backend=chart_backend)
+    tab_usd = {}
+    for i, (tab_id, _, writer) in enumerate(tabs):
+        if writer is None:
+            continue
+        with stage('tab:' + tab_id):
+            html, tab_usd[tab_id] = render_tab(writer)
+            out.write(TAB_OPEN.format(tab_id=tab_id, active=' active' if i == 0 else ''))
+            out.write(html)
+            out.write(TAB_CLOSE)
+    with stage('script'):
+        write_script_common(out, chart_backend)
+        charts = chart_payload(chart_specs(report), chart_backend)
+        out.write(SCRIPT_SINGLE.format(charts=payload_json(charts), usd=compact_json(tab_usd)))
+
+def render_shard(html, usd, charts):
+    """タブ1つ分のデータファイル（行頭のインデントを落としたHTML断片、グラフ定義、仕入上限のドル価格）"""
+    html = re.sub(r'\n[ \t]+', '\n', html)
+    return compact_json({'html': html, 'charts': charts, 'usd': usd})
+
+def render_shell(report, out, tabs, build_id, chart_backend='plotly'):
+    """分割版のシェル（ヘッダー・操作欄・タブバーと空のタブ）を out に書き出す"""
+    write_page_head(out, report, tabs, chart_backend=chart_backend)
+    for i, (tab_id, _, writer) in enumerate(tabs):
+        if writer is None:
+            continue
+        out.write(TAB_OPEN.format(tab_id=tab_id, active=' active' if i == 0 else ''))
+        out.write(TAB_CLOSE)
+    write_script_common(out, chart_backend)
+    out.write(SCRIPT_SPLIT.format(build_id=build_id, shard_dir=SHARD_DIR))
+
+def write_atomic(path, render, buffer_size=1 << 16):
+    """一時ファイルに書き出してから置き換える（途中で失敗しても前回のファイルが残る）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', buffering=buffer_size) as out:
+        render(out)
+        # 書き出しの大半は render 中にバッファ経由で進むので、ここで測るのは残りのバッファの書き出し
+        with stage('write'):
+            out.flush()
+    os.replace(tmp_path, path)
+
+def write_html(report, output_path, split=False, chart_backend='plotly'):
+    """レポートをHTMLとして書き出す
+
+    split=False は全タブを埋め込んだ1ファイル（オフラインでの共有向け）。split=True は軽いシェルと
+    タブごとのデータファイル（SHARD_DIR/<タブID>.json）に分け、タブを開いたときに fetch する。
+    分割版は fetch を使うので、ファイルを直接開くのではなく HTTP で配信して使う。
+    chart_backend はグラフの描き方（CHART_BACKENDS。'svg' なら外部のライブラリを読み込まない）。
+    """
+    if not split:
+        write_atomic(output_path, partial(render_html, report, chart_backend=chart_backend))
+        return
+
+    tabs = report_tabs(report)
+    with stage('charts'):
+        charts = chart_specs(report)
+    shard_dir = os.path.join(os.path.dirname(output_path), SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    shard_paths = set()
+    for tab_id, _, writer in tabs:
+        if writer is None:
+            continue
+        shard_path = os.path.join(shard_dir, tab_id + '.json')
+        with stage('tab:' + tab_id):
+            html, usd = render_tab(writer)
+            shard = render_shard(html, usd, chart_payload({tab_id: charts.get(tab_id, [])}, chart_backend))
+        write_atomic(shard_path, lambda out: out.write(shard))
+        shard_paths.add(shard_path)
+    build_id = datetime.now().strftime('%Y%m%d%H%M%S')
+    with stage('shell'):
+        write_atomic(output_path, lambda out: render_shell(report, out, tabs, build_id, chart_backend))
+    # 今回のレポートに無いタブ（Top20から外れたブランドなど）のデータファイルを削除
+    for old_path in glob.glob(os.path.join(glob.escape(shard_dir), '*.json')):
+        if old_path not in shard_paths:
+            os.remove(old_path)
+
+# ===== 出力のパッケージング =====
+
+# パッケージングの段階（表示順）。各段階のあとの合計バイト数を測る
+PACKAGE_STEPS = ['original', 'styles', 'css', 'js', 'html', 'gzip', 'brotli']
+
+def output_files(output_path, split=False):
+    """書き出した出力のファイル（分割版はシェルとタブのデータファイル）"""
+    if not split:
+        return [output_path]
+    shard_dir = os.path.join(os.path.dirname(output_path), SHARD_DIR)
+    return [output_path] + sorted(glob.glob(os.path.join(glob.escape(shard_dir), '*.json')))
+
+def clear_precompressed(output_path, split=False):
+    """前回の事前圧縮ファイルを削除する（古い内容の .gz / .br が配信されないように）"""
+    paths = [output_path]
+    shard_dir = os.path.join(os.path.dirname(output_path), SHARD_DIR)
+    if os.path.isdir(shard_dir):
+        paths += glob.glob(os.path.join(glob.escape(shard_dir), '*.json'))
+    for path in paths:
+        for suffix in PRECOMPRESSED.values():
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+def write_bytes_atomic(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def package_output(output_path, split=False):
+    """書き出した出力を縮小し、gzip・brotli の事前圧縮ファイルを隣に置く（html_pack）
+
+    繰り返しのインライン style のクラス化は、分割版ではシェルとタブのデータファイルの断片を
+    まとめて数え、クラスのルールはシェルの <style> に置く。段階 → 全ファイルの合計バイト数を返す
+    （brotli パッケージが無ければ 'brotli' は None）。
+    """
+    paths = output_files(output_path, split)
+    texts = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            texts[path] = f.read()
+    shards = {path: json.loads(text) for path, text in texts.items() if path != output_path}
+    sizes = {step: None for step in PACKAGE_STEPS}
+
+    def total():
+        return (len(texts[output_path].encode('utf-8'))
+                + sum(len(compact_json(shard).encode('utf-8')) for shard in shards.values()))
+
+    sizes['original'] = sum(len(text.encode('utf-8')) for text in texts.values())
+    with stage('styles'):
+        classes = style_classes([texts[output_path]] + [shard['html'] for shard in shards.values()])
+        texts[output_path] = add_style_rules(apply_style_classes(texts[output_path], classes), classes)
+        for shard in shards.values():
+            shard['html'] = apply_style_classes(shard['html'], classes)
+    sizes['styles'] = total()
+    with stage('minify'):
+        texts[output_path] = minify_styles(texts[output_path])
+        sizes['css'] = total()
+        texts[output_path] = minify_scripts(texts[output_path])
+        sizes['js'] = total()
+        texts[output_path] = minify_html(texts[output_path])
+        for shard in shards.values():
+            shard['html'] = minify_html(shard['html'])
+        sizes['html'] = total()
+
+    with stage('compress'):
+        for path in paths:
+            data = (texts[path] if path == output_path else compact_json(shards[path])).encode('utf-8')
+            write_bytes_atomic(path, data)
+            for name, variant in precompress(data).items():
+                write_bytes_atomic(path + PRECOMPRESSED[name], variant)
+                sizes[name] = (sizes[name] or 0) + len(variant)
+    return sizes
+
+# ===== ブランド別ページ =====
+# 全ブランドの詳細ページを出力HTMLの隣の BRAND_PAGE_DIR/ に書き出す（index.html は一覧ページ）。
+# ページの中身は集計結果（レポート）だけから作るので、memory / stream / incremental のどのモードでも出せる。
+
+BRAND_PAGE_DIR = 'brands'
+BRAND_PAGE_MANIFEST = '.hashes.json'  # ページ名 → 前回書き出した内容のハッシュ
+BRAND_PAGE_BACK = '        <p><a href="index.html">← ブランド一覧</a> / <a href="../{main_page}">全体分析</a></p>\n'
+# 内容のハッシュは生成日時を除いて取り、書き出すときに日時を入れる（中身が同じなら日時だけで書き換えない）
+GENERATED_MARK = '\x00generated\x00'
+
+def brand_page_names(brands):
+    """ブランドごとのページのファイル名（英数字以外は _ に置き換え、大文字小文字だけの違いも別名にする）"""
+    names, used = [], set()
+    for brand in brands:
+        base = re.sub(r'[^0-9A-Za-z_-]+', '_', brand).strip('_') or 'brand'
+        name, n = base, 1
+        while name.lower() in used:
+            n += 1
+            name = f'{base}_{n}'
+        used.add(name.lower())
+        names.append(name + '.html')
+    return names
+
+def brand_page_tabs(report):
+    """brand_stats_list の全ブランドについて、ブランドタブ（report['brand_tabs']）と同じ形の dict を作る
+
+    表記ゆれはまとめず、ブランド名ごとに1ページ。値はすべてレポートの全ブランド分の集計
+    （タイプ×ブランドの統計・プレミアム・価格帯の件数行列・上位の出品・売上キューブ）から引く。
+    """
+    brands = [stats['brand'] for stats in report['brand_stats_list']]
+    item_stats = defaultdict(list)
+    for item_type, stats_list in report['type_brand_stats'].items():
+        for stats in stats_list:
+            item_stats[stats['brand']].append(dict(stats, type=item_type))
+    novelty_counts = {stats['brand']: stats['count'] for stats in report['novelty_brand_stats']}
+    bulk_counts = {stats['brand']: stats['count'] for stats in report['bundle_brand_stats']}
+    pairs = pd.DataFrame({'ブランド': brands, '_tab': range(len(brands))})
+    item_dist, monthly = brand_tab_cube_views(report['sales_cube'], pairs)
+    # 表はまとめて dict にしておき、ブランドごとの .loc や to_dict を避ける
+    top = defaultdict(list)
+    for row in report['top_listings']['brand']['sales'].to_dict('records'):
+        top[row['ブランド']].append(row)
+    hist = report['price_hist']['brand'].to_dict('index')
+    premiums = report['brand_premiums'].to_dict('index')
+
+    tabs = []
+    for page_no, (stats, name) in enumerate(zip(report['brand_stats_list'], brand_page_names(brands))):
+        brand = stats['brand']
+        tabs.append({
+            'brand': brand,
+            'tab_id': 'brand_' + name[:-len('.html')],
+            'page': name,
+            'stats': stats,
+            **premium_fields(premiums, brand),
+            'novelty_count': novelty_counts.get(brand, 0),
+            'bulk_count': bulk_counts.get(brand, 0),
+            'item_stats': sorted(item_stats[brand], key=lambda x: x['sales'], reverse=True),
+            'top_items': top[brand],
+            'price_dist': distribution(hist, brand),
+            'item_dist': item_dist.get(page_no, {}),
+            'monthly_sales': monthly.get(page_no, {}),
+        })
+    return tabs
+
+def write_page_script(out, tab_id, charts, usd, chart_backend='plotly'):
+    """タブが1つだけのページのスクリプト（1ファイル版と同じ。最初に表示するタブを tab_id にする）"""
+    write_script_common(out, chart_backend, active_tab=tab_id)
+    out.write(SCRIPT_SINGLE.format(charts=payload_json(chart_payload(charts, chart_backend)),
+                                   usd=compact_json({tab_id: usd})))
+
+def render_brand_page(report, tab, monthly_labels, main_page, out, chart_backend='plotly'):
+    """ブランド1つ分の詳細ページ（生成日時は GENERATED_MARK のまま）"""
+    tab_id = tab['tab_id']
+    write_page_head(out, report, [(tab_id, tab['brand'][:20], None)], generated=GENERATED_MARK,
+                    chart_backend=chart_backend)
+    out.write(TAB_OPEN.format(tab_id=tab_id, active=' active'))
+    out.write(BRAND_PAGE_BACK.format(main_page=main_page))
+    usd = []
+    write_brand_tab(out, usd, tab)
+    out.write(TAB_CLOSE)
+    write_page_script(out, tab_id, {tab_id: brand_tab_charts(tab, monthly_labels)}, usd, chart_backend)
+
+def render_brand_index(report, tabs, main_page, out, chart_backend='plotly'):
+    """ブランド別ページの一覧（販売数順）"""
+    write_page_head(out, report, [('brand_index', '🏷️ ブランド別ページ', None)], generated=GENERATED_MARK,
+                    chart_backend=chart_backend)
+    out.write(TAB_OPEN.format(tab_id='brand_index', active=' active'))
+    out.write(f'        <p><a href="../{main_page}">← 全体分析</a></p>\n')
+    out.write(f'        <h2 class="section-title">🏷️ ブランド別ページ（{len(tabs)}ブランド）</h2>\n')
+    write_data_table(out, [('順位', 'cell'), ('ブランド', 'page'), ('カテゴリ', 'cell'), ('販売数', 'cell'),
+                           ('売上', 'cell'), ('中央値', 'price'), ('仕入上限', 'limit'), ('CV', 'cell')], [
+        [str(rank), [tab['page'], tab['brand']], str(tab['stats']['category']), f"{tab['stats']['sales']:,}",
+         f"${tab['stats']['revenue']:,.0f}", PRICE_TEXT(tab['stats']['median_price']),
+         float(tab['stats']['median_price']), f"{tab['stats']['cv']:.2f}"]
+        for rank, tab in enumerate(tabs, 1)
+    ])
+    out.write(TAB_CLOSE)
+    write_page_script(out, 'brand_index', {}, [], chart_backend)
+
+def write_page_if_changed(path, text, old_hash, generated):
+    """内容（生成日時を除く）のハッシュが前回と違うときだけ書き出し、(ハッシュ, 書き出したか) を返す"""
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    if digest == old_hash and os.path.exists(path):
+        return digest, False
+    final = text.replace(GENERATED_MARK, generated)
+    write_atomic(path, lambda out: out.write(final))
+    return digest, True
+
+# ワーカーに渡す共有データ（fork ならコピーせずに引き継ぐ）
+_page_job = None
+
+def init_page_worker(job):
+    global _page_job
+    _page_job = job
+
+def write_brand_pages_range(start, stop):
+    """_page_job の tabs[start:stop] のページを書き出し、[(ページ名, ハッシュ, 書き出したか)] を返す"""
+    job = _page_job
+    results = []
+    for tab in job['tabs'][start:stop]:
+        out = io.StringIO()
+        render_brand_page(job['report'], tab, job['monthly_labels'], job['main_page'], out, job['chart_backend'])
+        digest, written = write_page_if_changed(os.path.join(job['page_dir'], tab['page']), out.getvalue(),
+                                                job['hashes'].get(tab['page']), job['generated'])
+        results.append((tab['page'], digest, written))
+    return results
+
+BRAND_PAGE_CHUNK = 50  # ワーカーに1回で渡すページ数
+
+def write_brand_pages(report, output_path, jobs=None, chart_backend='plotly'):
+    """全ブランドの詳細ページと一覧ページを書き出し、{'pages', 'written', 'removed'} を返す
+
+    ページは jobs 個のワーカープロセスで並列に作る（1ならこのプロセスで順に作る）。前回の内容の
+    ハッシュ（BRAND_PAGE_MANIFEST）と同じページは書き換えない。今回のレポートに無いブランドの
+    ページは削除する。
+    """
+    page_dir = os.path.join(os.path.dirname(output_path), BRAND_PAGE_DIR)
+    os.makedirs(page_dir, exist_ok=True)
+    manifest_path = os.path.join(page_dir, BRAND_PAGE_MANIFEST)
+    hashes = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            hashes = json.load(f)
+
+    with stage('brand_page_data'):
+        tabs = brand_page_tabs(report)
+    job = {
+        'report': {key: report[key] for key in ('period_start', 'period_end', 'row_count')},
+        'tabs': tabs,
+        'monthly_labels': chart_months(report['monthly_sales']),
+        'main_page': os.path.basename(output_path),
+        'chart_backend': chart_backend,
+        'page_dir': page_dir,
+        'hashes': hashes,
+        'generated': datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+    ranges = [(start, min(start + BRAND_PAGE_CHUNK, len(tabs))) for start in range(0, len(tabs), BRAND_PAGE_CHUNK)]
+    jobs = min(jobs or os.cpu_count() or 1, len(ranges)) or 1
+    results = []
+    with stage('brand_pages'):
+        if jobs == 1:
+            init_page_worker(job)
+            for start, stop in ranges:
+                results += write_brand_pages_range(start, stop)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=pool_context(),
+                                     initializer=init_page_worker, initargs=(job,)) as pool:
+                for chunk in pool.map(write_brand_pages_range, *zip(*ranges)):
+                    results += chunk
+
+    with stage('brand_index'):
+        out = io.StringIO()
+        render_brand_index(job['report'], tabs, job['main_page'], out, chart_backend)
+        index_hash, index_written = write_page_if_changed(
+            os.path.join(page_dir, 'index.html'), out.getvalue(), hashes.get('index.html'), job['generated'])
+
+    new_hashes = {page: digest for page, digest, _ in results}
+    new_hashes['index.html'] = index_hash
+    removed = 0
+    for old_path in glob.glob(os.path.join(glob.escape(page_dir), '*.html')):
+        if os.path.basename(old_path) not in new_hashes:
+            os.remove(old_path)
+            removed += 1
+    write_atomic(manifest_path, lambda out: json.dump(new_hashes, out, ensure_ascii=False, indent=0))
+    return {'pages': len(tabs), 'written': sum(written for _, _, written in results) + index_written,
+            'removed': removed}
+
+# ===== ビルドAPI =====
+
+# build() の設定の既定値
+BUILD_DEFAULTS = {
+    'mode': 'memory',                # 'memory'（全件読み込み）/ 'stream'（チャンク読み込み）/ 'incremental'（差分取り込み）
+    'chunk_rows': STREAM_CHUNK_ROWS,  # stream で1回に読み込む行数
+    'split': False,                  # シェルHTMLとタブごとのデータファイルに分けて出力する
+    'charts': 'plotly',              # グラフの描き方（CHART_BACKENDS。'svg' は Plotly を読み込まない静的な SVG）
+    'brand_pages': False,            # 全ブランドの詳細ページを BRAND_PAGE_DIR/ に書き出す
+    'page_jobs': None,               # ブランド別ページを作るワーカー数（None なら CPU数）
+    'package': False,                # 出力を縮小し、gzip・brotli の事前圧縮ファイルも書き出す
+    'cache_dir': None,               # 分類済みキャッシュ・差分状態の置き場所（None なら出力先の隣の .cache。
+                                     # 出力先を渡さない load() では CSV の隣の .cache）
+    'verbose': False,                # 読み込み結果を表示する
+}
 
-print(f"\n✅ HTML生成完了: {output_path}")
-print(f"   - 総件数: {len(df)}")
-print(f"   - 総販売数: {total_sales:,}")
-print(f"   - ブランドタブ: {len(top20_brand_tabs)}個")
+def build_config(config=None, out_path=OUTPUT_PATH):
+    """BUILD_DEFAULTS に config を重ねた設定を返す（未知のキーやモードは ValueError）"""
+    config = dict(BUILD_DEFAULTS, **(config or {}))
+    unknown = set(config) - set(BUILD_DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知の設定: {', '.join(sorted(unknown))}")
+    if config['mode'] not in ('memory', 'stream', 'incremental'):
+        raise ValueError(f"未知のモード: {config['mode']}")
+    if config['charts'] not in CHART_BACKENDS:
+        raise ValueError(f"未知のグラフの描き方: {config['charts']}")
+    if config['cache_dir'] is None:
+        config['cache_dir'] = os.path.join(os.path.dirname(os.path.abspath(out_path)), '.cache')
+    return config
+
+def load(csv_path, config=None, out_path=None):
+    """CSVを読み込んで分類する
+
+    memory モードは分類済みの DataFrame、stream / incremental モードは集計状態を返す。
+    cache_dir を指定しなければ、out_path を渡せばその隣、渡さなければ csv_path の隣の .cache を使う。
+    """
+    return load_input(csv_path, build_config(config, out_path or csv_path))
+
+def load_input(csv_path, config):
+    """load() の本体（config は build_config で解決済みの設定）"""
+    if config['mode'] == 'incremental':
+        with stage('incremental'):
+            state, new_rows = update_incremental_state(csv_path, config['cache_dir'])
+        if config['verbose']:
+            print(f"=== 差分取り込み完了 ===")
+            print(f"新規行: {new_rows}件 / 累計: {state['rows']}件")
+        return state
+    if config['mode'] == 'stream':
+        with stage('stream'):
+            state = stream_state(csv_path, config['chunk_rows'])
+        if config['verbose']:
+            print(f"=== ストリーミング読み込み完了 ===")
+            print(f"総件数: {state['rows']}（中央値は相対誤差{STREAM_PRICE_ALPHA:.1%}以内の近似値）")
+        return state
+
+    # 分類済みキャッシュがあれば再利用
+    df, cache_hit = load_enriched(csv_path, config['cache_dir'])
+    if config['verbose']:
+        print(f"=== データ読み込み完了 ===")
+        print(f"総件数: {len(df)}" + ("（キャッシュ使用）" if cache_hit else ""))
+    return df
+
+def aggregate(data):
+    """load() の結果（分類済みの DataFrame か集計状態）からレポートを作る"""
+    if isinstance(data, pd.DataFrame):
+        return analyze(data.assign(仕入れ上限=purchase_limit(data['価格'])))
+    return report_from_state(data)
+
+def render(report, out_path, config=None):
+    config = build_config(config, out_path)
+    write_html(report, out_path, split=config['split'], chart_backend=config['charts'])
+    clear_precompressed(out_path, config['split'])
+    if config['package']:
+        with stage('package'):
+            report['package'] = package_output(out_path, config['split'])
+    if config['brand_pages']:
+        with stage('brand_pages'):
+            report['brand_pages'] = write_brand_pages(report, out_path, config['page_jobs'], config['charts'])
+
+def build(csv_path, out_path, config=None):
+    """CSVから分析HTMLを生成してレポートを返す（読み込み・分類 → 集計 → HTML出力）"""
+    config = build_config(config, out_path)
+    data = load_input(csv_path, config)
+    with stage('aggregate'):
+        report = aggregate(data)
+    with stage('render'):
+        render(report, out_path, config)
+    return report
+
+# ===== 常駐モード =====
+
+WATCH_INTERVAL = 0.2  # 入力ディレクトリを確認する間隔（秒）
+
+def enrich_reusing(raw, warm):
+    """warm（前回の分類済み DataFrame とその行のフィンガープリント）にある行は分類し直さずに流用する
+
+    分類は行ごとに独立しているので、前回と同じ内容の行は前回の結果をそのまま使い、新しい行だけを
+    enrich する。warm は今回の結果で置き換える。
+    """
+    fingerprints = row_fingerprints(raw)
+    hit = np.zeros(len(raw), dtype=bool)
+    parts = []
+    if warm:
+        pos = pd.Index(warm['fingerprints']).get_indexer(fingerprints)
+        hit = pos >= 0
+        if hit.any():
+            parts.append(warm['frame'].iloc[pos[hit]].set_axis(np.flatnonzero(hit)))
+    if not hit.all():
+        with stage('enrich'):
+            parts.append(enrich(raw[~hit]))
+    df = pd.concat(parts).sort_index().reset_index(drop=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+    df = compact_frame(df)
+    warm.update(frame=df, fingerprints=fingerprints)
+    return df, int((~hit).sum())
+
+def csv_signatures(input_dir):
+    """ディレクトリ内のCSVごとの (更新時刻, サイズ)"""
+    signatures = {}
+    for path in glob.glob(os.path.join(glob.escape(input_dir), '*.csv')):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signatures[path] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+def watch(input_dir, out_path, config=None, interval=WATCH_INTERVAL):
+    """input_dir にCSVが置かれる（更新される）たびに、そのCSVから out_path を作り直す
+
+    分類済みの DataFrame をメモリに持ち続け、前回と同じ行は分類をやり直さない（enrich_reusing）。
+    分類ルールやブランド索引はモジュールの読み込み時に一度だけ作られる。書き込み途中のファイルを
+    読まないよう、サイズと更新時刻が1回の確認の間変わらなかったものだけを対象にする。
+    Ctrl+C で終了する。
+    """
+    config = build_config(config, out_path)
+    if config['mode'] != 'memory':
+        raise ValueError('常駐モードは memory モードのみ対応しています')
+    warm = {}
+    built = {}     # 生成に使ったCSV → そのときの (更新時刻, サイズ)
+    pending = {}   # 前回の確認で見つけた変更
+    signatures = csv_signatures(input_dir)
+    if signatures:
+        # 起動時は最新のCSVから生成し、それ以前のCSVは処理済みとみなす
+        built = dict(signatures)
+        pending = {max(signatures, key=lambda path: signatures[path]): None}
+    print(f"👀 {input_dir} を監視中（Ctrl+C で終了）")
+    try:
+        while True:
+            ready = [path for path, sig in signatures.items() if path in pending and pending[path] in (None, sig)]
+            pending = {path: sig for path, sig in signatures.items() if built.get(path) != sig}
+            if ready:
+                csv_path = max(ready, key=lambda path: signatures[path])
+                for path in ready:
+                    built[path] = signatures[path]
+                    pending.pop(path, None)
+                start = time.perf_counter()
+                try:
+                    df, new_rows = enrich_reusing(pd.read_csv(csv_path, dtype=csv_dtypes()), warm)
+                    report = aggregate(df)
+                    render(report, out_path, config)
+                except Exception as e:  # 1ファイルの失敗で常駐を止めない
+                    print(f"⚠️ {os.path.basename(csv_path)} から生成できませんでした: {e}")
+                else:
+                    print(f"✅ {os.path.basename(csv_path)} → {out_path}"
+                          f"（{report['row_count']}件・新規分類 {new_rows}件・{time.perf_counter() - start:.2f}秒）")
+            time.sleep(interval)
+            signatures = csv_signatures(input_dir)
+    except KeyboardInterrupt:
+        print("監視を終了しました")
+
+# ===== 一括生成 =====
+
+def build_one(csv_path, out_path, config):
+    """1つのCSVから生成して、所要時間などをまとめた dict を返す（一括生成のワーカーで実行する）"""
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    result = {'csv': csv_path, 'output': out_path, 'pid': os.getpid()}
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        report = build(csv_path, out_path, config)
+        result['rows'] = report['row_count']
+    except Exception as e:  # 1ファイルの失敗で一括生成全体を止めない
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['wall'] = time.perf_counter() - start_wall
+    result['cpu'] = time.process_time() - start_cpu
+    return result
+
+def batch_output_path(csv_path, out_dir):
+    """一括生成の出力先（CSVごとに <out_dir>/<CSV名>/index.html。分割版のデータファイルも衝突しない）"""
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(csv_path))[0], 'index.html')
+
+def pool_context():
+    """ワーカーの起動方法。fork が使える環境では、読み込み済みの pandas と分類ルール・ブランド索引を
+    コピーオンライトでそのまま共有する。macOS などでは既定の spawn になり、ワーカーごとに1回だけ作る。"""
+    if sys.platform != 'darwin' and 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+def build_batch(csv_paths, out_dir, config=None, jobs=None):
+    """複数のCSVのレポートをプロセスプールで並列に生成し、CSVごとの結果（build_one）を返す
+
+    ワーカーは生成ごとに作り直さず使い回す。大きいファイルから順に投入して、最後に大きな
+    ファイルが1つだけ残って待たされるのを避ける。差分取り込みは同じシートの状態ファイルを
+    共有するので並列にはできない。
+    """
+    # ワーカーの中でさらにプロセスを起動しないよう、ブランド別ページは各ワーカーで順に作る
+    config = dict(config or {}, verbose=False, page_jobs=1)
+    if config.get('mode') == 'incremental':
+        raise ValueError('一括生成は incremental モードに対応していません')
+    csv_paths = sorted(dict.fromkeys(csv_paths), key=os.path.getsize, reverse=True)
+    jobs = min(jobs or os.cpu_count() or 1, len(csv_paths)) or 1
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=pool_context()) as pool:
+        futures = [pool.submit(build_one, csv_path, batch_output_path(csv_path, out_dir), config)
+                   for csv_path in csv_paths]
+        for future in as_completed(futures):
+            result = future.result()
+            print(("⚠️ " if 'error' in result else "✅ ") + os.path.basename(result['csv'])
+                  + (f": {result['error']}" if 'error' in result else f"（{result['wall']:.2f}秒）"), flush=True)
+            results.append(result)
+    results.sort(key=lambda r: csv_paths.index(r['csv']))
+    return results
+
+def print_batch_summary(results, wall):
+    print(f"\n=== 一括生成 {len(results)}件 ===")
+    print(f"  {'CSV':<48} {'件数':>9} {'時間(s)':>8} {'CPU(s)':>8}")
+    for r in results:
+        rows = f"{r['rows']:,}" if 'rows' in r else '失敗'
+        print(f"  {os.path.basename(r['csv']):<48} {rows:>9} {r['wall']:>8.2f} {r['cpu']:>8.2f}")
+    # 各生成の時間の合計はコアを取り合うと膨らむので、並列度は CPU 時間の合計から見る
+    cpu = sum(r['cpu'] for r in results)
+    workers = len({r['pid'] for r in results})
+    print(f"  経過 {wall:.2f}秒 / CPU時間の合計 {cpu:.2f}秒（ワーカー{workers}個、実効並列度 {cpu / wall if wall else 0:.1f}）")
+
+def main():
+    parser = argparse.ArgumentParser(description='イヤリング市場分析HTMLを生成する')
+    parser.add_argument('--input', default=INPUT_CSV, help='入力CSV（既定: INPUT_CSV）')
+    parser.add_argument('--output', default=OUTPUT_PATH, help='出力HTML（既定: OUTPUT_PATH）')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='常駐してDIRを監視し、CSVが置かれるたびに --output を作り直す（--input は使わない）')
+    parser.add_argument('--batch', metavar='CSV', nargs='+',
+                        help='複数のCSVのレポートを並列に生成する（出力は --out-dir/<CSV名>/index.html）')
+    parser.add_argument('--out-dir', default=os.path.dirname(OUTPUT_PATH),
+                        help='--batch の出力先ディレクトリ（既定: OUTPUT_PATH のディレクトリ）')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='--batch・--brand-pages の並列数（既定: CPU数）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='前回までの集計状態に新しい行だけを足し込んで生成する')
+    parser.add_argument('--stream', action='store_true',
+                        help='CSVをチャンクごとに読み込んで集計する（大きなエクスポート向け。中央値は近似値）')
+    parser.add_argument('--chunk-rows', type=int, default=STREAM_CHUNK_ROWS,
+                        help=f'--stream で1回に読み込む行数（既定: {STREAM_CHUNK_ROWS}）')
+    parser.add_argument('--split', action='store_true',
+                        help=f'軽いシェルHTMLとタブごとのデータファイル（{SHARD_DIR}/）に分けて出力する（HTTP配信用）')
+    parser.add_argument('--charts', choices=CHART_BACKENDS, default='plotly',
+                        help='グラフの描き方（plotly: CDN の Plotly で描く / svg: 生成時に静的な SVG にする。外部の読み込みが無くオフラインでも表示できる）')
+    parser.add_argument('--brand-pages', action='store_true',
+                        help=f'全ブランドの詳細ページと一覧を出力の隣の {BRAND_PAGE_DIR}/ に書き出す（内容が同じページは書き換えない）')
+    parser.add_argument('--package', action='store_true',
+                        help='出力を縮小し、静的サーバーがそのまま配信できる .gz / .br（brotli があれば）を隣に書き出す')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='段階ごとのメモリのピークも計測する（tracemalloc を使うので数倍遅くなる）')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='いちばん時間のかかった段階の cProfile を pstats 形式で出力の隣に保存する')
+    args = parser.parse_args()
+    if args.incremental and args.stream:
+        parser.error('--incremental と --stream は同時に指定できません')
+    if args.watch and (args.incremental or args.stream):
+        parser.error('--watch は --incremental / --stream と同時に指定できません')
+    if args.batch and (args.watch or args.incremental):
+        parser.error('--batch は --watch / --incremental と同時に指定できません')
+    missing = [path for path in args.batch or [] if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"CSVが見つかりません: {', '.join(missing)}")
+
+    config = {
+        'mode': 'incremental' if args.incremental else 'stream' if args.stream else 'memory',
+        'chunk_rows': args.chunk_rows,
+        'split': args.split,
+        'charts': args.charts,
+        'brand_pages': args.brand_pages,
+        'page_jobs': args.jobs,
+        'package': args.package,
+        'verbose': True,
+    }
+    if args.watch:
+        watch(args.watch, args.output, config)
+        return
+    if args.batch:
+        start = time.perf_counter()
+        results = build_batch(args.batch, args.out_dir, config, args.jobs)
+        print_batch_summary(results, time.perf_counter() - start)
+        return
+
+    # 段階ごとの時間（とメモリのピーク）を計測し、出力の隣に JSON で保存する
+    profile = start_profile(trace_memory=args.trace_memory, cprofile=args.cprofile)
+    report = build(args.input, args.output, config)
+    stop_profile()
+
+    print(f"\n=== トップ20ブランド ===")
+    for i, b in enumerate(report['brand_stats_list'][:20], 1):
+        print(f"  {i}. {b['brand']} ({b['sales']}件)")
+
+    profile_base = os.path.splitext(args.output)[0]
+    profile.write(profile_base + '.profile.json')
+    slowest = profile.dump_cprofile(profile_base + '.profile.pstats') if args.cprofile else None
+
+    print(f"\n✅ HTML生成完了: {args.output}")
+    print(f"   - 総件数: {report['row_count']}")
+    print(f"   - 総販売数: {report['total_sales']:,}")
+    print(f"   - ブランドタブ: {len(report['top20_brand_tabs'])}個")
+    if 'brand_pages' in report:
+        pages = report['brand_pages']
+        print(f"   - ブランド別ページ: {pages['pages']}件（書き換え {pages['written']}件・削除 {pages['removed']}件）"
+              f" → {os.path.join(os.path.dirname(args.output), BRAND_PAGE_DIR)}/")
+    if 'package' in report:
+        sizes = report['package']
+        print(f"   - パッケージング（全ファイルの合計バイト数）:")
+        for step in PACKAGE_STEPS:
+            if sizes[step] is None:
+                print(f"       {step}: （brotli パッケージが無いため作成せず）")
+            else:
+                print(f"       {step}: {sizes[step]:,}（元の {sizes[step] / sizes['original']:.1%}）")
+    print(f"   - 処理時間（{profile_base}.profile.json）:")
+    for record in profile.report()['stages']:
+        if record['depth'] == 0:
+            peak = f"（メモリピーク {record['peak_mb']:.1f}MB）" if 'peak_mb' in record else ''
+            print(f"       {record['name']}: {record['wall']:.2f}秒 / CPU {record['cpu']:.2f}秒{peak}")
+    if slowest:
+        print(f"   - cProfile（{slowest}）: {profile_base}.profile.pstats")
+
+if __name__ == '__main__':
+    main()
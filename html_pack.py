@@ -0,0 +1,136 @@
+"""出力HTMLのパッケージング: 繰り返しのインライン style のクラス化・CSS/JS/HTMLの縮小・事前圧縮
+
+どれも見た目や動作を変えない範囲の書き換えに限る。
+  styles: 2回以上出てくる style="..." を生成したクラス（STYLE_CLASS_PREFIX + 番号）に置き換え、
+          ルールを <style> の末尾に足す。インラインの style は他のルールより優先されるので、
+          生成したルールの宣言には !important を付けて優先順位を保つ
+  css:    コメントと余分な空白を落とす
+  js:     行頭・行末の空白、空行、行全体のコメントを落とす（改行は残すので自動セミコロン挿入は変わらない）
+  html:   <script>・<style>・<pre>・<textarea> の外で、行頭のインデントと空行・コメントを落とす
+          （改行は残すので、インライン要素の間の空白の扱いは変わらない）
+事前圧縮は gzip（標準ライブラリ）と brotli（brotli パッケージがある場合だけ）。
+"""
+
+import gzip
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli が無い環境では .br を作らない
+    brotli = None
+
+STYLE_CLASS_PREFIX = 'st'
+STYLE_MIN_REPEATS = 2  # これ以上出てくる style をクラスにする
+PRECOMPRESSED = {'gzip': '.gz', 'brotli': '.br'}  # 形式 → 元のファイル名に付ける拡張子
+
+# 中身を書き換えてはいけない要素（HTMLの縮小・style の置き換えの対象外）
+RAW_BLOCK = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>.*?</\2>)', re.S | re.I)
+STYLE_BLOCK = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.S | re.I)
+SCRIPT_BLOCK = re.compile(r'(<script\b[^>]*>)(.*?)(</script>)', re.S | re.I)
+TAG = re.compile(r'<[a-zA-Z][\w-]*\s[^<>]*>')
+STYLE_ATTR = re.compile(r'\sstyle="([^"]*)"')
+CLASS_ATTR = re.compile(r'(\sclass=")([^"]*)(")')
+
+
+def split_raw(html):
+    """html を [(書き換えてよい部分か, 文字列)] に分ける"""
+    parts = RAW_BLOCK.split(html)
+    # split はグループも返すので、[外, ブロック全体, 要素名, 外, ...] の並びになる
+    result = []
+    for i in range(0, len(parts), 3):
+        result.append((True, parts[i]))
+        if i + 1 < len(parts):
+            result.append((False, parts[i + 1]))
+    return result
+
+
+def normalize_style(style):
+    """宣言の空白と末尾のセミコロンをそろえる（'height: 280px;' と 'height:280px' を同じにする）"""
+    declarations = []
+    for declaration in style.split(';'):
+        name, sep, value = declaration.partition(':')
+        if sep and name.strip():
+            declarations.append(f"{name.strip()}:{' '.join(value.split())}")
+    return ';'.join(declarations)
+
+
+def style_classes(htmls, min_repeats=STYLE_MIN_REPEATS):
+    """htmls 全体で min_repeats 回以上出てくる style → クラス名（多い順に番号を振る）"""
+    counts = {}
+    for html in htmls:
+        for editable, text in split_raw(html):
+            if editable:
+                for style in STYLE_ATTR.findall(text):
+                    style = normalize_style(style)
+                    if style:
+                        counts[style] = counts.get(style, 0) + 1
+    repeated = sorted((style for style, n in counts.items() if n >= min_repeats), key=lambda s: -counts[s])
+    return {style: f'{STYLE_CLASS_PREFIX}{i}' for i, style in enumerate(repeated)}
+
+
+def style_rules(classes):
+    """style_classes のクラスのCSSルール（インラインの style と同じ優先順位にするため !important 付き）"""
+    return ''.join('.{}{{{}}}'.format(name, ';'.join(d + '!important' for d in style.split(';')))
+                   for style, name in classes.items())
+
+
+def apply_style_classes(html, classes):
+    """classes にある style 属性をクラスに置き換える（既に class 属性があればそこに足す）"""
+    def replace_tag(match):
+        tag = match.group(0)
+        style = STYLE_ATTR.search(tag)
+        name = classes.get(normalize_style(style.group(1))) if style else None
+        if name is None:
+            return tag
+        tag = tag[:style.start()] + tag[style.end():]
+        if CLASS_ATTR.search(tag):
+            return CLASS_ATTR.sub(lambda m: f'{m.group(1)}{m.group(2)} {name}{m.group(3)}', tag, count=1)
+        return tag[:-1] + f' class="{name}">'
+    return ''.join(TAG.sub(replace_tag, text) if editable else text for editable, text in split_raw(html))
+
+
+def add_style_rules(html, classes):
+    """最初の <style> の末尾に classes のルールを足す"""
+    rules = style_rules(classes)
+    if not rules:
+        return html
+    return STYLE_BLOCK.sub(lambda m: m.group(0)[:-len('</style>')] + rules + '</style>', html, count=1)
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = ' '.join(css.split())
+    # セレクタの「a :hover」と「a:hover」は意味が違うので、: の前の空白は残す
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}')
+
+
+def minify_js(js):
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify_html(html):
+    def minify_text(text):
+        text = re.sub(r'<!--(?!\[if).*?-->', '', text, flags=re.S)
+        return re.sub(r'\n\s+', '\n', text)
+    return ''.join(minify_text(text) if editable else text for editable, text in split_raw(html))
+
+
+def minify_styles(html):
+    """<style> の中身を minify_css で縮める"""
+    return STYLE_BLOCK.sub(lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), html)
+
+
+def minify_scripts(html):
+    """<script> の中身を minify_js で縮める"""
+    return SCRIPT_BLOCK.sub(lambda m: m.group(1) + minify_js(m.group(2)) + m.group(3), html)
+
+
+def precompress(data):
+    """形式 → 圧縮したバイト列（brotli が無ければ gzip だけ）。gzip は再現性のため更新時刻を0にする"""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['brotli'] = brotli.compress(data, quality=11)
+    return variants
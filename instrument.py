@@ -0,0 +1,112 @@
+"""処理段階ごとの計測（壁時計時間・CPU時間・tracemalloc のピーク）
+
+計測したい区間を with stage('名前'): で囲んでおき、start_profile() から stop_profile() までの間だけ記録する。
+計測していないときの stage() は何もしない。段階は入れ子にでき、記録名は 'enrich/classify_titles' のように
+親の名前とつなげる。同じ名前の段階が何度も実行された場合（チャンクごとの処理など）は合計する。
+
+tracemalloc は割り当ての多い処理を数倍遅くするので、メモリのピークは trace_memory=True のときだけ測る。
+cprofile=True なら最上位の段階ごとに cProfile を取り、いちばん時間のかかった段階の分だけを残す。
+"""
+
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_active = None
+
+
+class Profile:
+    def __init__(self, trace_memory=False, cprofile=False):
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.records = {}
+        self.stack = []
+        self.slowest = None  # (壁時計時間, 段階名, cProfile.Profile)
+        self.started = time.perf_counter()
+
+    def enter(self, name):
+        full_name = f"{self.stack[-1]['name']}/{name}" if self.stack else name
+        frame = {'name': full_name, 'peak': 0, 'profiler': None}
+        if self.trace_memory:
+            # 親の段階のここまでのピークを退避してから、この段階用にピークを測り直す
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        if self.cprofile and not self.stack:
+            frame['profiler'] = cProfile.Profile()
+            frame['profiler'].enable()
+        frame['wall'] = time.perf_counter()
+        frame['cpu'] = time.process_time()
+        self.stack.append(frame)
+
+    def exit(self):
+        frame = self.stack.pop()
+        wall = time.perf_counter() - frame['wall']
+        cpu = time.process_time() - frame['cpu']
+        if frame['profiler'] is not None:
+            frame['profiler'].disable()
+            if self.slowest is None or wall > self.slowest[0]:
+                self.slowest = (wall, frame['name'], frame['profiler'])
+
+        record = self.records.setdefault(frame['name'], {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'depth': len(self.stack)})
+        record['wall'] += wall
+        record['cpu'] += cpu
+        record['calls'] += 1
+        if self.trace_memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = max(record.get('peak_mb', 0.0), peak / 1024 / 1024)
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+
+    def report(self):
+        """記録を JSON にできる dict で返す（stages は最初に実行された順）"""
+        top_level = {name: r for name, r in self.records.items() if r['depth'] == 0}
+        return {
+            'total_wall': time.perf_counter() - self.started,
+            'trace_memory': self.trace_memory,
+            'slowest_stage': max(top_level, key=lambda name: top_level[name]['wall']) if top_level else None,
+            'stages': [{'name': name, **record} for name, record in self.records.items()],
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=1)
+
+    def dump_cprofile(self, path):
+        """いちばん時間のかかった最上位の段階の cProfile を pstats 形式で保存し、その段階名を返す"""
+        if self.slowest is None:
+            return None
+        _, name, profiler = self.slowest
+        profiler.dump_stats(path)
+        return name
+
+
+def start_profile(trace_memory=False, cprofile=False):
+    global _active
+    _active = Profile(trace_memory, cprofile)
+    if trace_memory:
+        tracemalloc.start()
+    return _active
+
+
+def stop_profile():
+    global _active
+    profile, _active = _active, None
+    if profile is not None and profile.trace_memory:
+        tracemalloc.stop()
+    return profile
+
+
+@contextmanager
+def stage(name):
+    profile = _active
+    if profile is None:
+        yield
+        return
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit()
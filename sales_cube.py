@@ -0,0 +1,52 @@
+"""月 × アイテムタイプ × ブランド × ブランドカテゴリの売上キューブ
+
+件数・販売数・売上のように足し合わせられる値は、行データを1回集計したこのキューブから
+次元を落として合計すれば、どの切り口（月別推移・カテゴリ別・ブランドタブ内のタイプ別や月別）
+でも行データを読み直さずに求められる。中央値などの分位点は足し合わせられないので対象外。
+
+キューブは実際に出現した組み合わせだけを行に持つ DataFrame（キー列の MultiIndex、列は
+count・sales・revenue）。MultiIndex はキーの値をラベルの辞書と整数コードで持つので、
+販売の少ないブランドが長く続いても、全次元の直積の密な配列とは違い出現したセルの分しか
+場所を取らない。ブランドが欠損の行も1つのセルとして残すので、カテゴリ別などの合計は全行と一致する。
+販売日が空・読めない行は販売月が欠損のセルになり、月で切るロールアップ（月別推移）からは除く。
+並びはどの次元も最初に出現した順（groupby の sort=False）で、ロールアップしても保たれる。
+"""
+
+import pandas as pd
+
+CUBE_KEYS = ['販売月', 'アイテムタイプ', 'ブランド', 'ブランドカテゴリ']
+CUBE_MEASURES = ['count', 'sales', 'revenue']
+
+
+def build_cube(frame):
+    """分類済みの行からキューブを作る"""
+    return frame.groupby(CUBE_KEYS, sort=False, observed=True, dropna=False).agg(
+        count=('価格', 'size'),
+        sales=('販売数', 'sum'),
+        revenue=('売上', 'sum'),
+    )
+
+
+def cube_rollup(cube, keys, pairs=None):
+    """keys 以外の次元を合計する
+
+    pairs（[元の値, 新しい値] の2列 DataFrame）を渡すと、元の値の次元を新しい値に付け替えてから
+    合計する（accumulators.rollup と同じ。1つの値が複数の新しい値に対応してもよい）。
+    """
+    if pairs is None:
+        table = cube.groupby(level=keys, sort=False, observed=True, dropna=False)[CUBE_MEASURES].sum()
+    else:
+        level, new_level = pairs.columns
+        frame = cube[CUBE_MEASURES].reset_index().merge(pairs, on=level, how='inner')
+        keys = [new_level if key == level else key for key in keys]
+        table = frame.groupby(keys, sort=False, observed=True, dropna=False)[CUBE_MEASURES].sum()
+    # dropna=False はブランドの欠損を残すため。月の欠損（販売日が空の行）は月別の切り口に出さない
+    if '販売月' in keys:
+        table = table[table.index.get_level_values('販売月').notna()]
+    return table
+
+
+def monthly_table(cube, column='アイテムタイプ'):
+    """月 × column の販売数表（行・列とも昇順、無い組み合わせは0）"""
+    table = cube_rollup(cube, ['販売月', column])['sales'].unstack(column, fill_value=0)
+    return table.sort_index().sort_index(axis=1)
@@ -0,0 +1,248 @@
+"""グラフ定義（chart_specs の Plotly 形式）を静的な SVG にする
+
+Plotly を読み込まずに表示できるよう、レポートで使う4種類だけを描く:
+  縦棒（bar）・横棒（bar, orientation='h'）・円／ドーナツ（pie, hole）・折れ線（scatter）
+SVG は viewBox で描き、グラフの要素いっぱいに縦横比を保って広がる。文字と軸は currentColor なので
+ページの文字色（ダークモードを含む）に合わせて表示される。各要素の <title> がマウスを乗せたときの値になる。
+"""
+
+import math
+from html import escape
+
+# Plotly の既定の配色（色の指定が無いトレースに順に使う）
+PALETTE = ['#636efa', '#ef553b', '#00cc96', '#ab63fa', '#ffa15a', '#19d3f3', '#ff6692', '#b6e880', '#ff97ff',
+           '#fecb52']
+FONT_SIZE = 11
+MARGIN = {'t': 30, 'r': 20, 'b': 50, 'l': 50}  # ページの chartLayout と同じ余白
+LEGEND_WIDTH = 130
+GRID_STYLE = 'stroke="currentColor" stroke-opacity="0.15"'
+AXIS_STYLE = 'stroke="currentColor" stroke-opacity="0.5"'
+
+
+def text_width(text, size=FONT_SIZE):
+    """文字列のおおよその表示幅（全角は1文字分、半角は0.6文字分）"""
+    return sum(size if ord(c) > 0x2000 else size * 0.6 for c in str(text))
+
+
+def fit_text(text, width, size=FONT_SIZE):
+    """width に収まるよう末尾を … で切り詰める"""
+    text = str(text)
+    while len(text) > 1 and text_width(text, size) > width:
+        text = text[:-2] + '…'
+    return text
+
+
+def format_value(value):
+    return f"{value:,.0f}" if abs(value) >= 100 or float(value).is_integer() else f"{value:,.2f}"
+
+
+def nice_ticks(high, count=5):
+    """0 から high 以上までの、きりのよい間隔の目盛り"""
+    if not high > 0:
+        return [0, 1]
+    raw = high / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    return [i * step for i in range(math.ceil(high / step - 1e-9) + 1)]
+
+
+def svg_open(width, height, title):
+    label = escape(str(title or ''))
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%" height="100%"'
+             f' font-size="{FONT_SIZE}" fill="currentColor" role="img" aria-label="{label}">']
+    if title:
+        parts.append(f'<text x="{width / 2:.1f}" y="18" text-anchor="middle" font-size="{FONT_SIZE + 3}"'
+                     f' font-weight="bold">{label}</text>')
+    return parts
+
+
+def no_data(width, height, title):
+    parts = svg_open(width, height, title)
+    parts.append(f'<text x="{width / 2:.1f}" y="{height / 2:.1f}" text-anchor="middle" opacity="0.6">'
+                 'データなし</text>')
+    return ''.join(parts) + '</svg>'
+
+
+def category_labels(parts, labels, x_positions, band, y):
+    """横軸の項目名（詰まっているときは斜めにする）"""
+    rotate = max(text_width(label) for label in labels) > band * 0.95
+    for label, x in zip(labels, x_positions):
+        label = escape(fit_text(label, 70 if rotate else band))
+        if rotate:
+            parts.append(f'<text x="{x:.1f}" y="{y + 12:.1f}" text-anchor="end"'
+                         f' transform="rotate(-35 {x:.1f} {y + 12:.1f})">{label}</text>')
+        else:
+            parts.append(f'<text x="{x:.1f}" y="{y + 14:.1f}" text-anchor="middle">{label}</text>')
+
+
+def value_axis(parts, ticks, scale, x0, x1, y0, y1, horizontal=False):
+    """値の目盛りと補助線（horizontal=True なら横軸が値）"""
+    for tick in ticks:
+        if horizontal:
+            x = x0 + scale(tick)
+            parts.append(f'<line x1="{x:.1f}" y1="{y0}" x2="{x:.1f}" y2="{y1}" {GRID_STYLE}/>')
+            parts.append(f'<text x="{x:.1f}" y="{y1 + 14}" text-anchor="middle">{format_value(tick)}</text>')
+        else:
+            y = y1 - scale(tick)
+            parts.append(f'<line x1="{x0}" y1="{y:.1f}" x2="{x1}" y2="{y:.1f}" {GRID_STYLE}/>')
+            parts.append(f'<text x="{x0 - 6}" y="{y + 4:.1f}" text-anchor="end">{format_value(tick)}</text>')
+
+
+def legend(parts, items, x, y0, height):
+    """右側の凡例（色, 名前）。入りきらない分は省く"""
+    rows = max(int(height // 18), 1)
+    for i, (color, name) in enumerate(items[:rows]):
+        y = y0 + i * 18
+        parts.append(f'<rect x="{x}" y="{y:.1f}" width="10" height="10" fill="{color}"/>')
+        parts.append(f'<text x="{x + 15}" y="{y + 9:.1f}">{escape(fit_text(name, LEGEND_WIDTH - 20))}</text>')
+
+
+def bar_chart(trace, layout, width, height):
+    labels, values = list(trace['x']), [float(v) for v in trace['y']]
+    if not labels:
+        return no_data(width, height, layout.get('title'))
+    margin = dict(MARGIN, **layout.get('margin', {}))
+    x0, x1, y0, y1 = margin['l'], width - margin['r'], margin['t'], height - margin['b']
+    ticks = nice_ticks(max(values))
+    scale = lambda v: (y1 - y0) * v / ticks[-1]  # noqa: E731
+    color = trace.get('marker', {}).get('color', PALETTE[0])
+
+    parts = svg_open(width, height, layout.get('title'))
+    value_axis(parts, ticks, scale, x0, x1, y0, y1)
+    band = (x1 - x0) / len(labels)
+    centers = [x0 + band * (i + 0.5) for i in range(len(labels))]
+    for label, value, x in zip(labels, values, centers):
+        h = scale(max(value, 0))
+        parts.append(f'<rect x="{x - band * 0.4:.1f}" y="{y1 - h:.1f}" width="{band * 0.8:.1f}" height="{h:.1f}"'
+                     f' fill="{color}"><title>{escape(str(label))}: {format_value(value)}</title></rect>')
+    parts.append(f'<line x1="{x0}" y1="{y1}" x2="{x1}" y2="{y1}" {AXIS_STYLE}/>')
+    category_labels(parts, labels, centers, band, y1)
+    return ''.join(parts) + '</svg>'
+
+
+def hbar_chart(trace, layout, width, height):
+    """横棒（項目は上から与えられた順）"""
+    labels, values = list(trace['y']), [float(v) for v in trace['x']]
+    if not labels:
+        return no_data(width, height, layout.get('title'))
+    margin = dict(MARGIN, **layout.get('margin', {}))
+    # 横軸は数値だけで項目名を斜めにすることがないので、下の余白を詰める
+    x0, x1, y0, y1 = margin['l'], width - margin['r'], margin['t'], height - margin['b'] + 20
+    ticks = nice_ticks(max(values))
+    scale = lambda v: (x1 - x0) * v / ticks[-1]  # noqa: E731
+    color = trace.get('marker', {}).get('color', PALETTE[0])
+
+    parts = svg_open(width, height, layout.get('title'))
+    value_axis(parts, ticks, scale, x0, x1, y0, y1, horizontal=True)
+    band = (y1 - y0) / len(labels)
+    for i, (label, value) in enumerate(zip(labels, values)):
+        y = y0 + band * (i + 0.5)
+        w = scale(max(value, 0))
+        parts.append(f'<rect x="{x0}" y="{y - band * 0.4:.1f}" width="{w:.1f}" height="{band * 0.8:.1f}"'
+                     f' fill="{color}"><title>{escape(str(label))}: {format_value(value)}</title></rect>')
+        parts.append(f'<text x="{x0 - 6}" y="{y + 4:.1f}" text-anchor="end">'
+                     f'{escape(fit_text(label, x0 - 10))}</text>')
+    parts.append(f'<line x1="{x0}" y1="{y0}" x2="{x0}" y2="{y1}" {AXIS_STYLE}/>')
+    return ''.join(parts) + '</svg>'
+
+
+def arc_point(cx, cy, r, angle):
+    """12時の位置から時計回りに angle（ラジアン）進んだ円周上の点"""
+    return cx + r * math.sin(angle), cy - r * math.cos(angle)
+
+
+def pie_chart(trace, layout, width, height):
+    """円グラフ（hole があればドーナツ）。Plotly と同じく値の大きい順にし、12時から時計回りに並べる"""
+    slices = sorted(((float(v), str(label)) for label, v in zip(trace['labels'], trace['values']) if v > 0),
+                    key=lambda s: -s[0])
+    total = sum(v for v, _ in slices)
+    if not total:
+        return no_data(width, height, layout.get('title'))
+    top = MARGIN['t'] if layout.get('title') else 10
+    r = min(width - LEGEND_WIDTH - 30, height - top - 10) / 2
+    cx, cy = (width - LEGEND_WIDTH) / 2, top + (height - top) / 2 - 5
+    inner = r * float(trace.get('hole', 0))
+
+    parts = svg_open(width, height, layout.get('title'))
+    start = 0.0
+    items = []
+    for i, (value, label) in enumerate(slices):
+        color = PALETTE[i % len(PALETTE)]
+        share = value / total
+        end = start + share * 2 * math.pi
+        tip = f'<title>{escape(label)}: {format_value(value)}（{share:.1%}）</title>'
+        if share > 0.9999:
+            # 1つだけなら円（穴があれば evenodd で抜く）
+            path = f'M{cx - r:.1f},{cy:.1f}a{r:.1f},{r:.1f} 0 1,0 {2 * r:.1f},0a{r:.1f},{r:.1f} 0 1,0 {-2 * r:.1f},0z'
+            if inner:
+                path += (f'M{cx - inner:.1f},{cy:.1f}a{inner:.1f},{inner:.1f} 0 1,0 {2 * inner:.1f},0'
+                         f'a{inner:.1f},{inner:.1f} 0 1,0 {-2 * inner:.1f},0z')
+        else:
+            large = 1 if end - start > math.pi else 0
+            (ax, ay), (bx, by) = arc_point(cx, cy, r, start), arc_point(cx, cy, r, end)
+            path = f'M{ax:.1f},{ay:.1f}A{r:.1f},{r:.1f} 0 {large},1 {bx:.1f},{by:.1f}'
+            if inner:
+                (cx2, cy2), (dx, dy) = arc_point(cx, cy, inner, end), arc_point(cx, cy, inner, start)
+                path += f'L{cx2:.1f},{cy2:.1f}A{inner:.1f},{inner:.1f} 0 {large},0 {dx:.1f},{dy:.1f}Z'
+            else:
+                path += f'L{cx:.1f},{cy:.1f}Z'
+        parts.append(f'<path d="{path}" fill="{color}" fill-rule="evenodd" stroke="#fff" stroke-width="1">{tip}</path>')
+        if share >= 0.04:
+            tx, ty = arc_point(cx, cy, (r + inner) / 2, (start + end) / 2)
+            parts.append(f'<text x="{tx:.1f}" y="{ty + 4:.1f}" text-anchor="middle" fill="#fff">{share:.1%}</text>')
+        items.append((color, label))
+        start = end
+    legend(parts, items, width - LEGEND_WIDTH, top, height - top)
+    return ''.join(parts) + '</svg>'
+
+
+def line_chart(traces, layout, width, height):
+    """折れ線（全トレースで同じ横軸。トレースが複数か showlegend なら右に凡例）"""
+    labels = list(traces[0]['x']) if traces else []
+    if not labels:
+        return no_data(width, height, layout.get('title'))
+    show_legend = layout.get('showlegend', len(traces) > 1)
+    margin = dict(MARGIN, **layout.get('margin', {}))
+    x0, y0, y1 = margin['l'], margin['t'], height - margin['b']
+    x1 = width - margin['r'] - (LEGEND_WIDTH if show_legend else 0)
+    ticks = nice_ticks(max(max((float(v) for v in trace['y']), default=0) for trace in traces))
+    scale = lambda v: (y1 - y0) * v / ticks[-1]  # noqa: E731
+
+    parts = svg_open(width, height, layout.get('title'))
+    value_axis(parts, ticks, scale, x0, x1, y0, y1)
+    band = (x1 - x0) / len(labels)
+    xs = [x0 + band * (i + 0.5) for i in range(len(labels))]
+    items = []
+    for i, trace in enumerate(traces):
+        color = trace.get('line', {}).get('color') or trace.get('marker', {}).get('color') or PALETTE[i % len(PALETTE)]
+        name = str(trace.get('name', ''))
+        points = [(x, y1 - scale(float(v)), label, float(v)) for x, v, label in zip(xs, trace['y'], trace['x'])]
+        path = ' '.join(f'{x:.1f},{y:.1f}' for x, y, _, _ in points)
+        parts.append(f'<polyline points="{path}" fill="none" stroke="{color}" stroke-width="2"/>')
+        prefix = escape(name) + ' ' if name else ''
+        for x, y, label, value in points:
+            parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3" fill="{color}">'
+                         f'<title>{prefix}{escape(str(label))}: {format_value(value)}</title></circle>')
+        items.append((color, name))
+    parts.append(f'<line x1="{x0}" y1="{y1}" x2="{x1}" y2="{y1}" {AXIS_STYLE}/>')
+    category_labels(parts, labels, xs, band, y1)
+    if show_legend:
+        legend(parts, items, x1 + 15, y0, y1 - y0)
+    return ''.join(parts) + '</svg>'
+
+
+def render_chart(spec, width, height):
+    """グラフ定義 {'id', 'data', 'layout'} を width × height（viewBox の大きさ）の SVG 文字列にする"""
+    traces, layout = spec['data'], spec.get('layout', {})
+    if not traces:
+        return no_data(width, height, layout.get('title'))
+    trace = traces[0]
+    if trace['type'] == 'pie':
+        return pie_chart(trace, layout, width, height)
+    if trace['type'] == 'bar':
+        if trace.get('orientation') == 'h':
+            return hbar_chart(trace, layout, width, height)
+        return bar_chart(trace, layout, width, height)
+    if trace['type'] == 'scatter':
+        return line_chart(traces, layout, width, height)
+    raise ValueError(f"SVG にできないグラフの種類: {trace['type']}")
@@ -0,0 +1,41 @@
+"""販売日が空の行があってもビルドできること（月別の切り口から欠損の月を除く）"""
+
+import pandas as pd
+import pytest
+
+import build_complete_html as app
+from sales_cube import build_cube, cube_rollup, monthly_table
+
+BLANK_DATE_CSV = '''タイトル,ブランド,価格,販売数,販売日
+CHANEL Clip On,CHANEL,292.55,1,2026-02-08
+CHANEL Hoop,CHANEL,113.39,2,
+DIOR Stud,DIOR,150,1,2025-10-30
+'''
+
+
+def blank_date_frame():
+    raw = pd.DataFrame({'タイトル': ['CHANEL Clip On', 'CHANEL Hoop', 'No brand Stud'],
+                        'ブランド': ['CHANEL', 'CHANEL', None],
+                        '価格': [292.55, 113.39, 150.0], '販売数': [1, 2, 1],
+                        '販売日': ['2026-02-08', None, '2025-10-30']})
+    return app.enrich(raw)
+
+
+def test_month_rollups_drop_missing_months():
+    cube = build_cube(blank_date_frame())
+    by_month = cube_rollup(cube, ['ブランド', '販売月'])
+    assert by_month.index.get_level_values('販売月').notna().all()
+    # ブランドが欠損のセルは残る
+    assert by_month.index.get_level_values('ブランド').isna().any()
+    assert list(monthly_table(cube).index) == ['2025-10', '2026-02']
+    # 月で切らない合計は販売日が空の行も含む
+    assert cube_rollup(cube, ['ブランドカテゴリ'])['count'].sum() == 3
+
+
+@pytest.mark.parametrize('mode', ['memory', 'stream', 'incremental'])
+def test_build_with_blank_sale_date(tmp_path, mode):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(BLANK_DATE_CSV, encoding='utf-8')
+    report = app.build(str(csv_path), str(tmp_path / 'index.html'), {'mode': mode})
+    assert report['row_count'] == 3
+    assert (tmp_path / 'index.html').exists()